@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,6 +45,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'wallet_manager.middleware.MetricsMiddleware',
+    'wallet_manager.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +76,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'eth_wallet_service.wsgi.application'
 
+# Асинхронные представления кошельков, имеют смысл только при запуске через ASGI (eth_wallet_service/asgi.py)
+ASYNC_VIEWS = int(os.environ.get("ASYNC_VIEWS", default=0))
+
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
@@ -84,6 +90,11 @@ DATABASES = {
         "PASSWORD": os.environ.get("DB_PASSWORD"),
         "HOST": os.environ.get("DB_HOST"),
         "PORT": os.environ.get("DB_PORT"),
+        # Постоянные соединения: соединение потока переиспользуется между запросами до DB_CONN_MAX_AGE секунд,
+        # перед первым запросом к базе в каждом запросе к API проверяется, что соединение живо.
+        # 0 - новое соединение на каждый запрос (при запуске через ASGI, см. gunicorn.conf.py)
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", default=60)),
+        "CONN_HEALTH_CHECKS": bool(int(os.environ.get("DB_CONN_HEALTH_CHECKS", default=1))),
     }
 }
 
@@ -133,6 +144,129 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 ETH_NODE_URL = os.environ.get("ETH_NODE_URL")
 ETH_API_KEY = os.environ.get("ETH_API_KEY")
 
+# Дополнительные ноды (полные URL через запятую). Чтение идет на самую быструю доступную ноду по скользящей
+# средней задержки (вес нового замера - ETH_NODE_EWMA_ALPHA), запись - на основную ноду с переходом на следующую
+# при отказе. Если нода не ответила за ETH_NODE_HEDGE_AFTER секунд (0 - выключено), запрос дублируется на
+# следующую ноду. Ноды проверяются каждые ETH_NODE_HEALTH_INTERVAL секунд, нода, отстающая больше чем на
+# ETH_NODE_MAX_LAG блоков или не отвечающая, исключается на время от ETH_NODE_COOLDOWN до ETH_NODE_COOLDOWN_MAX
+ETH_NODE_EXTRA_URLS = [url for url in os.environ.get("ETH_NODE_EXTRA_URLS", default="").split(",") if url]
+ETH_NODE_EWMA_ALPHA = float(os.environ.get("ETH_NODE_EWMA_ALPHA", default=0.3))
+ETH_NODE_HEDGE_AFTER = float(os.environ.get("ETH_NODE_HEDGE_AFTER", default=0))
+ETH_NODE_HEALTH_INTERVAL = float(os.environ.get("ETH_NODE_HEALTH_INTERVAL", default=5))
+ETH_NODE_MAX_LAG = int(os.environ.get("ETH_NODE_MAX_LAG", default=3))
+ETH_NODE_COOLDOWN = float(os.environ.get("ETH_NODE_COOLDOWN", default=5))
+ETH_NODE_COOLDOWN_MAX = float(os.environ.get("ETH_NODE_COOLDOWN_MAX", default=60))
+
+# Пул соединений с нодой, общий для всех запросов воркера
+ETH_HTTP_POOL_SIZE = int(os.environ.get("ETH_HTTP_POOL_SIZE", default=20))
+ETH_HTTP_KEEPALIVE = float(os.environ.get("ETH_HTTP_KEEPALIVE", default=30))
+ETH_HTTP_TIMEOUT = float(os.environ.get("ETH_HTTP_TIMEOUT", default=10))
+ETH_CLIENT_REGISTRY_SIZE = int(os.environ.get("ETH_CLIENT_REGISTRY_SIZE", default=8))
+# Максимальное число вызовов в одном JSON-RPC batch-запросе
+ETH_RPC_BATCH_SIZE = int(os.environ.get("ETH_RPC_BATCH_SIZE", default=100))
+
+# Планировщик запросов к ноде: число одновременных запросов, частота (запросов в секунду, 0 - без ограничения),
+# запас токенов для всплесков, повторы при 429/5xx и границы задержки между ними в секундах
+ETH_RPC_MAX_IN_FLIGHT = int(os.environ.get("ETH_RPC_MAX_IN_FLIGHT", default=32))
+ETH_RPC_RATE_LIMIT = float(os.environ.get("ETH_RPC_RATE_LIMIT", default=0))
+ETH_RPC_BURST = float(os.environ.get("ETH_RPC_BURST", default=100))
+ETH_RPC_MAX_RETRIES = int(os.environ.get("ETH_RPC_MAX_RETRIES", default=4))
+ETH_RPC_BACKOFF_BASE = float(os.environ.get("ETH_RPC_BACKOFF_BASE", default=0.25))
+ETH_RPC_BACKOFF_MAX = float(os.environ.get("ETH_RPC_BACKOFF_MAX", default=8))
+
+# Чтение балансов: batch - eth_getBalance по каждому адресу в JSON-RPC batch-запросах,
+# multicall - один eth_call к контракту Multicall3 (getEthBalance) на порцию адресов, порция ограничена
+# лимитом газа вызова и оценкой газа на один адрес; если контракт недоступен, балансы читаются по адресам
+ETH_BALANCE_MODE = os.environ.get("ETH_BALANCE_MODE", default="batch")
+ETH_MULTICALL_ADDRESS = os.environ.get("ETH_MULTICALL_ADDRESS", default="0xcA11bde05977b3631167028862bE2a173976CA11")
+ETH_MULTICALL_GAS_LIMIT = int(os.environ.get("ETH_MULTICALL_GAS_LIMIT", default=25000000))
+ETH_MULTICALL_GAS_PER_CALL = int(os.environ.get("ETH_MULTICALL_GAS_PER_CALL", default=6000))
+
+# Хранилище счетчиков nonce отправителей: database - общее для всех воркеров, memory - в памяти процесса
+ETH_NONCE_STORE = os.environ.get("ETH_NONCE_STORE", default="database")
+
+# Оракул комиссий: тип транзакций (eip1559 или legacy), интервал проверки нового блока и время простоя,
+# после которого слежение останавливается (в секундах), глубина eth_feeHistory и перцентиль чаевых
+ETH_TRANSACTION_TYPE = os.environ.get("ETH_TRANSACTION_TYPE", default="eip1559")
+ETH_FEE_POLL_INTERVAL = float(os.environ.get("ETH_FEE_POLL_INTERVAL", default=2))
+ETH_FEE_IDLE_TIMEOUT = float(os.environ.get("ETH_FEE_IDLE_TIMEOUT", default=300))
+ETH_FEE_HISTORY_BLOCKS = int(os.environ.get("ETH_FEE_HISTORY_BLOCKS", default=5))
+ETH_FEE_PRIORITY_PERCENTILE = float(os.environ.get("ETH_FEE_PRIORITY_PERCENTILE", default=50))
+
+# Кэш балансов: размер (0 - кэш выключен), время жизни записи и номера текущего блока в секундах
+ETH_BALANCE_CACHE_SIZE = int(os.environ.get("ETH_BALANCE_CACHE_SIZE", default=100000))
+ETH_BALANCE_CACHE_TTL = float(os.environ.get("ETH_BALANCE_CACHE_TTL", default=60))
+ETH_BLOCK_NUMBER_TTL = float(os.environ.get("ETH_BLOCK_NUMBER_TTL", default=2))
+
+# Массовое создание кошельков: максимальное число кошельков за запрос, размер пачки INSERT,
+# число процессов генерации ключей и объем, начиная с которого используется пул процессов
+WALLET_BULK_MAX_COUNT = int(os.environ.get("WALLET_BULK_MAX_COUNT", default=10000))
+WALLET_BULK_BATCH_SIZE = int(os.environ.get("WALLET_BULK_BATCH_SIZE", default=1000))
+WALLET_KEYGEN_PROCESSES = int(os.environ.get("WALLET_KEYGEN_PROCESSES", default=os.cpu_count() or 1))
+WALLET_KEYGEN_POOL_THRESHOLD = int(os.environ.get("WALLET_KEYGEN_POOL_THRESHOLD", default=500))
+
+# Запас заранее сгенерированных аккаунтов: нижняя и верхняя границы и интервал проверки в секундах
+WALLET_RESERVOIR_LOW_WATERMARK = int(os.environ.get("WALLET_RESERVOIR_LOW_WATERMARK", default=1000))
+WALLET_RESERVOIR_HIGH_WATERMARK = int(os.environ.get("WALLET_RESERVOIR_HIGH_WATERMARK", default=5000))
+WALLET_RESERVOIR_REFILL_INTERVAL = float(os.environ.get("WALLET_RESERVOIR_REFILL_INTERVAL", default=5))
+
+# Пакетные переводы: максимальное число переводов за запрос
+WALLET_TRANSFER_BATCH_MAX_COUNT = int(os.environ.get("WALLET_TRANSFER_BATCH_MAX_COUNT", default=5000))
+
+# Метрики в формате Prometheus на /metrics: запросы к ноде, методы менеджеров, запросы к API и к базе.
+# Метрики собираются prometheus_client; при заданном PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py задает его сам)
+# воркеры пишут значения в файлы каталога, и /metrics отдает сумму по всем воркерам
+METRICS_ENABLED = int(os.environ.get("METRICS_ENABLED", default=1))
+
+# Импорт существующих кошельков (manage.py import_wallets и wallets/import/): число строк в одной порции COPY
+WALLET_IMPORT_BATCH_SIZE = int(os.environ.get("WALLET_IMPORT_BATCH_SIZE", default=100000))
+# Файлы, загруженные в wallets/import/, сохраняются в каталог и импортируются в фоне. Задание, счетчики
+# которого не обновлялись WALLET_IMPORT_STALL_TIMEOUT секунд (процесс перезапущен), считается прерванным
+WALLET_IMPORT_DIR = os.environ.get("WALLET_IMPORT_DIR", default=os.path.join(tempfile.gettempdir(), "wallet_imports"))
+WALLET_IMPORT_STALL_TIMEOUT = float(os.environ.get("WALLET_IMPORT_STALL_TIMEOUT", default=600))
+
+# Профилирование отдельных запросов по заголовку X-Profile-Token или правилам из админки.
+# Интервал семплирования и срок действия токена в секундах, время кэширования правил в секундах
+PROFILING_ENABLED = int(os.environ.get("PROFILING_ENABLED", default=0))
+PROFILING_INTERVAL = float(os.environ.get("PROFILING_INTERVAL", default=0.005))
+PROFILING_TOKEN_MAX_AGE = int(os.environ.get("PROFILING_TOKEN_MAX_AGE", default=3600))
+PROFILING_RULES_TTL = float(os.environ.get("PROFILING_RULES_TTL", default=5))
+
+# Очередь отправки транзакций: при включении POST /transaction/ сразу возвращает 202 с id перевода,
+# а отправку выполняют воркеры (manage.py process_transactions).
+# Число переводов, забираемых воркером за раз, интервал опроса пустой очереди в секундах
+# и число попыток отправки при временных ошибках ноды.
+# Перевод, который воркер не завершил за TRANSACTION_QUEUE_LEASE_TIMEOUT секунд (воркер остановлен или упал),
+# считается отправленным с неизвестным результатом
+TRANSACTION_QUEUE = int(os.environ.get("TRANSACTION_QUEUE", default=0))
+TRANSACTION_QUEUE_BATCH_SIZE = int(os.environ.get("TRANSACTION_QUEUE_BATCH_SIZE", default=100))
+TRANSACTION_QUEUE_POLL_INTERVAL = float(os.environ.get("TRANSACTION_QUEUE_POLL_INTERVAL", default=1))
+TRANSACTION_QUEUE_MAX_ATTEMPTS = int(os.environ.get("TRANSACTION_QUEUE_MAX_ATTEMPTS", default=5))
+TRANSACTION_QUEUE_LEASE_TIMEOUT = float(os.environ.get("TRANSACTION_QUEUE_LEASE_TIMEOUT", default=300))
+
+# Отслеживание отправленных транзакций (manage.py track_transactions): число подтверждений,
+# после которого транзакция считается окончательной, интервал проверки нового блока в секундах
+# и число транзакций, читаемых из базы за раз.
+# Транзакция, не включенная в блок за TRANSACTION_DROP_TIMEOUT секунд, считается отброшенной
+TRANSACTION_CONFIRMATIONS = int(os.environ.get("TRANSACTION_CONFIRMATIONS", default=12))
+TRANSACTION_TRACKER_POLL_INTERVAL = float(os.environ.get("TRANSACTION_TRACKER_POLL_INTERVAL", default=2))
+TRANSACTION_TRACKER_BATCH_SIZE = int(os.environ.get("TRANSACTION_TRACKER_BATCH_SIZE", default=1000))
+TRANSACTION_DROP_TIMEOUT = float(os.environ.get("TRANSACTION_DROP_TIMEOUT", default=3600))
+
+# Индексатор блоков (manage.py follow_blocks): обновляет сохраненные балансы кошельков, затронутых новыми блоками.
+# WALLET_BALANCES_FROM_DB - список кошельков берет балансы из базы (к ноде уходят только еще не проиндексированные),
+# интервал проверки нового блока в секундах, максимальное число блоков за шаг, число блоков в одном batch-запросе,
+# глубина повторного сканирования при реорганизации и число кошельков без баланса, дозагружаемых за шаг.
+# Если индексатор отстал от текущего блока больше чем на WALLET_BALANCES_MAX_LAG блоков (follow_blocks остановлен),
+# балансы из базы считаются устаревшими и запрашиваются у ноды
+WALLET_BALANCES_FROM_DB = int(os.environ.get("WALLET_BALANCES_FROM_DB", default=0))
+WALLET_BALANCES_MAX_LAG = int(os.environ.get("WALLET_BALANCES_MAX_LAG", default=10))
+BLOCK_FOLLOWER_POLL_INTERVAL = float(os.environ.get("BLOCK_FOLLOWER_POLL_INTERVAL", default=2))
+BLOCK_FOLLOWER_MAX_BLOCKS = int(os.environ.get("BLOCK_FOLLOWER_MAX_BLOCKS", default=50))
+BLOCK_FOLLOWER_RPC_BATCH_SIZE = int(os.environ.get("BLOCK_FOLLOWER_RPC_BATCH_SIZE", default=10))
+BLOCK_FOLLOWER_REORG_DEPTH = int(os.environ.get("BLOCK_FOLLOWER_REORG_DEPTH", default=12))
+BLOCK_FOLLOWER_BACKFILL_SIZE = int(os.environ.get("BLOCK_FOLLOWER_BACKFILL_SIZE", default=1000))
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Тестовое задание для Python Backend Developer',
     'DESCRIPTION': "Сервис отвечает за создание ĸошельĸов, получение балансов по ним, хранение приватных ĸлючей и "
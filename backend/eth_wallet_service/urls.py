@@ -2,9 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
+from wallet_manager.views import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/v1/', include('wallet_manager.urls_v1')),
+    path('metrics', metrics_view, name='metrics'),
 
     # DRF_SPECTACULAR
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
@@ -0,0 +1,71 @@
+"""
+Конфигурация gunicorn для запуска сервиса в production: gunicorn -c gunicorn.conf.py
+
+SERVER_MODE=wsgi (по умолчанию) - воркеры gthread: синхронные представления, каждый поток держит
+постоянное соединение с базой. Запросы балансов большую часть времени ждут ноду, поэтому процессов
+столько же, сколько ядер, а параллельность дают потоки.
+
+SERVER_MODE=asgi - воркеры uvicorn с асинхронными представлениями (ASYNC_VIEWS). Синхронный код под ASGI
+выполняется в потоках на каждый запрос, поэтому постоянные соединения с базой по умолчанию выключены,
+переиспользование соединений в этом режиме лучше получать от пулера (pgbouncer)
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+SERVER_MODE = os.environ.get("SERVER_MODE", default="wsgi")
+
+if SERVER_MODE == "asgi":
+    wsgi_app = "eth_wallet_service.asgi:application"
+    worker_class = "uvicorn.workers.UvicornWorker"
+    # Настройки читаются воркерами при загрузке приложения, значения из окружения имеют приоритет
+    os.environ.setdefault("ASYNC_VIEWS", "1")
+    os.environ.setdefault("DB_CONN_MAX_AGE", "0")
+elif SERVER_MODE == "wsgi":
+    wsgi_app = "eth_wallet_service.wsgi:application"
+    worker_class = "gthread"
+else:
+    raise ValueError(f"Неизвестный SERVER_MODE {SERVER_MODE}, поддерживаются: wsgi, asgi")
+
+bind = os.environ.get("GUNICORN_BIND", default="0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", default=multiprocessing.cpu_count()))
+# Потоки воркера gthread; соединений с базой не больше workers * threads, с учетом max_connections PostgreSQL
+threads = int(os.environ.get("GUNICORN_THREADS", default=8))
+
+# Запрос балансов списка кошельков может ждать ноду с повторами, поэтому таймаут больше таймаута запроса к ноде
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", default=60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", default=30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", default=5))
+
+# Перезапуск воркера после числа запросов; разброс, чтобы воркеры не перезапускались одновременно
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", default=10000))
+max_requests_jitter = int(os.environ.get("GUNICORN_MAX_REQUESTS_JITTER", default=1000))
+
+# Приложение загружается в каждом воркере после fork: клиенты ноды запускают свои потоки с циклом событий,
+# которые не переживают fork
+preload_app = False
+
+# Heartbeat воркеров в памяти, а не на диске контейнера
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+# Метрики prometheus_client в multiprocess-режиме: каждый воркер пишет значения в свои файлы каталога,
+# /metrics любого воркера собирает их со всех. Каталог очищается при запуске, файлы завершившихся
+# воркеров помечаются в child_exit, чтобы их выполняющиеся запросы не учитывались
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(worker_tmp_dir or tempfile.gettempdir(), "wallet_metrics"))
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", default="-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", default="info")
+
+
+def on_starting(server):
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,52 @@
+from functools import lru_cache
+from typing import Optional, Union
+
+from eth_utils import to_checksum_address
+
+# Число адресов, checksum-представление которых хранится в памяти процесса
+CHECKSUM_CACHE_SIZE = 2 ** 16
+
+
+def address_to_bytes(address: str) -> Optional[bytes]:
+    """
+    Перевод адреса 0x... в 20 байт, регистр букв не учитывается
+    :param address: str
+    :return: Optional[bytes] - None, если строка не является адресом
+    """
+    if not isinstance(address, str) or len(address) != 42 or not address.startswith(('0x', '0X')):
+        return None
+    try:
+        return bytes.fromhex(address[2:])
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=CHECKSUM_CACHE_SIZE)
+def bytes_to_address(key: bytes) -> str:
+    """
+    Перевод 20 байт в адрес 0x... с контрольной суммой (EIP-55).
+    Подсчет контрольной суммы требует keccak, поэтому результаты кэшируются
+    :param key: bytes
+    :return: str
+    """
+    return to_checksum_address(bytes(key))
+
+
+def normalize_address(address: str) -> str:
+    """
+    Приведение адреса к виду с контрольной суммой; публичные ключи других форматов возвращаются как есть
+    :param address: str
+    :return: str
+    """
+    key = address_to_bytes(address)
+    return address if key is None else bytes_to_address(key)
+
+
+def address_key(address: str) -> Union[bytes, str]:
+    """
+    Ключ адреса для сравнения без учета регистра: 20 байт для адресов 0x..., иначе сама строка
+    :param address: str
+    :return: Union[bytes, str]
+    """
+    key = address_to_bytes(address)
+    return address if key is None else key
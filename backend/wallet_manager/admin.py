@@ -1,3 +1,60 @@
 from django.contrib import admin
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
 
-# Register your models here.
+from .models import ProfileRule, RequestProfile
+from .profiling import rule_cache
+
+
+@admin.register(ProfileRule)
+class ProfileRuleAdmin(admin.ModelAdmin):
+    list_display = ('path', 'remaining', 'enabled', 'created_at')
+    list_editable = ('remaining', 'enabled')
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        rule_cache.invalidate()
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status', 'wall_time_ms', 'samples', 'folded_stacks')
+    list_filter = ('method', 'status')
+    search_fields = ('path',)
+    readonly_fields = ('method', 'path', 'status', 'wall_time', 'breakdown', 'samples', 'created_at', 'folded_stacks')
+    exclude = ('stacks',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Время, мс', ordering='wall_time')
+    def wall_time_ms(self, obj):
+        return round(obj.wall_time * 1000, 1)
+
+    @admin.display(description='Стеки (folded)')
+    def folded_stacks(self, obj):
+        url = reverse('admin:wallet_manager_requestprofile_stacks', args=(obj.pk,))
+        return format_html('<a href="{}">{}</a>', url, 'Скачать .folded')
+
+    def get_urls(self):
+        return [
+            path('<int:pk>/stacks/', self.admin_site.admin_view(self.download_stacks),
+                 name='wallet_manager_requestprofile_stacks'),
+        ] + super().get_urls()
+
+    def download_stacks(self, request, pk):
+        """
+        Стеки профиля в свернутом формате. Админка flame graph не строит: файл открывается в speedscope
+        или передается в flamegraph.pl
+        """
+        profile = get_object_or_404(RequestProfile, pk=pk)
+        if not self.has_view_permission(request, profile):
+            return HttpResponse(status=403)
+        response = HttpResponse(profile.stacks, content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+        return response
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class WalletManagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'wallet_manager'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .metrics import install_query_counter
+
+        # Время запросов к базе и их число на запрос к API считаются оберткой каждого соединения
+        connection_created.connect(install_query_counter, dispatch_uid='wallet_manager_query_counter')
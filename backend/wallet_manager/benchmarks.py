@@ -0,0 +1,188 @@
+import json
+import os
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from unittest.mock import patch
+
+import django
+from django.conf import settings
+from django.db import transaction
+
+from .addresses import bytes_to_address
+from .managers import CryptoManager
+from .managers.cache import balance_cache
+from .managers.client import NodeClient
+from .models import Wallet
+from .serializers import WalletSerializer, WalletTransactionSerializer
+from .views import WalletView
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+
+
+async def _stub_post(client: NodeClient, url: str, payload: str) -> Any:
+    """
+    Заглушка HTTP-запроса к ноде: ответы формируются на месте, остальной путь клиента
+    (планировщик, batch-запросы, объединение запросов) выполняется как обычно
+    """
+    def answer(call: dict) -> dict:
+        result = {'eth_getBalance': '0x0', 'eth_blockNumber': '0x1', 'eth_chainId': '0x1'}.get(call['method'])
+        if result is None:
+            return {'jsonrpc': '2.0', 'id': call['id'], 'error': {'code': -32601, 'message': 'method not found'}}
+        return {'jsonrpc': '2.0', 'id': call['id'], 'result': result}
+
+    calls = json.loads(payload)
+    return [answer(call) for call in calls] if isinstance(calls, list) else answer(calls)
+
+
+@contextmanager
+def stub_node():
+    """
+    Подмена ноды заглушкой на время замеров
+    """
+    with patch.object(NodeClient, '_post', _stub_post):
+        yield
+
+
+def measure(func: Callable[[], Any], rounds: int, setup: Optional[Callable[[], Any]] = None,
+            number: int = 1) -> dict:
+    """
+    Замер времени выполнения функции
+    :param func: Callable - Замеряемая функция
+    :param rounds: int - Число замеров
+    :param setup: Callable - Подготовка перед каждым замером, в замер не входит
+    :param number: int - Число вызовов функции в одном замере
+    :return: dict - Время одного вызова в секундах: min, median, mean и число замеров
+    """
+    # Первый вызов прогревает кэши и соединения и в замеры не входит
+    if setup is not None:
+        setup()
+    func()
+    timings = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'rounds': rounds,
+    }
+
+
+def _create_wallets(count: int) -> List[Wallet]:
+    wallets = [
+        Wallet(currency='ETH', private_key='0x' + os.urandom(32).hex(), public_key=bytes_to_address(os.urandom(20)))
+        for _ in range(count)
+    ]
+    Wallet.objects.bulk_create(wallets, batch_size=settings.WALLET_BULK_BATCH_SIZE)
+    return list(Wallet.objects.filter_addresses([wallet.public_key for wallet in wallets]).order_by('id'))
+
+
+def bench_wallet_list_with_balance(wallets: List[Wallet], rounds: int) -> dict:
+    def run():
+        WalletView.get_serializer_data_with_balance(WalletSerializer(wallets, many=True))
+
+    # Кэш балансов очищается перед каждым замером, чтобы замерялся путь до ноды
+    return measure(run, rounds, setup=balance_cache.clear)
+
+
+def bench_wallet_serializer(wallets: List[Wallet], rounds: int) -> dict:
+    return measure(lambda: WalletSerializer(wallets, many=True).data, rounds)
+
+
+def bench_transaction_validate(rounds: int) -> dict:
+    sender, recipient = _create_wallets(2)
+    data = {'from': sender.public_key, 'to': recipient.public_key, 'amount': '100', 'currency': 'ETH'}
+
+    def run():
+        serializer = WalletTransactionSerializer(data=data)
+        if not serializer.is_valid():
+            raise AssertionError(serializer.errors)
+
+    return measure(run, rounds, number=100)
+
+
+def bench_get_new_account(rounds: int) -> dict:
+    manager = CryptoManager(settings.ETH_API_KEY, 'ETH').manager
+    return measure(manager.get_new_account, rounds, number=100)
+
+
+def bench_crypto_manager(rounds: int) -> dict:
+    return measure(lambda: CryptoManager(settings.ETH_API_KEY, 'ETH'), rounds, number=1000)
+
+
+def run_benchmarks(sizes: Iterable[int] = DEFAULT_SIZES, rounds: int = 5, only: Optional[str] = None,
+                   progress: Optional[Callable[[str, dict], None]] = None) -> Dict[str, dict]:
+    """
+    Выполнение замеров горячих путей сервиса с заглушкой вместо ноды.
+    Кошельки для замеров создаются в транзакции, которая в конце откатывается, поэтому база не меняется
+    :param sizes: Iterable[int] - Число кошельков в замерах списка
+    :param rounds: int - Число замеров каждого сценария
+    :param only: str - Выполнять только сценарии, в названии которых есть эта строка
+    :param progress: Callable - Вызывается после каждого сценария с его названием и результатом
+    :return: Dict[str, dict] - Результаты по названиям сценариев
+    """
+    cases = [('transaction_validate', bench_transaction_validate),
+             ('get_new_account', bench_get_new_account),
+             ('crypto_manager_init', bench_crypto_manager)]
+    results = {}
+    with stub_node(), transaction.atomic():
+        wallets = _create_wallets(max(sizes, default=0))
+        for size in sizes:
+            cases.append((f'wallet_list_with_balance[{size}]',
+                          lambda rounds, size=size: bench_wallet_list_with_balance(wallets[:size], rounds)))
+            cases.append((f'wallet_serializer[{size}]',
+                          lambda rounds, size=size: bench_wallet_serializer(wallets[:size], rounds)))
+
+        for name, case in cases:
+            if only and only not in name:
+                continue
+            results[name] = case(rounds)
+            if progress is not None:
+                progress(name, results[name])
+        transaction.set_rollback(True)
+    balance_cache.clear()
+    return results
+
+
+def build_report(results: Dict[str, dict]) -> dict:
+    """
+    Отчет для сохранения в JSON: результаты и окружение, в котором они получены
+    :param results: Dict[str, dict]
+    :return: dict
+    """
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'machine': platform.machine(),
+            'database': settings.DATABASES['default']['ENGINE'],
+        },
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'results': results,
+    }
+
+
+def compare_results(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """
+    Сравнение с результатами предыдущего запуска по медиане
+    :param results: Dict[str, dict] - Текущие результаты
+    :param baseline: Dict[str, dict] - Результаты, с которыми сравниваем
+    :param threshold: float - Допустимое относительное замедление, например 0.2 - на 20%
+    :return: List[str] - Описания замедлившихся сценариев
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result['median'] / baseline[name]['median']
+        if ratio > 1 + threshold:
+            regressions.append(f'{name}: {baseline[name]["median"]:.6f}s -> {result["median"]:.6f}s (x{ratio:.2f})')
+    return regressions
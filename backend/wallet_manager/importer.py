@@ -0,0 +1,276 @@
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .addresses import address_to_bytes, normalize_address
+from .models import Wallet, WalletImportJob
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Временная таблица, в которую строки загружаются через COPY перед слиянием с таблицей кошельков
+STAGING_TABLE = 'wallet_import_staging'
+
+# Закрытый ключ secp256k1 в hex с префиксом 0x, как его возвращает генерация аккаунтов
+PRIVATE_KEY_RE = re.compile(r'^0x[0-9a-fA-F]{64}$')
+
+WalletRow = Tuple[str, str, str, Optional[bytes]]
+
+
+class WalletImportError(Exception):
+    """
+    Файл импорта не удалось прочитать: неизвестный формат, нет нужных колонок, не UTF-8 или испорченный CSV
+    """
+    pass
+
+
+def read_wallets(stream: Iterable[str], fmt: str) -> Iterator[dict]:
+    """
+    Построчное чтение кошельков из CSV с заголовком или из NDJSON (один JSON-объект на строку)
+    :param stream: Iterable[str] - Текстовый поток
+    :param fmt: str - Формат: csv или ndjson
+    :return: Iterator[dict] - Записи с ключами private_key, public_key и необязательным currency;
+    некорректные строки NDJSON возвращаются пустыми словарями
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise WalletImportError(f'Неизвестный формат {fmt}, поддерживаются: {", ".join(IMPORT_FORMATS)}')
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(stream)
+            if not reader.fieldnames or not {'private_key', 'public_key'} <= set(reader.fieldnames):
+                raise WalletImportError('В заголовке CSV должны быть колонки private_key и public_key')
+            yield from reader
+        else:
+            for line in stream:
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    item = {}
+                yield item if isinstance(item, dict) else {}
+    except UnicodeDecodeError as e:
+        raise WalletImportError(f'Файл должен быть в кодировке UTF-8: {e}')
+    except csv.Error as e:
+        raise WalletImportError(f'Некорректный CSV: {e}')
+
+
+def to_wallet_row(item: dict, currency: Optional[str] = None) -> Optional[WalletRow]:
+    """
+    Проверка записи импорта
+    :param item: dict - Запись из файла
+    :param currency: str - Валюта для записей без валюты
+    :return: Optional[WalletRow] - (currency, private_key, public_key, address) или None для некорректной записи
+    """
+    currency = item.get('currency') or currency
+    private_key, public_key = item.get('private_key'), item.get('public_key')
+    if not all(isinstance(value, str) and value for value in (currency, private_key, public_key)):
+        return None
+    if len(currency) > 3 or len(public_key) > 44 or not PRIVATE_KEY_RE.match(private_key):
+        return None
+    public_key = normalize_address(public_key)
+    return currency, private_key, public_key, address_to_bytes(public_key)
+
+
+def import_wallets(stream: Iterable[str], fmt: str, currency: Optional[str] = None, batch_size: Optional[int] = None,
+                   progress: Optional[Callable[[dict], None]] = None) -> dict:
+    """
+    Потоковый импорт существующих кошельков.
+    Строки читаются порциями, поэтому память не зависит от размера файла. В PostgreSQL порция загружается
+    через COPY во временную таблицу и переносится в таблицу кошельков одним INSERT ... ON CONFLICT DO NOTHING,
+    в остальных базах - через bulk_create. Кошельки, ключи которых уже есть в базе, пропускаются
+    :param stream: Iterable[str] - Текстовый поток
+    :param fmt: str - Формат: csv или ndjson
+    :param currency: str - Валюта для записей без валюты
+    :param batch_size: int - Размер порции, по умолчанию settings.WALLET_IMPORT_BATCH_SIZE
+    :param progress: Callable - Вызывается после каждой порции со счетчиками импорта
+    :return: dict - Счетчики: read - прочитано строк, imported - добавлено, skipped - уже были в базе,
+    invalid - некорректные строки
+    """
+    batch_size = batch_size or settings.WALLET_IMPORT_BATCH_SIZE
+    stats = {'read': 0, 'imported': 0, 'skipped': 0, 'invalid': 0}
+    items = read_wallets(stream, fmt)
+    merge = _merge_copy if connection.vendor == 'postgresql' else _merge_bulk_create
+
+    if connection.vendor == 'postgresql':
+        _create_staging_table()
+    try:
+        while True:
+            chunk = list(islice(items, batch_size))
+            if not chunk:
+                break
+            rows = []
+            for item in chunk:
+                row = to_wallet_row(item, currency)
+                if row is None:
+                    stats['invalid'] += 1
+                else:
+                    rows.append(row)
+            imported = merge(rows) if rows else 0
+            stats['read'] += len(chunk)
+            stats['imported'] += imported
+            stats['skipped'] += len(rows) - imported
+            if progress is not None:
+                progress(dict(stats))
+    finally:
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {STAGING_TABLE}')
+    return stats
+
+
+def _create_staging_table():
+    with connection.cursor() as cursor:
+        # Временная таблица видна только текущему соединению и очищается после каждой транзакции
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} '
+            f'(currency varchar(3), private_key varchar(66), public_key varchar(44), address bytea) '
+            f'ON COMMIT DELETE ROWS'
+        )
+
+
+def _merge_copy(rows: List[WalletRow]) -> int:
+    """
+    Загрузка порции через COPY во временную таблицу и перенос в таблицу кошельков
+    :param rows: List[WalletRow]
+    :return: int - Число добавленных кошельков
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for currency, private_key, public_key, address in rows:
+        # Пустое поле без кавычек в CSV - это NULL
+        writer.writerow((currency, private_key, public_key, '\\x' + address.hex() if address else None))
+    copy_sql = f'COPY {STAGING_TABLE} (currency, private_key, public_key, address) FROM STDIN WITH (FORMAT csv)'
+
+    table = connection.ops.quote_name(Wallet._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):
+            # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(copy_sql, buffer)
+        else:
+            # psycopg 3
+            with raw.copy(copy_sql) as copy:
+                copy.write(buffer.getvalue())
+        cursor.execute(
+            f'INSERT INTO {table} (currency, private_key, public_key, address) '
+            f'SELECT currency, private_key, public_key, address FROM {STAGING_TABLE} '
+            f'ON CONFLICT DO NOTHING'
+        )
+        return cursor.rowcount
+
+
+def _merge_bulk_create(rows: List[WalletRow]) -> int:
+    """
+    Вставка порции через bulk_create для баз без COPY
+    :param rows: List[WalletRow]
+    :return: int - Число добавленных кошельков
+    """
+    imported = 0
+    with transaction.atomic():
+        for start in range(0, len(rows), settings.WALLET_BULK_BATCH_SIZE):
+            chunk = rows[start:start + settings.WALLET_BULK_BATCH_SIZE]
+            # Кошельки с уже существующими ключами пропускаются, поэтому считаются только строки с ключами порции
+            existing = Wallet.objects.filter_addresses([public_key for _, _, public_key, _ in chunk])
+            before = existing.count()
+            Wallet.objects.bulk_create(
+                [
+                    Wallet(currency=currency, private_key=private_key, public_key=public_key, address=address)
+                    for currency, private_key, public_key, address in chunk
+                ],
+                ignore_conflicts=True,
+            )
+            imported += existing.count() - before
+    return imported
+
+
+def check_import_file(file, fmt: str):
+    """
+    Проверка начала загруженного файла до запуска фонового импорта: формат, кодировка и колонки CSV.
+    После проверки файл перематывается в начало
+    :param file: Двоичный файл
+    :param fmt: str - Формат: csv или ndjson
+    """
+    stream = io.TextIOWrapper(file, encoding='utf-8', newline='')
+    try:
+        next(read_wallets(stream, fmt), None)
+    finally:
+        stream.detach()
+        file.seek(0)
+
+
+def start_import_job(file, fmt: str, currency: Optional[str] = None) -> WalletImportJob:
+    """
+    Сохранение загруженного файла в settings.WALLET_IMPORT_DIR и запуск импорта в фоновом потоке
+    после фиксации транзакции. Прогресс импорта сохраняется в задании после каждой порции
+    :param file: Двоичный файл
+    :param fmt: str - Формат: csv или ndjson
+    :param currency: str - Валюта для записей без валюты
+    :return: WalletImportJob
+    """
+    os.makedirs(settings.WALLET_IMPORT_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.WALLET_IMPORT_DIR, suffix=f'.{fmt}', delete=False) as saved:
+        shutil.copyfileobj(file, saved)
+    job = WalletImportJob.objects.create(format=fmt, currency=currency, path=saved.name)
+    transaction.on_commit(
+        lambda: threading.Thread(target=_run_import_thread, args=(job.pk,), name='wallet-import', daemon=True).start()
+    )
+    return job
+
+
+def run_import_job(job_id: int):
+    """
+    Выполнение задания импорта; сохраненный файл удаляется после завершения
+    :param job_id: int
+    """
+    job = WalletImportJob.objects.get(pk=job_id)
+    WalletImportJob.objects.filter(pk=job_id).update(status=WalletImportJob.STATUS_RUNNING, updated_at=timezone.now())
+
+    def progress(stats):
+        WalletImportJob.objects.filter(pk=job_id).update(updated_at=timezone.now(), **stats)
+
+    try:
+        with open(job.path, encoding='utf-8', newline='') as stream:
+            import_wallets(stream, job.format, job.currency, progress=progress)
+    except Exception as e:
+        WalletImportJob.objects.filter(pk=job_id).update(
+            status=WalletImportJob.STATUS_FAILED, error=str(e), updated_at=timezone.now())
+    else:
+        WalletImportJob.objects.filter(pk=job_id).update(status=WalletImportJob.STATUS_DONE, updated_at=timezone.now())
+    finally:
+        if os.path.exists(job.path):
+            os.remove(job.path)
+
+
+def _run_import_thread(job_id: int):
+    try:
+        run_import_job(job_id)
+    finally:
+        # Соединение с базой открыто в этом потоке и само не закроется
+        connection.close()
+
+
+def expire_import_jobs(stall_timeout: Optional[float] = None) -> int:
+    """
+    Завершение заданий, прогресс которых не обновлялся дольше stall_timeout: процесс с потоком импорта
+    перезапущен. Порции до сбоя уже сохранены, повторный импорт того же файла пропустит их кошельки
+    :param stall_timeout: float - Время в секундах, по умолчанию settings.WALLET_IMPORT_STALL_TIMEOUT
+    :return: int - Число завершенных заданий
+    """
+    stall_timeout = settings.WALLET_IMPORT_STALL_TIMEOUT if stall_timeout is None else stall_timeout
+    return WalletImportJob.objects.filter(
+        status__in=(WalletImportJob.STATUS_PENDING, WalletImportJob.STATUS_RUNNING),
+        updated_at__lt=timezone.now() - timedelta(seconds=stall_timeout),
+    ).update(status=WalletImportJob.STATUS_FAILED, error='Импорт прерван', updated_at=timezone.now())
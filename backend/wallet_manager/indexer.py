@@ -0,0 +1,134 @@
+from typing import Iterable, List, Optional, Set
+
+from django.conf import settings
+
+from .addresses import address_to_bytes, normalize_address
+from .managers import CryptoManager
+from .models import BlockFollowerState, Wallet
+
+
+class AddressSet:
+    """
+    Множество адресов кошельков валюты в памяти процесса.
+    Адреса хранятся как 20-байтные ключи; новые кошельки догружаются по возрастанию id
+    """
+
+    def __init__(self, currency: str, batch_size: Optional[int] = None):
+        self.currency = currency
+        self.batch_size = batch_size or settings.WALLET_BULK_BATCH_SIZE
+        self.last_id = 0
+        self._addresses: Set[bytes] = set()
+
+    def reload(self) -> int:
+        """
+        Загрузка кошельков, созданных после предыдущей загрузки
+        :return: int - Число добавленных адресов
+        """
+        added = 0
+        while True:
+            rows = list(
+                Wallet.objects.filter(currency=self.currency, id__gt=self.last_id)
+                .order_by('id').values_list('id', 'address')[:self.batch_size]
+            )
+            if not rows:
+                return added
+            self.last_id = rows[-1][0]
+            for _, key in rows:
+                if key is not None:
+                    # PostgreSQL возвращает bytea как memoryview
+                    self._addresses.add(bytes(key))
+                    added += 1
+
+    def filter(self, addresses: Iterable[str]) -> List[str]:
+        """
+        Отбор адресов, принадлежащих кошелькам системы
+        :param addresses: Iterable[str] - Адреса 0x...
+        :return: List[str] - Найденные адреса
+        """
+        return [address for address in addresses if address_to_bytes(address) in self._addresses]
+
+    def __contains__(self, address: str) -> bool:
+        return address_to_bytes(address) in self._addresses
+
+    def __len__(self):
+        return len(self._addresses)
+
+
+class BlockFollower:
+    """
+    Индексатор блоков одной валюты.
+    Просматривает новые блоки, находит в них адреса кошельков системы и сохраняет в базу балансы
+    только этих кошельков; кошельки, баланс которых еще не прочитан, дозагружаются порциями
+    """
+
+    def __init__(self, currency: str):
+        self.currency = currency
+        self.manager = CryptoManager(settings.ETH_API_KEY, currency)
+        self.addresses = AddressSet(currency)
+        self._backfill_id = 0
+
+    def step(self) -> int:
+        """
+        Обработка блоков, появившихся после последнего обработанного, но не более BLOCK_FOLLOWER_MAX_BLOCKS за шаг
+        :return: int - Число обновленных балансов
+        """
+        self.addresses.reload()
+        head = self.manager.get_block_number()
+        state = BlockFollowerState.objects.filter(currency=self.currency).first()
+
+        updated = 0
+        # Без сохраненного состояния индексатор начинает с текущего блока, прошлые балансы дозагружаются
+        start = head if state is None else state.block_number + 1
+        if start <= head:
+            end = min(head, start + settings.BLOCK_FOLLOWER_MAX_BLOCKS - 1)
+            blocks = self.manager.get_blocks(list(range(start, end + 1)))
+            if state is not None and blocks[0]['parent_hash'] != state.block_hash:
+                # Реорганизация: последний обработанный блок больше не в цепочке, повторяем последние блоки
+                start = max(state.block_number - settings.BLOCK_FOLLOWER_REORG_DEPTH + 1, 0)
+                blocks = self.manager.get_blocks(list(range(start, end + 1)))
+
+            touched = {
+                normalize_address(address) for block in blocks for address in self.addresses.filter(block['addresses'])
+            }
+            updated += self.refresh(list(touched), end)
+            BlockFollowerState.objects.update_or_create(
+                currency=self.currency, defaults={'block_number': end, 'block_hash': blocks[-1]['hash']},
+            )
+
+        updated += self.backfill(head)
+        return updated
+
+    def backfill(self, block: int) -> int:
+        """
+        Дозагрузка балансов кошельков, которые еще ни разу не индексировались
+        :param block: int - Текущий блок
+        :return: int - Число обновленных балансов
+        """
+        public_keys = list(
+            Wallet.objects.filter(currency=self.currency, balance_block__isnull=True, id__gt=self._backfill_id)
+            .order_by('id').values_list('id', 'public_key')[:settings.BLOCK_FOLLOWER_BACKFILL_SIZE]
+        )
+        # Проходим кошельки по кругу, чтобы адреса, баланс которых не читается, не блокировали остальные
+        self._backfill_id = public_keys[-1][0] if public_keys else 0
+        return self.refresh([public_key for _, public_key in public_keys], block)
+
+    def refresh(self, public_keys: List[str], block: int) -> int:
+        """
+        Чтение балансов у ноды и их сохранение в базу
+        :param public_keys: List[str] - Публичные ключи кошельков
+        :param block: int - Блок, не раньше которого прочитаны балансы
+        :return: int - Число обновленных балансов
+        """
+        if not public_keys:
+            return 0
+        balances = {
+            address_to_bytes(item['address']): item['balance']
+            for item in self.manager.get_balances(public_keys) if item.get('balance') is not None
+        }
+        balances.pop(None, None)
+        wallets = list(Wallet.objects.filter(currency=self.currency, address__in=list(balances)))
+        for wallet in wallets:
+            wallet.balance = balances[bytes(wallet.address)]
+            wallet.balance_block = block
+        Wallet.objects.bulk_update(wallets, ['balance', 'balance_block'], batch_size=settings.WALLET_BULK_BATCH_SIZE)
+        return len(wallets)
@@ -0,0 +1,297 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+# Баланс, который нода возвращает для любого адреса, чтобы переводы проходили проверку баланса
+SIMULATED_BALANCE = 10 ** 24
+
+
+class SimulatedNode(ThreadingHTTPServer):
+    """
+    Локальная замена ноды Ethereum для нагрузочного тестирования.
+    Отвечает на JSON-RPC вызовы, которые использует сервис, с настраиваемой задержкой, разбросом задержки,
+    долей ответов 429 и ограничением размера batch-запроса. Счетчики вызовов доступны по GET /stats
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.05, jitter: float = 0.0,
+                 rate_limit: float = 0.0, max_batch: Optional[int] = None, block_time: float = 12.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.max_batch = max_batch
+        self.block_time = block_time
+        self.started_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._counters = Counter()
+        self._calls = Counter()
+        self._sent = Counter()
+        self.handlers: Dict[str, Callable] = {
+            'eth_chainId': lambda: '0x539',
+            'eth_blockNumber': lambda: hex(self.block_number),
+            'eth_gasPrice': lambda: hex(2 * 10 ** 9),
+            'eth_feeHistory': self._fee_history,
+            'eth_getBalance': lambda address, block: hex(SIMULATED_BALANCE),
+            'eth_getTransactionCount': lambda address, block: hex(self._sent[address.lower()]),
+            'eth_sendTransaction': self._send_transaction,
+            'eth_sendRawTransaction': lambda raw: '0x' + os.urandom(32).hex(),
+            'eth_getTransactionReceipt': lambda transaction_hash: None,
+            'eth_getBlockByNumber': self._get_block,
+        }
+        super().__init__((host, port), SimulatedNodeHandler)
+        self.url = f'http://{self.server_address[0]}:{self.server_address[1]}/'
+
+    @property
+    def block_number(self) -> int:
+        # Блоки появляются раз в block_time секунд
+        return 1000000 + int((time.monotonic() - self.started_at) / self.block_time)
+
+    def _fee_history(self, count, newest, percentiles):
+        blocks = int(count, 16)
+        return {
+            'oldestBlock': hex(self.block_number - blocks + 1),
+            'baseFeePerGas': [hex(10 ** 9)] * (blocks + 1),
+            'gasUsedRatio': [0.5] * blocks,
+            'reward': [[hex(10 ** 8)] for _ in range(blocks)],
+        }
+
+    def _send_transaction(self, transaction: dict) -> str:
+        with self._lock:
+            self._sent[transaction['from'].lower()] += 1
+        return '0x' + os.urandom(32).hex()
+
+    def _get_block(self, number, full_transactions):
+        block = self.block_number if number in ('latest', 'pending', 'safe', 'finalized') else int(number, 16)
+        return {
+            'number': hex(block),
+            'hash': '0x' + block.to_bytes(32, 'big').hex(),
+            'parentHash': '0x' + (block - 1).to_bytes(32, 'big').hex(),
+            'transactions': [],
+        }
+
+    def handle_call(self, call: dict) -> dict:
+        method = call.get('method')
+        with self._lock:
+            self._calls[method] += 1
+        handler = self.handlers.get(method)
+        if handler is None:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32601, 'message': 'Method not found'}}
+        try:
+            result = handler(*call.get('params', []))
+        except (TypeError, ValueError, KeyError) as e:
+            return {'jsonrpc': '2.0', 'id': call.get('id'), 'error': {'code': -32602, 'message': str(e)}}
+        return {'jsonrpc': '2.0', 'id': call.get('id'), 'result': result}
+
+    def count(self, name: str):
+        with self._lock:
+            self._counters[name] += 1
+
+    def delay(self) -> float:
+        return max(self.latency + random.uniform(-self.jitter, self.jitter), 0.0)
+
+    def stats(self) -> dict:
+        """
+        Счетчики: HTTP-запросы, batch-запросы, ответы 429 и вызовы по методам
+        :return: dict
+        """
+        with self._lock:
+            return {**self._counters, 'calls': dict(self._calls)}
+
+    def start(self) -> 'SimulatedNode':
+        threading.Thread(target=self.serve_forever, name='simulated-node', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SimulatedNodeHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('stats'):
+            self.respond(200, self.server.stats())
+        else:
+            self.respond(404, {})
+
+    def do_POST(self):
+        node = self.server
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        node.count('requests')
+        time.sleep(node.delay())
+        if node.rate_limit and random.random() < node.rate_limit:
+            node.count('rate_limited')
+            self.respond(429, {'jsonrpc': '2.0', 'error': {'code': -32005, 'message': 'Too Many Requests'}})
+            return
+        if isinstance(payload, list):
+            node.count('batches')
+            if node.max_batch and len(payload) > node.max_batch:
+                self.respond(200, {'jsonrpc': '2.0', 'id': None,
+                                   'error': {'code': -32600, 'message': f'Batch size exceeds {node.max_batch}'}})
+                return
+            self.respond(200, [node.handle_call(call) for call in payload])
+        else:
+            self.respond(200, node.handle_call(payload))
+
+    def respond(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def percentile(values: List[float], percent: float) -> Optional[float]:
+    """
+    Перцентиль по методу ближайшего ранга
+    :param values: List[float] - Отсортированные значения
+    :param percent: float - Перцентиль от 0 до 100
+    :return: Optional[float] - None для пустого списка
+    """
+    if not values:
+        return None
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class LoadTest:
+    """
+    Нагрузочный тест API с постоянной частотой запросов.
+    Запросы запускаются по расписанию независимо от того, ответил ли сервис на предыдущие, а задержка
+    считается от запланированного времени запуска, поэтому очередь на стороне клиента тоже попадает в замер
+    """
+
+    def __init__(self, base_url: str, rps: float, duration: float, concurrency: int = 64, wallets: int = 100,
+                 node_stats: Optional[Callable[[], dict]] = None, timeout: float = 30.0):
+        """
+        :param base_url: str - Адрес сервиса, например http://127.0.0.1:8000
+        :param rps: float - Частота запросов в секунду
+        :param duration: float - Длительность каждого сценария в секундах
+        :param concurrency: int - Максимальное число одновременных запросов
+        :param wallets: int - Число кошельков, создаваемых для теста
+        :param node_stats: Callable - Получение счетчиков ноды, чтобы посчитать вызовы ноды на сценарий
+        :param timeout: float - Таймаут одного запроса
+        """
+        self.api_url = base_url.rstrip('/') + '/api/v1/'
+        self.rps = rps
+        self.duration = duration
+        self.concurrency = concurrency
+        self.wallets = wallets
+        self.node_stats = node_stats
+        self.timeout = timeout
+        self.public_keys: List[str] = []
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        # Сессия на поток, чтобы соединения переиспользовались
+        if not hasattr(self._local, 'session'):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def setup(self):
+        """
+        Создание кошельков для сценариев через API
+        """
+        response = self.session.post(self.api_url + 'wallets/bulk/', json={'currency': 'ETH', 'count': self.wallets},
+                                     timeout=self.timeout)
+        response.raise_for_status()
+        self.public_keys = response.json()['public_keys']
+
+    def wallets_request(self) -> Tuple[str, str, Optional[dict]]:
+        return 'GET', self.api_url + 'wallets/', None
+
+    def transaction_request(self) -> Tuple[str, str, Optional[dict]]:
+        sender, recipient = random.sample(self.public_keys, 2)
+        return 'POST', self.api_url + 'transaction/', {
+            'from': sender, 'to': recipient, 'amount': '1000', 'currency': 'ETH',
+        }
+
+    def run(self, scenarios: List[str]) -> Dict[str, dict]:
+        """
+        Выполнение сценариев по очереди
+        :param scenarios: List[str] - Сценарии: wallets, transaction
+        :return: Dict[str, dict] - Отчет по каждому сценарию
+        """
+        if not self.public_keys:
+            self.setup()
+        return {scenario: self.run_scenario(getattr(self, f'{scenario}_request')) for scenario in scenarios}
+
+    def run_scenario(self, make_request: Callable[[], Tuple[str, str, Optional[dict]]]) -> dict:
+        """
+        Выполнение одного сценария
+        :param make_request: Callable - Метод, адрес и тело очередного запроса
+        :return: dict - Пропускная способность, перцентили задержки, статусы ответов и вызовы ноды
+        """
+        latencies: List[float] = []
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def fire(scheduled: float, method: str, url: str, body: Optional[dict]):
+            try:
+                status = self.session.request(method, url, json=body, timeout=self.timeout).status_code
+            except requests.RequestException:
+                status = 'error'
+            with lock:
+                latencies.append(time.perf_counter() - scheduled)
+                statuses[status] += 1
+
+        before = self.node_stats() if self.node_stats else None
+        total = max(int(self.rps * self.duration), 1)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            start = time.perf_counter()
+            futures = []
+            for index in range(total):
+                scheduled = start + index / self.rps
+                pause = scheduled - time.perf_counter()
+                if pause > 0:
+                    time.sleep(pause)
+                futures.append(executor.submit(fire, scheduled, *make_request()))
+            wait(futures)
+            elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        report = {
+            'requests': total,
+            'throughput': total / elapsed,
+            'ok': sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400),
+            'statuses': {str(status): count for status, count in statuses.items()},
+            'latency': {
+                name: percentile(latencies, percent)
+                for name, percent in (('p50', 50), ('p90', 90), ('p99', 99), ('max', 100))
+            },
+        }
+        if before is not None:
+            after = self.node_stats()
+            report['upstream'] = {
+                'requests': after.get('requests', 0) - before.get('requests', 0),
+                'rate_limited': after.get('rate_limited', 0) - before.get('rate_limited', 0),
+                'calls': {
+                    method: count - before['calls'].get(method, 0)
+                    for method, count in after['calls'].items() if count - before['calls'].get(method, 0)
+                },
+            }
+        return report
+
+
+def remote_node_stats(node_url: str) -> Callable[[], dict]:
+    """
+    Получение счетчиков ноды, запущенной отдельно (manage.py simulated_node)
+    :param node_url: str
+    :return: Callable[[], dict]
+    """
+    def stats() -> dict:
+        return requests.get(node_url.rstrip('/') + '/stats', timeout=5).json()
+    return stats
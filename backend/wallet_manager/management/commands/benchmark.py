@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet_manager.benchmarks import DEFAULT_SIZES, build_report, compare_results, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Замеры горячих путей сервиса с заглушкой вместо ноды, результаты сохраняются в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                            help='Число кошельков в замерах списка, через запятую')
+        parser.add_argument('--rounds', type=int, default=5, help='Число замеров каждого сценария')
+        parser.add_argument('--only', default=None, help='Выполнять только сценарии, в названии которых есть строка')
+        parser.add_argument('--output', default=None, help='Файл для сохранения результатов')
+        parser.add_argument('--baseline', default=None, help='Файл с результатами для сравнения')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Допустимое замедление относительно baseline, 0.2 - на 20%%')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size]
+        except ValueError:
+            raise CommandError('--sizes должен быть списком чисел через запятую')
+        if options['rounds'] < 1:
+            raise CommandError('Число замеров должно быть положительным')
+
+        def progress(name, result):
+            self.stdout.write(f'{name:<36} median {result["median"] * 1000:10.3f} ms  min {result["min"] * 1000:10.3f} ms')
+
+        results = run_benchmarks(sizes, options['rounds'], options['only'], progress)
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(build_report(results), file, indent=2)
+
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as file:
+                    baseline = json.load(file)['results']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'Не удалось прочитать baseline: {e}')
+            regressions = compare_results(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Замедление относительно baseline:\n' + '\n'.join(regressions))
+            self.stdout.write('Замедлений относительно baseline нет')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet_manager.managers import CryptoManagerError
+from wallet_manager.services import create_wallets
+
+
+class Command(BaseCommand):
+    help = 'Массовое создание кошельков, публичные ключи выводятся построчно'
+
+    def add_arguments(self, parser):
+        parser.add_argument('currency', help='Валюта кошельков')
+        parser.add_argument('count', type=int, help='Число кошельков')
+        parser.add_argument('--batch-size', type=int, default=None, help='Размер пачки INSERT')
+
+    def handle(self, *args, **options):
+        if options['count'] < 1:
+            raise CommandError('Число кошельков должно быть положительным')
+        try:
+            public_keys = create_wallets(options['currency'], options['count'], options['batch_size'])
+        except CryptoManagerError as e:
+            raise CommandError(str(e))
+
+        for public_key in public_keys:
+            self.stdout.write(public_key)
+        self.stderr.write(f'Создано кошельков: {len(public_keys)}')
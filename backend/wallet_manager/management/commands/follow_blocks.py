@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet_manager.indexer import BlockFollower
+from wallet_manager.managers import CURRENCY_MANAGERS
+
+
+class Command(BaseCommand):
+    help = 'Индексатор блоков: обновление сохраненных балансов кошельков, затронутых новыми блоками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', action='append', help='Валюта, по умолчанию все поддерживаемые')
+        parser.add_argument('--once', action='store_true', help='Выполнить один шаг и завершиться')
+        parser.add_argument('--interval', type=float, default=None, help='Интервал проверки нового блока в секундах')
+
+    def handle(self, *args, **options):
+        followers = [BlockFollower(currency) for currency in options['currency'] or list(CURRENCY_MANAGERS)]
+        interval = options['interval'] or settings.BLOCK_FOLLOWER_POLL_INTERVAL
+
+        while True:
+            for follower in followers:
+                try:
+                    updated = follower.step()
+                except Exception as e:
+                    self.stderr.write(f'{follower.currency}: {e}')
+                    continue
+                if updated:
+                    self.stdout.write(f'{follower.currency}: обновлено балансов {updated}')
+            if options['once']:
+                break
+            time.sleep(interval)
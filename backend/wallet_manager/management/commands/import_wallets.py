@@ -0,0 +1,42 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wallet_manager.importer import IMPORT_FORMATS, WalletImportError, import_wallets
+
+
+class Command(BaseCommand):
+    help = 'Импорт существующих кошельков из CSV или NDJSON, прогресс выводится после каждой порции'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу, - для чтения из stdin')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, default=None,
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--currency', default=None, help='Валюта для строк без колонки currency')
+        parser.add_argument('--batch-size', type=int, default=None, help='Число строк в одной порции')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError(f'Не удалось определить формат файла, укажите --format ({", ".join(IMPORT_FORMATS)})')
+
+        def progress(stats):
+            self.stderr.write(
+                f'Прочитано: {stats["read"]}, добавлено: {stats["imported"]}, '
+                f'пропущено: {stats["skipped"]}, некорректных: {stats["invalid"]}'
+            )
+
+        try:
+            stream = sys.stdin if path == '-' else open(path, encoding='utf-8', newline='')
+        except OSError as e:
+            raise CommandError(str(e))
+        try:
+            stats = import_wallets(stream, fmt, options['currency'], options['batch_size'], progress)
+        except WalletImportError as e:
+            raise CommandError(str(e))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write(f'Импортировано кошельков: {stats["imported"]}')
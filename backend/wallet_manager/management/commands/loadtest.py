@@ -0,0 +1,90 @@
+import json
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler, get_internal_wsgi_application
+from django.db import connection
+from django.test.utils import override_settings
+
+from wallet_manager.loadtest import LoadTest, remote_node_stats
+from wallet_manager.management.commands.simulated_node import add_node_arguments, build_node
+
+SCENARIOS = ('wallets', 'transaction')
+
+
+class QuietWSGIRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест API. Без --target сервис и замена ноды запускаются в этом процессе на временной базе, '
+        'с --target нагружается уже запущенный сервис'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', default=None, help='Адрес запущенного сервиса, например http://127.0.0.1:8000')
+        parser.add_argument('--node', default=None,
+                            help='Адрес ноды manage.py simulated_node, чтобы посчитать вызовы ноды (вместе с --target)')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='Сценарии через запятую')
+        parser.add_argument('--rps', type=float, default=50, help='Частота запросов в секунду')
+        parser.add_argument('--duration', type=float, default=10, help='Длительность каждого сценария в секундах')
+        parser.add_argument('--concurrency', type=int, default=64, help='Максимальное число одновременных запросов')
+        parser.add_argument('--wallets', type=int, default=100, help='Число кошельков, создаваемых для теста')
+        parser.add_argument('--output', default=None, help='Файл для сохранения отчета в JSON')
+        add_node_arguments(parser)
+
+    def handle(self, *args, **options):
+        scenarios = [scenario for scenario in options['scenarios'].split(',') if scenario]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+        if options['rps'] <= 0 or options['duration'] <= 0:
+            raise CommandError('--rps и --duration должны быть положительными')
+
+        if options['target']:
+            node_stats = remote_node_stats(options['node']) if options['node'] else None
+            report = self.load(options['target'], node_stats, scenarios, options)
+        else:
+            report = self.run_in_process(scenarios, options)
+
+        for scenario, result in report.items():
+            latency = {name: f'{value * 1000:.1f} ms' if value is not None else '-'
+                       for name, value in result['latency'].items()}
+            self.stdout.write(
+                f'{scenario}: {result["throughput"]:.1f} rps, ok {result["ok"]}/{result["requests"]}, '
+                f'p50 {latency["p50"]}, p90 {latency["p90"]}, p99 {latency["p99"]}, max {latency["max"]}'
+            )
+            if 'upstream' in result:
+                self.stdout.write(f'  вызовы ноды: {result["upstream"]}')
+
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, indent=2)
+
+    def load(self, base_url: str, node_stats, scenarios, options) -> dict:
+        return LoadTest(
+            base_url, options['rps'], options['duration'], options['concurrency'], options['wallets'], node_stats,
+        ).run(scenarios)
+
+    def run_in_process(self, scenarios, options) -> dict:
+        """
+        Запуск сервиса на временной базе и замены ноды в этом процессе
+        """
+        node = build_node(options).start()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        server = None
+        try:
+            with override_settings(ETH_NODE_URL=node.url, ETH_API_KEY='', ALLOWED_HOSTS=['*']):
+                server = ThreadedWSGIServer(('127.0.0.1', 0), QuietWSGIRequestHandler)
+                server.set_app(get_internal_wsgi_application())
+                threading.Thread(target=server.serve_forever, daemon=True).start()
+                return self.load(f'http://127.0.0.1:{server.server_address[1]}', node.stats, scenarios, options)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            node.stop()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
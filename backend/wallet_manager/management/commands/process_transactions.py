@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet_manager.services import process_transaction_queue
+
+
+class Command(BaseCommand):
+    help = 'Воркер очереди отправки транзакций'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Число переводов, забираемых за раз (ограничивает число одновременных отправок)')
+        parser.add_argument('--once', action='store_true', help='Обработать одну пачку и завершиться')
+        parser.add_argument('--interval', type=float, default=None, help='Интервал опроса пустой очереди в секундах')
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.TRANSACTION_QUEUE_POLL_INTERVAL
+
+        while True:
+            try:
+                processed = process_transaction_queue(options['batch_size'])
+            except Exception as e:
+                # Необработанные переводы возвращены в очередь или завершатся по истечении аренды
+                self.stderr.write(str(e))
+                processed = 0
+            if processed:
+                self.stdout.write(f'Обработано переводов: {processed}')
+            if options['once']:
+                break
+            if not processed:
+                time.sleep(interval)
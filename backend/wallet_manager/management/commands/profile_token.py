@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet_manager.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = 'Токен для заголовка X-Profile-Token, включающего профилирование запроса'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Префикс пути запросов, которые можно профилировать')
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            self.stderr.write('Профилирование выключено, запустите сервис с PROFILING_ENABLED=1')
+        self.stdout.write(make_token(options['path']))
@@ -0,0 +1,34 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet_manager.managers import CURRENCY_MANAGERS
+from wallet_manager.services import refill_reservoir
+
+
+class Command(BaseCommand):
+    help = 'Фоновое пополнение запаса заранее сгенерированных аккаунтов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', action='append', help='Валюта, по умолчанию все поддерживаемые')
+        parser.add_argument('--once', action='store_true', help='Выполнить одну проверку и завершиться')
+        parser.add_argument('--interval', type=float, default=None, help='Интервал проверки в секундах')
+
+    def handle(self, *args, **options):
+        currencies = options['currency'] or list(CURRENCY_MANAGERS)
+        interval = options['interval'] or settings.WALLET_RESERVOIR_REFILL_INTERVAL
+
+        while True:
+            for currency in currencies:
+                try:
+                    added = refill_reservoir(currency)
+                except Exception as e:
+                    # Ошибка ноды или базы не останавливает воркер, пополнение повторится на следующей проверке
+                    self.stderr.write(f'{currency}: {e}')
+                    continue
+                if added:
+                    self.stdout.write(f'{currency}: добавлено аккаунтов {added}')
+            if options['once']:
+                break
+            time.sleep(interval)
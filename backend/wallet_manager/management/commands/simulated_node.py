@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from wallet_manager.loadtest import SimulatedNode
+
+
+def add_node_arguments(parser):
+    parser.add_argument('--node-latency', type=float, default=0.05, help='Задержка ответа ноды в секундах')
+    parser.add_argument('--node-jitter', type=float, default=0.01, help='Разброс задержки ноды в секундах')
+    parser.add_argument('--node-429-rate', type=float, default=0.0, help='Доля запросов, на которые нода ответит 429')
+    parser.add_argument('--node-max-batch', type=int, default=None, help='Максимальный размер batch-запроса')
+
+
+def build_node(options, host: str = '127.0.0.1', port: int = 0) -> SimulatedNode:
+    return SimulatedNode(
+        host, port,
+        latency=options['node_latency'],
+        jitter=options['node_jitter'],
+        rate_limit=options['node_429_rate'],
+        max_batch=options['node_max_batch'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Запуск локальной замены ноды Ethereum для нагрузочного тестирования, счетчики вызовов по GET /stats'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес, на котором слушает нода')
+        parser.add_argument('--port', type=int, default=8545, help='Порт ноды')
+        add_node_arguments(parser)
+
+    def handle(self, *args, **options):
+        node = build_node(options, options['host'], options['port'])
+        self.stderr.write(f'Нода запущена на {node.url}, укажите ETH_NODE_URL={node.url} и пустой ETH_API_KEY')
+        try:
+            node.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            node.server_close()
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from wallet_manager.managers import CURRENCY_MANAGERS
+from wallet_manager.services import track_transactions
+
+
+class Command(BaseCommand):
+    help = 'Отслеживание отправленных транзакций: одна проверка квитанций на каждый новый блок'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', action='append', help='Валюта, по умолчанию все поддерживаемые')
+        parser.add_argument('--once', action='store_true', help='Выполнить одну проверку и завершиться')
+        parser.add_argument('--interval', type=float, default=None, help='Интервал проверки нового блока в секундах')
+
+    def handle(self, *args, **options):
+        currencies = options['currency'] or list(CURRENCY_MANAGERS)
+        interval = options['interval'] or settings.TRANSACTION_TRACKER_POLL_INTERVAL
+        checked = {}
+
+        while True:
+            for currency in currencies:
+                try:
+                    checked[currency] = track_transactions(currency, after_block=checked.get(currency))
+                except Exception as e:
+                    self.stderr.write(f'{currency}: {e}')
+            if options['once']:
+                break
+            time.sleep(interval)
@@ -1,6 +1,8 @@
-from typing import List
+from typing import List, Optional
 
-from .abs_manager import AbsManager
+from ..metrics import instrument_manager
+from .abs_manager import AbsManager, TransfersNotSentError
+from .cache import balance_cache
 from .ethereum import EthereumManager
 
 CURRENCY_MANAGERS = {
@@ -34,22 +36,121 @@ class CryptoManager:
         if not isinstance(self.manager, AbsManager):
             raise CryptoManagerError(f'Менеджер валюты {currency} не является наследником AbsManager')
 
+    @instrument_manager
+    def get_block_number(self) -> int:
+        """
+        Получение номера текущего блока, номер кэшируется на короткое время
+        :return: block: int - Номер блока
+        """
+        block = balance_cache.head(self.currency)
+        if block is None:
+            block = self.manager.get_block_number()
+            balance_cache.observe_block(self.currency, block)
+        return block
+
+    @instrument_manager
     def get_balance(self, address: str) -> int:
         """
         Получение баланса по публичному ключу
         :param address: str - Публичный ключ
         :return: balance: int - Баланс
         """
-        return self.manager.get_balance(address)
+        if not balance_cache.enabled:
+            return self.manager.get_balance(address)
 
+        block = self.get_block_number()
+        cached = balance_cache.get_many(self.currency, [address], block)
+        if address in cached:
+            return cached[address]
+
+        balance = self.manager.get_balance(address, block)
+        balance_cache.set_many(self.currency, {address: balance}, block)
+        return balance
+
+    @instrument_manager
     def get_balances(self, addresses: List[str]) -> List[dict]:
         """
-        Получение балансов по публичным ключам
+        Получение балансов по публичным ключам.
+        Балансы, прочитанные на текущем блоке, берутся из кэша, к ноде уходят только остальные адреса
         :param addresses: List[str] - Публичные ключи
         :return: balances: List[dict] - Балансы
         """
-        return self.manager.get_balances(addresses)
+        if not balance_cache.enabled:
+            return self.manager.get_balances(addresses)
+
+        block = self.get_block_number()
+        cached = balance_cache.get_many(self.currency, addresses, block)
+        missing = [address for address in addresses if address not in cached]
+        fetched = self.manager.get_balances(missing, block) if missing else []
+        return self._merge_balances(addresses, cached, fetched, block)
+
+    @instrument_manager
+    async def aget_block_number(self) -> int:
+        """
+        Асинхронное получение номера текущего блока
+        :return: block: int - Номер блока
+        """
+        block = balance_cache.head(self.currency)
+        if block is None:
+            block = await self.manager.aget_block_number()
+            balance_cache.observe_block(self.currency, block)
+        return block
+
+    @instrument_manager
+    async def aget_balances(self, addresses: List[str]) -> List[dict]:
+        """
+        Асинхронное получение балансов по публичным ключам
+        :param addresses: List[str] - Публичные ключи
+        :return: balances: List[dict] - Балансы
+        """
+        if not balance_cache.enabled:
+            return await self.manager.aget_balances(addresses)
+
+        block = await self.aget_block_number()
+        cached = balance_cache.get_many(self.currency, addresses, block)
+        missing = [address for address in addresses if address not in cached]
+        fetched = await self.manager.aget_balances(missing, block) if missing else []
+        return self._merge_balances(addresses, cached, fetched, block)
+
+    def _merge_balances(self, addresses: List[str], cached: dict, fetched: List[dict], block: int) -> List[dict]:
+        """
+        Сохранение полученных от ноды балансов в кэш и объединение их с балансами из кэша
+        :param addresses: List[str] - Публичные ключи в порядке запроса
+        :param cached: dict - Балансы из кэша
+        :param fetched: List[dict] - Балансы, полученные от ноды
+        :param block: int - Номер блока, на котором прочитаны балансы
+        :return: balances: List[dict] - Балансы
+        """
+        fetched = {balance['address']: balance for balance in fetched}
+        balance_cache.set_many(
+            self.currency,
+            {address: item['balance'] for address, item in fetched.items() if 'error' not in item},
+            block,
+        )
+        return [
+            {'address': address, 'balance': cached[address]} if address in cached else fetched[address]
+            for address in addresses
+        ]
+
+    @instrument_manager
+    def get_receipts(self, hashes: List[str]) -> List[Optional[dict]]:
+        """
+        Получение квитанций транзакций
+        :param hashes: List[str] - Хэши транзакций
+        :return: receipts: List[Optional[dict]] - Квитанции в порядке хэшей
+        """
+        return self.manager.get_receipts(hashes)
+
+    @instrument_manager
+    def get_blocks(self, block_numbers: List[int]) -> List[dict]:
+        """
+        Получение блоков с адресами, балансы которых они изменили
+        :param block_numbers: List[int] - Номера блоков
+        :return: blocks: List[dict] - Блоки в порядке номеров
+        """
+        return self.manager.get_blocks(block_numbers)
 
+    @instrument_manager
     def get_accounts(self):
         """
         Получение списка аккаунтов
@@ -57,6 +158,7 @@ class CryptoManager:
         """
         return self.manager.get_accounts()
 
+    @instrument_manager
     def get_new_account(self):
         """
         Получение нового аккаунта
@@ -64,6 +166,24 @@ class CryptoManager:
         """
         return self.manager.get_new_account()
 
+    @instrument_manager
+    def get_new_accounts(self, count: int) -> List[dict]:
+        """
+        Получение нескольких новых аккаунтов
+        :param count: int - Число аккаунтов
+        :return: accounts: List[dict] - Новые аккаунты
+        """
+        return self.manager.get_new_accounts(count)
+
+    @instrument_manager
+    async def aget_new_account(self):
+        """
+        Асинхронное получение нового аккаунта
+        :return: account: dict - Новый аккаунт
+        """
+        return await self.manager.aget_new_account()
+
+    @instrument_manager
     def make_transaction(self, from_address: str, to_address: str, amount: int) -> str:
         """
         Создание транзакции
@@ -72,4 +192,55 @@ class CryptoManager:
         :param amount: int - Сумма перевода
         :return: hash: str - Хэш транзакции
         """
-        return self.manager.make_transaction(from_address, to_address, amount)
+        try:
+            return self.manager.make_transaction(from_address, to_address, amount)
+        finally:
+            # Балансы обоих участников больше не актуальны
+            balance_cache.invalidate(self.currency, [from_address, to_address])
+
+    @instrument_manager
+    async def amake_transaction(self, from_address: str, to_address: str, amount: int) -> str:
+        """
+        Асинхронное создание транзакции
+        :param from_address: str - Адрес отправителя
+        :param to_address: str - Адрес получателя
+        :param amount: int - Сумма перевода
+        :return: hash: str - Хэш транзакции
+        """
+        try:
+            return await self.manager.amake_transaction(from_address, to_address, amount)
+        finally:
+            balance_cache.invalidate(self.currency, [from_address, to_address])
+
+    @instrument_manager
+    def make_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Пакетная отправка переводов
+        :param transfers: List[dict] - Переводы с ключами from, to, amount и private_key отправителя
+        :return: results: List[dict] - Хэши транзакций или ошибки в порядке переводов
+        """
+        try:
+            return self.manager.make_transactions(transfers)
+        finally:
+            balance_cache.invalidate(self.currency, self._participants(transfers))
+
+    @instrument_manager
+    async def amake_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Асинхронная пакетная отправка переводов
+        :param transfers: List[dict] - Переводы с ключами from, to, amount и private_key отправителя
+        :return: results: List[dict] - Хэши транзакций или ошибки в порядке переводов
+        """
+        try:
+            return await self.manager.amake_transactions(transfers)
+        finally:
+            balance_cache.invalidate(self.currency, self._participants(transfers))
+
+    @staticmethod
+    def _participants(transfers: List[dict]) -> List[str]:
+        """
+        Адреса отправителей и получателей переводов без повторов
+        :param transfers: List[dict] - Переводы
+        :return: List[str]
+        """
+        return list({address for transfer in transfers for address in (transfer['from'], transfer['to'])})
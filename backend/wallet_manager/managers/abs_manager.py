@@ -1,30 +1,70 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional, Union
+
+
+class TransfersNotSentError(Exception):
+    """
+    Переводы не отправлены: ошибка произошла до отправки транзакций в сеть, поэтому их можно повторить
+    """
+    pass
 
 
 class AbsManager(ABC):
     """
     Абстрактный класс для работы с криптовалютами
-    Все менеджеры должны наследоваться от этого класса и предоставлять реализацию всех методов
+    Все менеджеры должны наследоваться от этого класса и предоставлять реализацию всех методов.
+    Асинхронные методы по умолчанию выполняют синхронные в отдельном потоке,
+    менеджеры с собственным асинхронным клиентом переопределяют их
     """
     @abstractmethod
-    def get_balance(self, address: str) -> int:
+    def get_block_number(self) -> int:
+        """
+        Абстрактный метод для получения номера текущего блока
+        :return: block: int - Номер блока
+        """
+        pass
+
+    @abstractmethod
+    def get_balance(self, address: str, block_identifier: Union[int, str] = 'latest') -> int:
         """
         Абстрактный метод для получения баланса по публичному ключу
         :param address: str - Публичный ключ
+        :param block_identifier: Union[int, str] - Номер блока, на котором читается баланс
         :return: balance: int - Баланс
         """
         pass
 
     @abstractmethod
-    def get_balances(self, addresses: List[str]) -> List[dict]:
+    def get_balances(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
         """
         Абстрактный метод для получения списка балансов по публичным ключам
         :param addresses: List[str]
+        :param block_identifier: Union[int, str] - Номер блока, на котором читаются балансы
         :return: dict
         """
         pass
 
+    @abstractmethod
+    def get_receipts(self, hashes: List[str]) -> List[Optional[dict]]:
+        """
+        Абстрактный метод для получения квитанций транзакций
+        :param hashes: List[str] - Хэши транзакций
+        :return: List[Optional[dict]] - Квитанции с ключами block_number, block_hash и status (1 - успешно)
+        в порядке хэшей; None, если транзакция не включена в блок; {'error': ...} при ошибке ноды
+        """
+        pass
+
+    @abstractmethod
+    def get_blocks(self, block_numbers: List[int]) -> List[dict]:
+        """
+        Абстрактный метод для получения блоков
+        :param block_numbers: List[int] - Номера блоков
+        :return: List[dict] - Блоки с ключами number, hash, parent_hash и addresses
+        (адреса в нижнем регистре, балансы которых изменил блок) в порядке номеров
+        """
+        pass
+
     @abstractmethod
     def get_accounts(self) -> List[str]:
         """
@@ -41,6 +81,15 @@ class AbsManager(ABC):
         """
         pass
 
+    def get_new_accounts(self, count: int) -> List[dict]:
+        """
+        Метод для получения нескольких новых аккаунтов, менеджеры могут переопределить его
+        для параллельной генерации ключей
+        :param count: int - Число аккаунтов
+        :return: List[dict]
+        """
+        return [self.get_new_account() for _ in range(count)]
+
     @abstractmethod
     def make_transaction(self, from_address: str, to_address: str, amount: int) -> str:
         """
@@ -52,6 +101,21 @@ class AbsManager(ABC):
         """
         pass
 
+    def make_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Метод для пакетной отправки переводов, по умолчанию переводы отправляются по одному.
+        Менеджеры могут переопределить его для локальной подписи и пакетной отправки
+        :param transfers: List[dict] - Переводы с ключами from, to, amount и private_key отправителя
+        :return: List[dict] - Результаты в порядке переводов: {'hash': ...} или {'error': ...}
+        """
+        results = []
+        for transfer in transfers:
+            try:
+                results.append({'hash': self.make_transaction(transfer['from'], transfer['to'], transfer['amount'])})
+            except Exception as e:
+                results.append({'error': str(e)})
+        return results
+
     @abstractmethod
     def connected(self) -> bool:
         """
@@ -59,3 +123,53 @@ class AbsManager(ABC):
         :return: bool
         """
         pass
+
+    async def aget_block_number(self) -> int:
+        """
+        Асинхронный метод для получения номера текущего блока
+        :return: block: int - Номер блока
+        """
+        return await asyncio.to_thread(self.get_block_number)
+
+    async def aget_balance(self, address: str, block_identifier: Union[int, str] = 'latest') -> int:
+        """
+        Асинхронный метод для получения баланса по публичному ключу
+        :param address: str - Публичный ключ
+        :param block_identifier: Union[int, str] - Номер блока, на котором читается баланс
+        :return: balance: int - Баланс
+        """
+        return await asyncio.to_thread(self.get_balance, address, block_identifier)
+
+    async def aget_balances(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
+        """
+        Асинхронный метод для получения списка балансов по публичным ключам
+        :param addresses: List[str]
+        :param block_identifier: Union[int, str] - Номер блока, на котором читаются балансы
+        :return: dict
+        """
+        return await asyncio.to_thread(self.get_balances, addresses, block_identifier)
+
+    async def aget_new_account(self) -> dict:
+        """
+        Асинхронный метод для получения нового аккаунта, генерация ключей выполняется в отдельном потоке
+        :return: dict
+        """
+        return await asyncio.to_thread(self.get_new_account)
+
+    async def amake_transaction(self, from_address: str, to_address: str, amount: int) -> str:
+        """
+        Асинхронный метод для создания транзакции
+        :param from_address: str - Адрес отправителя
+        :param to_address: str - Адрес получателя
+        :param amount: int - Сумма перевода
+        :return: hash: str - Хэш транзакции
+        """
+        return await asyncio.to_thread(self.make_transaction, from_address, to_address, amount)
+
+    async def amake_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Асинхронный метод для пакетной отправки переводов
+        :param transfers: List[dict] - Переводы с ключами from, to, amount и private_key отправителя
+        :return: List[dict] - Результаты в порядке переводов
+        """
+        return await asyncio.to_thread(self.make_transactions, transfers)
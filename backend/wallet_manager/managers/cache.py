@@ -0,0 +1,124 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+
+class BalanceCache:
+    """
+    Кэш балансов процесса.
+    Записи ключуются по (валюта, адрес) и помечаются номером блока, на котором баланс был прочитан.
+    Запись действительна, пока не истек TTL и пока не замечен новый блок;
+    при превышении размера вытесняются давно не использованные записи
+    """
+
+    def __init__(self, max_size: Optional[int] = None, ttl: Optional[float] = None, head_ttl: Optional[float] = None):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._head_ttl = head_ttl
+        self._entries = OrderedDict()
+        self._heads = {}
+        self._lock = threading.Lock()
+
+    @property
+    def max_size(self) -> int:
+        return settings.ETH_BALANCE_CACHE_SIZE if self._max_size is None else self._max_size
+
+    @property
+    def ttl(self) -> float:
+        return settings.ETH_BALANCE_CACHE_TTL if self._ttl is None else self._ttl
+
+    @property
+    def head_ttl(self) -> float:
+        return settings.ETH_BLOCK_NUMBER_TTL if self._head_ttl is None else self._head_ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def head(self, currency: str) -> Optional[int]:
+        """
+        Последний замеченный номер блока, если он получен не раньше head_ttl секунд назад
+        :param currency: str - Валюта
+        :return: block: Optional[int] - Номер блока
+        """
+        head = self._heads.get(currency)
+        if head is None or time.monotonic() - head[1] > self.head_ttl:
+            return None
+        return head[0]
+
+    def observe_block(self, currency: str, block: int):
+        """
+        Регистрация номера текущего блока.
+        Записи, прочитанные на более ранних блоках, перестают быть действительными
+        :param currency: str - Валюта
+        :param block: int - Номер блока
+        """
+        with self._lock:
+            head = self._heads.get(currency)
+            if head is None or block >= head[0]:
+                self._heads[currency] = (block, time.monotonic())
+
+    def get_many(self, currency: str, addresses: Iterable[str], block: int) -> Dict[str, int]:
+        """
+        Получение действительных балансов из кэша
+        :param currency: str - Валюта
+        :param addresses: Iterable[str] - Адреса
+        :param block: int - Номер блока, на котором должен быть прочитан баланс
+        :return: Dict[str, int] - Балансы по найденным адресам
+        """
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for address in addresses:
+                key = (currency, address)
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                balance, entry_block, stored_at = entry
+                if entry_block != block or now - stored_at > self.ttl:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                found[address] = balance
+        return found
+
+    def set_many(self, currency: str, balances: Dict[str, int], block: int):
+        """
+        Сохранение балансов, прочитанных на блоке block
+        :param currency: str - Валюта
+        :param balances: Dict[str, int] - Балансы по адресам
+        :param block: int - Номер блока
+        """
+        now = time.monotonic()
+        max_size = self.max_size
+        with self._lock:
+            for address, balance in balances.items():
+                key = (currency, address)
+                self._entries[key] = (balance, block, now)
+                self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, currency: str, addresses: List[str]):
+        """
+        Удаление балансов адресов из кэша, например после транзакции между ними
+        :param currency: str - Валюта
+        :param addresses: List[str] - Адреса
+        """
+        with self._lock:
+            for address in addresses:
+                self._entries.pop((currency, address), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._heads.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+balance_cache = BalanceCache()
@@ -0,0 +1,486 @@
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+import requests
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from web3 import AsyncHTTPProvider, AsyncWeb3, HTTPProvider, Web3
+from web3.middleware.async_cache import async_construct_simple_cache_middleware
+
+from .. import metrics, profiling
+from .coalesce import SingleFlight
+from .fees import FeeOracle
+from .routing import STICKY_METHODS, NodeEndpoint, is_node_failure, rank_endpoints
+from .scheduler import RPC_LIMIT_EXCEEDED, RetryableError, RpcScheduler
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """
+    HTTP-провайдер, отправляющий запросы через общий для клиента пул соединений
+    (стандартный провайдер web3 заводит отдельную сессию на каждый поток)
+    """
+
+    def __init__(self, endpoint_uri: str, session: requests.Session, request_kwargs: Optional[dict] = None):
+        super().__init__(endpoint_uri, request_kwargs)
+        self.session = session
+
+    def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        response = self.session.post(self.endpoint_uri, data=request_data, **self.get_request_kwargs())
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+class PooledAsyncHTTPProvider(AsyncHTTPProvider):
+    """
+    Асинхронный HTTP-провайдер, отправляющий запросы через клиента ноды:
+    долгоживущую aiohttp-сессию, планировщик и выбор ноды из списка
+    """
+
+    def __init__(self, client: 'NodeClient'):
+        super().__init__(client.url)
+        self.client = client
+
+    async def make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        return await self.client.send(request_data, {method: 1})
+
+
+class RpcError(Exception):
+    """
+    Ошибка JSON-RPC, возвращенная нодой для отдельного вызова
+    """
+    def __init__(self, code: int, message: str):
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return f'{self.message} (code {self.code})'
+
+    @classmethod
+    def from_response(cls, error: Any, default: str = '') -> 'RpcError':
+        """
+        Ошибка из поля error ответа: по спецификации это объект с code и message,
+        но некоторые ноды и прокси возвращают строку
+        :param error: Any - Значение поля error
+        :param default: str - Сообщение, если нода его не передала
+        :return: RpcError
+        """
+        if isinstance(error, dict):
+            return cls(error.get('code', 0), error.get('message', default))
+        return cls(0, str(error) if error else default)
+
+
+class NodeClient:
+    """
+    Долгоживущий клиент ноды.
+    Держит пул keep-alive соединений для синхронного Web3 и собственный цикл событий
+    в отдельном потоке для AsyncWeb3, чтобы соединения переиспользовались между запросами.
+    Клиенту можно передать несколько нод: чтение идет на самую быструю доступную ноду
+    (с дублированием запроса на следующую, если ответ задерживается), запись - на основную ноду,
+    которая меняется только при ее отказе
+    """
+
+    def __init__(self, url: Union[str, List[str]], pool_size: int, keepalive: float, timeout: float,
+                 scheduler: Optional[RpcScheduler] = None):
+        urls = [url] if isinstance(url, str) else list(url)
+        self.url = urls[0]
+        self.pool_size = pool_size
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.closed = False
+        # Возможности ноды, выясненные во время работы, например наличие контракта Multicall3
+        self.capabilities = {}
+        # Одновременные одинаковые чтения объединяются в один запрос к ноде
+        self.single_flight = SingleFlight()
+        self._ids = itertools.count(1)
+        self.endpoints = [NodeEndpoint(urls[0], scheduler)] + [NodeEndpoint(extra_url) for extra_url in urls[1:]]
+        self.scheduler = self.endpoints[0].scheduler
+        self.primary = self.endpoints[0]
+        self.hedge_after = settings.ETH_NODE_HEDGE_AFTER
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.web3 = Web3(PooledHTTPProvider(self.url, self.session, {'timeout': timeout}))
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=f'node-client-{id(self)}', daemon=True)
+        self._thread.start()
+
+        self.async_session = self.run(self._create_async_session())
+        self.web3async = AsyncWeb3(PooledAsyncHTTPProvider(self))
+        # Комиссии берутся из оракула, поэтому запрос последнего блока при каждой отправке не нужен,
+        # а chain id ноды не меняется и кэшируется
+        self.web3async.middleware_onion.remove('gas_price_strategy')
+        self.web3async.middleware_onion.add(
+            self.run(async_construct_simple_cache_middleware(rpc_whitelist={'eth_chainId'})), 'chain_id_cache',
+        )
+        self.fees = FeeOracle.from_settings(self)
+        self._health_task = None
+        if len(self.endpoints) > 1:
+            self._health_task = asyncio.run_coroutine_threadsafe(self._check_health(), self.loop)
+
+    async def _create_async_session(self) -> ClientSession:
+        """
+        Создание aiohttp-сессии, сессия должна создаваться внутри цикла событий клиента
+        :return: ClientSession
+        """
+        connector = TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive)
+        return ClientSession(connector=connector, timeout=ClientTimeout(total=self.timeout))
+
+    async def send(self, payload: Union[str, bytes], methods: Dict[str, int], cost: int = 1) -> Any:
+        """
+        Отправка тела JSON-RPC запроса на выбранную ноду
+        :param payload: Union[str, bytes] - Тело запроса
+        :param methods: Dict[str, int] - Методы, вызываемые в запросе
+        :param cost: int - Стоимость запроса в токенах планировщика
+        :return: Any - Разобранный ответ ноды
+        """
+        profile = profiling.current()
+        if profile is None:
+            return await self._measure(payload, methods, cost)
+        profile.io_started()
+        try:
+            return await self._measure(payload, methods, cost)
+        finally:
+            profile.io_finished()
+
+    async def _measure(self, payload: Union[str, bytes], methods: Dict[str, int], cost: int) -> Any:
+        """
+        Метрики запроса к ноде: выполняющиеся запросы, время, число вызовов и ошибки
+        """
+        if not metrics.enabled():
+            return await self._route(payload, methods, cost)
+        metrics.rpc_in_flight.inc()
+        started = time.perf_counter()
+        error = None
+        try:
+            return await self._route(payload, methods, cost)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            metrics.rpc_in_flight.dec()
+            metrics.observe_rpc(methods, started, error)
+
+    async def _route(self, payload: Union[str, bytes], methods: Dict[str, int], cost: int) -> Any:
+        """
+        Выбор ноды для запроса: одна нода, основная нода для отправки транзакций или самая быстрая для чтения
+        """
+        if len(self.endpoints) == 1:
+            return await self._call(self.primary, payload, cost)
+        if methods.keys() & STICKY_METHODS:
+            return await self._send_sticky(payload, cost)
+        return await self._send_fastest(payload, cost)
+
+    async def _send_sticky(self, payload: Union[str, bytes], cost: int) -> Any:
+        """
+        Отправка на основную ноду; при ее отказе основной становится следующая доступная нода
+        """
+        start = self.endpoints.index(self.primary)
+        order = self.endpoints[start:] + self.endpoints[:start]
+        order = [endpoint for endpoint in order if endpoint.healthy] or order
+        error = None
+        for index, endpoint in enumerate(order):
+            try:
+                body = await self._call(endpoint, payload, cost, last=index == len(order) - 1)
+            except Exception as e:
+                if not is_node_failure(e):
+                    raise
+                error = e
+                continue
+            self.primary = endpoint
+            return body
+        raise error
+
+    async def _send_fastest(self, payload: Union[str, bytes], cost: int) -> Any:
+        """
+        Отправка на самую быструю доступную ноду с переходом на следующую при отказе.
+        Если нода не ответила за ETH_NODE_HEDGE_AFTER секунд, запрос дублируется на следующую ноду
+        и используется первый успешный ответ
+        """
+        candidates = rank_endpoints(self.endpoints)
+        error = None
+        while candidates:
+            endpoint = candidates.pop(0)
+            pending = {asyncio.ensure_future(self._call(endpoint, payload, cost, last=not candidates))}
+            hedged = False
+            while pending:
+                timeout = self.hedge_after if self.hedge_after and candidates and not hedged else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    pending.add(asyncio.ensure_future(
+                        self._call(candidates.pop(0), payload, cost, last=not candidates)
+                    ))
+                    continue
+                errors = [task.exception() for task in done]
+                for task, task_error in zip(done, errors):
+                    if task_error is None:
+                        for task_pending in pending:
+                            task_pending.cancel()
+                        return task.result()
+                error = errors[0]
+                if not is_node_failure(error):
+                    for task_pending in pending:
+                        task_pending.cancel()
+                    raise error
+        raise error
+
+    async def _call(self, endpoint: NodeEndpoint, payload: Union[str, bytes], cost: int, last: bool = True,
+                    recover: bool = True) -> Any:
+        """
+        Запрос к одной ноде через ее планировщик с учетом задержки и отказов
+        :param endpoint: NodeEndpoint
+        :param payload: Union[str, bytes] - Тело запроса
+        :param cost: int - Стоимость запроса в токенах
+        :param last: bool - Других нод для повтора нет, поэтому временные ошибки повторяются на этой ноде
+        :param recover: bool - Успешный ответ возвращает ноду в выбор; при проверке нод решение принимается
+        после сравнения номеров блоков
+        :return: Any - Разобранный ответ
+        """
+        started = time.monotonic()
+        try:
+            body = await endpoint.scheduler.call(
+                lambda: self._post(endpoint.url, payload), cost=cost, max_retries=None if last else 0,
+            )
+        except Exception as e:
+            if is_node_failure(e):
+                endpoint.fail()
+            raise
+        endpoint.observe(time.monotonic() - started, recover=recover)
+        return body
+
+    async def _post(self, url: str, payload: Union[str, bytes]) -> Any:
+        async with self.async_session.post(url, data=payload,
+                                           headers={'Content-Type': 'application/json'}) as response:
+            response.raise_for_status()
+            body = await response.json(content_type=None)
+        error = body.get('error') if isinstance(body, dict) else None
+        if isinstance(error, dict) and error.get('code') == RPC_LIMIT_EXCEEDED:
+            raise RetryableError(error.get('message', ''))
+        return body
+
+    async def _check_health(self):
+        """
+        Фоновая проверка нод с интервалом ETH_NODE_HEALTH_INTERVAL
+        """
+        while True:
+            await self._probe_endpoints()
+            await asyncio.sleep(settings.ETH_NODE_HEALTH_INTERVAL)
+
+    async def _probe_endpoints(self):
+        """
+        Проверка нод: замер задержки на eth_blockNumber и исключение нод, которые не вернули номер блока
+        или отстают от самой свежей больше чем на ETH_NODE_MAX_LAG блоков. Успешный ответ отстающей ноды
+        не сбрасывает счетчик ее отказов, поэтому время исключения растет, пока нода не догонит остальные
+        """
+        payload = json.dumps({'jsonrpc': '2.0', 'id': 0, 'method': 'eth_blockNumber', 'params': []})
+        results = await asyncio.gather(
+            *(self._call(endpoint, payload, 1, last=False, recover=False) for endpoint in self.endpoints),
+            return_exceptions=True,
+        )
+        blocks = {}
+        for endpoint, result in zip(self.endpoints, results):
+            if isinstance(result, BaseException):
+                # Отказ ноды уже учтен в _call
+                continue
+            try:
+                endpoint.block = blocks[endpoint] = int(result['result'], 16)
+            except (KeyError, TypeError, ValueError):
+                endpoint.fail()
+        newest = max(blocks.values(), default=0)
+        for endpoint, block in blocks.items():
+            if newest - block > settings.ETH_NODE_MAX_LAG:
+                endpoint.fail()
+            else:
+                endpoint.recover()
+
+    async def request_batch(self, calls: List[Tuple[str, list]]) -> List[Any]:
+        """
+        Отправка вызовов одним JSON-RPC batch-запросом
+        :param calls: List[Tuple[str, list]] - Пары (метод, параметры)
+        :return: List[Any] - Результаты в порядке вызовов, для неудачных вызовов - RpcError
+        """
+        if not calls:
+            return []
+        ids = [next(self._ids) for _ in calls]
+        payload = json.dumps([
+            {'jsonrpc': '2.0', 'id': request_id, 'method': method, 'params': params}
+            for request_id, (method, params) in zip(ids, calls)
+        ])
+        body = await self.send(payload, Counter(method for method, _ in calls), cost=len(calls))
+
+        # Нода может вернуть одну ошибку на весь batch, например при превышении его размера
+        if not isinstance(body, list):
+            error = body.get('error') if isinstance(body, dict) else None
+            raise RpcError.from_response(error, 'Некорректный ответ на batch-запрос')
+
+        responses = {item.get('id'): item for item in body if isinstance(item, dict)}
+        results = []
+        for request_id in ids:
+            item = responses.get(request_id)
+            if item is None:
+                results.append(RpcError(0, 'Нода не вернула ответ на вызов'))
+            elif 'error' in item:
+                results.append(RpcError.from_response(item['error']))
+            else:
+                results.append(item.get('result'))
+        return results
+
+    async def request_batches(self, calls: List[Tuple[str, list]], batch_size: Optional[int] = None) -> List[Any]:
+        """
+        Разбиение вызовов на batch-запросы ограниченного размера и их параллельная отправка
+        :param calls: List[Tuple[str, list]] - Пары (метод, параметры)
+        :param batch_size: int - Размер batch-запроса, по умолчанию settings.ETH_RPC_BATCH_SIZE
+        :return: List[Any] - Результаты в порядке вызовов, для неудачных вызовов - RpcError
+        """
+        batch_size = batch_size or settings.ETH_RPC_BATCH_SIZE
+        chunks = [calls[i:i + batch_size] for i in range(0, len(calls), batch_size)]
+        results = await asyncio.gather(*(self.request_batch(chunk) for chunk in chunks))
+        return [result for chunk_results in results for result in chunk_results]
+
+    def run(self, coro: Coroutine) -> Any:
+        """
+        Выполнение корутины в цикле событий клиента с ожиданием результата
+        :param coro: Coroutine
+        :return: Any - Результат корутины
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError('Нельзя синхронно ожидать корутину из цикла событий клиента')
+        profile = profiling.current()
+        if profile is None:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+        started = time.perf_counter()
+        try:
+            return asyncio.run_coroutine_threadsafe(profiling.bind(coro, profile), self.loop).result()
+        finally:
+            profile.add('node_wait', time.perf_counter() - started)
+
+    async def submit(self, coro: Coroutine) -> Any:
+        """
+        Выполнение корутины в цикле событий клиента без блокировки вызывающего цикла событий
+        :param coro: Coroutine
+        :return: Any - Результат корутины
+        """
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        profile = profiling.current()
+        if profile is None:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+        started = time.perf_counter()
+        try:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(profiling.bind(coro, profile), self.loop))
+        finally:
+            profile.add('node_wait', time.perf_counter() - started)
+
+    def close(self):
+        """
+        Закрытие соединений и остановка цикла событий клиента
+        """
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self.loop.call_soon_threadsafe(self.fees.stop)
+            if self._health_task is not None:
+                self._health_task.cancel()
+            self.run(self.async_session.close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=self.timeout)
+            if not self.loop.is_running():
+                self.loop.close()
+            self.session.close()
+
+
+class ClientRegistry:
+    """
+    Реестр клиентов нод, живущий всё время работы воркера.
+    Клиенты ключуются по (валюта, URL ноды, API-ключ), число клиентов ограничено,
+    вытесняются давно не использованные
+    """
+
+    def __init__(self, max_clients: Optional[int] = None):
+        self.max_clients = max_clients
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def get_client(self, currency: str, url: str, api_key: str,
+                   factory: Optional[Callable[[str], NodeClient]] = None) -> NodeClient:
+        """
+        Получение клиента из реестра, при отсутствии клиент создается
+        :param currency: str - Валюта
+        :param url: str - URL ноды
+        :param api_key: str - API-ключ
+        :param factory: Callable - Фабрика клиента, по умолчанию NodeClient с настройками из settings
+        :return: NodeClient
+        """
+        key = (currency, url, api_key)
+        evicted = []
+        with self._lock:
+            self._check_fork()
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+            client = (factory or self._default_factory)(url + api_key)
+            self._clients[key] = client
+
+            max_clients = self.max_clients or settings.ETH_CLIENT_REGISTRY_SIZE
+            while len(self._clients) > max_clients:
+                _, evicted_client = self._clients.popitem(last=False)
+                evicted.append(evicted_client)
+
+        for evicted_client in evicted:
+            # Даем завершиться запросам, которые уже выполняются через вытесненный клиент
+            threading.Timer(evicted_client.timeout, evicted_client.close).start()
+        return client
+
+    @staticmethod
+    def _default_factory(url: str) -> NodeClient:
+        # Дополнительные ноды (полные URL) используются для чтения и как резерв для записи
+        return NodeClient(
+            [url] + settings.ETH_NODE_EXTRA_URLS,
+            pool_size=settings.ETH_HTTP_POOL_SIZE,
+            keepalive=settings.ETH_HTTP_KEEPALIVE,
+            timeout=settings.ETH_HTTP_TIMEOUT,
+        )
+
+    def _check_fork(self):
+        """
+        После fork потоки клиентов в дочернем процессе не существуют, поэтому клиенты родителя отбрасываются
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._clients.clear()
+
+    def keys(self) -> Tuple[tuple, ...]:
+        with self._lock:
+            return tuple(self._clients.keys())
+
+    def close_all(self):
+        """
+        Закрытие всех клиентов реестра, вызывается при завершении воркера
+        """
+        with self._lock:
+            clients = list(self._clients.values()) if self._pid == os.getpid() else []
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+registry = ClientRegistry()
+atexit.register(registry.close_all)
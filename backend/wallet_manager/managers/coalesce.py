@@ -0,0 +1,53 @@
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+
+class SingleFlight:
+    """
+    Объединение одновременных запросов одних и тех же ключей.
+    Пока значение ключа загружается, остальные запросы этого ключа ждут ту же загрузку, а не запускают свою.
+    Клиент ноды выполняет все запросы в своем цикле событий, поэтому объединяются и запросы из разных потоков.
+    Все методы должны вызываться из цикла событий клиента
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def load_many(self, keys: List[Hashable], fetch: Callable[[List[Hashable]], Awaitable[List[Any]]]) -> List[Any]:
+        """
+        Получение значений ключей
+        :param keys: List[Hashable] - Ключи
+        :param fetch: Callable - Корутина загрузки значений ключей, которые еще никто не загружает;
+        возвращает значения в порядке переданных ключей
+        :return: List[Any] - Значения в порядке ключей
+        """
+        loop = asyncio.get_running_loop()
+        futures = []
+        own = []
+        for key in keys:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = loop.create_future()
+                own.append(key)
+            futures.append(future)
+
+        if own:
+            # Загрузка выполняется отдельной задачей, чтобы отмена запроса, который ее начал,
+            # не отменяла ее для остальных ожидающих
+            task = loop.create_task(fetch(own))
+            task.add_done_callback(partial(self._resolve, own))
+        return [await asyncio.shield(future) for future in futures]
+
+    def _resolve(self, keys: List[Hashable], task: asyncio.Task):
+        for index, key in enumerate(keys):
+            future = self._inflight.pop(key)
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result()[index])
@@ -1,55 +1,285 @@
 import asyncio
-from typing import List
+from typing import Dict, List, Optional, Tuple, Union
 
 from django.conf import settings
-from web3 import Web3, AsyncWeb3, AsyncHTTPProvider
+from eth_account import Account
 
-from .abs_manager import AbsManager
+from . import keygen
+from .abs_manager import AbsManager, TransfersNotSentError
+from .client import RpcError, registry
+from .multicall import MulticallError, decode_get_eth_balances, encode_get_eth_balances
+from .nonce import NonceManager, is_nonce_error
+from .scheduler import PRIORITY_HIGH, PRIORITY_LOW, lane
+
+
+def generate_accounts(count: int) -> List[dict]:
+    """
+    Генерация аккаунтов Ethereum, функция уровня модуля, чтобы ее можно было выполнять в пуле процессов
+    :param count: int
+    :return: List[dict]
+    """
+    accounts = [Account.create() for _ in range(count)]
+    return [{'private_key': account.key.hex(), 'public_key': account.address} for account in accounts]
 
 
 class EthereumManager(AbsManager):
     """
     Менеджер для работы с Ethereum
     """
+    currency = 'ETH'
+
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.url = settings.ETH_NODE_URL + api_key
-        self.web3async = AsyncWeb3(AsyncHTTPProvider(self.url))
-        self.web3 = Web3(Web3.HTTPProvider(self.url))
+        # Клиент ноды берется из общего реестра процесса, соединения переиспользуются между запросами
+        self.client = registry.get_client(self.currency, settings.ETH_NODE_URL, api_key)
+        self.web3async = self.client.web3async
+        self.web3 = self.client.web3
         self.gas = 2000000
+        self.nonces = NonceManager(self.currency, self._get_pending_transaction_count)
 
-    async def _get_balance_async(self, address: str) -> dict:
+    async def _get_balance_async(self, address: str, block_identifier: Union[int, str] = 'latest') -> dict:
         """
         Асинхронный метод для получения баланса по публичному ключу
         :param address: str
+        :param block_identifier: Union[int, str]
         :return: dict
         """
-        return {'address': address, 'balance': await self.web3async.eth.get_balance(address)}
+        balance, = await self._get_balances_async([address], block_identifier)
+        if balance['balance'] is None:
+            # Как и web3, ошибку ноды поднимаем как ValueError
+            raise ValueError(balance['error'])
+        return balance
 
-    async def _get_balances_async(self, addresses: List[str]) -> List[dict]:
+    async def _get_balances_async(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
         """
-        Асинхронный метод для получения балансов по публичным ключам предоставленным в списке
+        Асинхронный метод для получения балансов по публичным ключам предоставленным в списке.
+        Одновременные запросы одного и того же адреса на одном блоке, в том числе из разных потоков,
+        объединяются в один запрос к ноде
         :param addresses: List[str]
+        :param block_identifier: Union[int, str]
         :return: List[dict]
         """
-        tasks = [asyncio.create_task(self._get_balance_async(address)) for address in addresses]
-        return [result for result in await asyncio.gather(*tasks)]
+        block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+
+        async def fetch(keys: List[Tuple[str, str, str]]) -> List[dict]:
+            return await self._fetch_balances([address for _, address, _ in keys], block)
+
+        balances = await self.client.single_flight.load_many(
+            [(self.currency, address, block) for address in addresses], fetch,
+        )
+        # Результат общий для всех ожидавших его запросов, каждый получает свою копию
+        return [dict(balance) for balance in balances]
 
-    def get_balances(self, addresses: List[str]) -> List[dict]:
+    async def _fetch_balances(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
+        """
+        Асинхронный метод для чтения балансов у ноды.
+        В режиме multicall балансы читаются через контракт Multicall3, если он недоступен - по адресам
+        :param addresses: List[str]
+        :param block_identifier: Union[int, str]
+        :return: List[dict]
+        """
+        if settings.ETH_BALANCE_MODE == 'multicall' and self.client.capabilities.get('multicall', True):
+            try:
+                return await self._get_balances_multicall(addresses, block_identifier)
+            except MulticallError:
+                # Контракт не развернут в сети ноды, больше не пытаемся его вызывать
+                self.client.capabilities['multicall'] = False
+            except RpcError:
+                # Ошибка ноды на eth_call, на этот раз читаем балансы по адресам
+                pass
+        return await self._get_balances_batch(addresses, block_identifier)
+
+    async def _get_balances_multicall(self, addresses: List[str],
+                                      block_identifier: Union[int, str] = 'latest') -> List[dict]:
+        """
+        Асинхронный метод для получения балансов через getEthBalance контракта Multicall3.
+        Адреса делятся на порции по лимиту газа, все порции отправляются одним batch-запросом и читаются
+        на одном блоке
+        :param addresses: List[str]
+        :param block_identifier: Union[int, str]
+        :return: List[dict]
+        """
+        balances = [{'address': address, 'balance': None, 'error': 'Некорректный адрес'} for address in addresses]
+        valid = []
+        for index, address in enumerate(addresses):
+            try:
+                key = bytes.fromhex(address[2:]) if address.startswith('0x') else b''
+            except ValueError:
+                continue
+            if len(key) == 20:
+                valid.append((index, key))
+
+        chunk_size = max(settings.ETH_MULTICALL_GAS_LIMIT // settings.ETH_MULTICALL_GAS_PER_CALL, 1)
+        chunks = [valid[i:i + chunk_size] for i in range(0, len(valid), chunk_size)]
+        with lane(PRIORITY_LOW):
+            if isinstance(block_identifier, int):
+                block = hex(block_identifier)
+            elif len(chunks) > 1:
+                # Порции должны читаться на одном и том же блоке
+                block = hex(await self.web3async.eth.block_number)
+            else:
+                block = block_identifier
+            results = await self.client.request_batch([
+                ('eth_call', [{
+                    'to': settings.ETH_MULTICALL_ADDRESS,
+                    'data': encode_get_eth_balances(settings.ETH_MULTICALL_ADDRESS, [key for _, key in chunk]),
+                    'gas': hex(settings.ETH_MULTICALL_GAS_LIMIT),
+                }, block])
+                for chunk in chunks
+            ])
+
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, RpcError):
+                raise result
+            for (index, _), balance in zip(chunk, decode_get_eth_balances(result, len(chunk))):
+                if balance is None:
+                    balances[index]['error'] = 'Multicall3 не вернул баланс'
+                else:
+                    balances[index] = {'address': addresses[index], 'balance': balance}
+        return balances
+
+    async def _get_balances_batch(self, addresses: List[str],
+                                  block_identifier: Union[int, str] = 'latest') -> List[dict]:
+        """
+        Асинхронный метод для получения балансов через eth_getBalance.
+        Адреса упаковываются в JSON-RPC batch-запросы, ошибка по одному адресу не прерывает остальные
+        :param addresses: List[str]
+        :param block_identifier: Union[int, str]
+        :return: List[dict]
+        """
+        block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+        with lane(PRIORITY_LOW):
+            results = await self.client.request_batches(
+                [('eth_getBalance', [address, block]) for address in addresses]
+            )
+        balances = []
+        for address, result in zip(addresses, results):
+            if isinstance(result, RpcError):
+                balances.append({'address': address, 'balance': None, 'error': str(result)})
+            else:
+                balances.append({'address': address, 'balance': int(result, 16)})
+        return balances
+
+    def get_balances(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
         """
         Метод для получения балансов по публичным ключам предоставленным в списке
         :param addresses: List[str]
+        :param block_identifier: Union[int, str]
         :return: dict
         """
-        return asyncio.run(self._get_balances_async(addresses))
+        return self.client.run(self._get_balances_async(addresses, block_identifier))
+
+    async def aget_balances(self, addresses: List[str], block_identifier: Union[int, str] = 'latest') -> List[dict]:
+        """
+        Асинхронный метод для получения балансов, не блокирует вызывающий цикл событий
+        :param addresses: List[str]
+        :param block_identifier: Union[int, str]
+        :return: List[dict]
+        """
+        return await self.client.submit(self._get_balances_async(addresses, block_identifier))
 
-    def get_balance(self, address: str) -> int:
+    def get_balance(self, address: str, block_identifier: Union[int, str] = 'latest') -> int:
         """
         Метод для получения баланса по публичному ключу
         :param address: str
+        :param block_identifier: Union[int, str]
         :return: balance: int
         """
-        return self.web3.eth.get_balance(address)
+        return self.client.run(self._get_balance_async(address, block_identifier))['balance']
+
+    async def aget_balance(self, address: str, block_identifier: Union[int, str] = 'latest') -> int:
+        """
+        Асинхронный метод для получения баланса по публичному ключу
+        :param address: str
+        :param block_identifier: Union[int, str]
+        :return: balance: int
+        """
+        return (await self.client.submit(self._get_balance_async(address, block_identifier)))['balance']
+
+    def get_block_number(self) -> int:
+        """
+        Метод для получения номера текущего блока
+        :return: int
+        """
+        return self.client.run(self.web3async.eth.block_number)
+
+    async def aget_block_number(self) -> int:
+        """
+        Асинхронный метод для получения номера текущего блока
+        :return: int
+        """
+        return await self.client.submit(self.web3async.eth.block_number)
+
+    async def _get_receipts_async(self, hashes: List[str]) -> List[Optional[dict]]:
+        """
+        Асинхронный метод для получения квитанций транзакций batch-запросами eth_getTransactionReceipt
+        :param hashes: List[str] - Хэши транзакций
+        :return: List[Optional[dict]] - Квитанции в порядке хэшей, None для транзакций вне блоков
+        """
+        results = await self.client.request_batches([('eth_getTransactionReceipt', [tx_hash]) for tx_hash in hashes])
+        receipts = []
+        for result in results:
+            if isinstance(result, RpcError):
+                receipts.append({'error': str(result)})
+            elif result is None:
+                receipts.append(None)
+            else:
+                receipts.append({
+                    'block_number': int(result['blockNumber'], 16),
+                    'block_hash': result['blockHash'],
+                    'status': int(result.get('status') or '0x1', 16),
+                })
+        return receipts
+
+    def get_receipts(self, hashes: List[str]) -> List[Optional[dict]]:
+        """
+        Метод для получения квитанций транзакций
+        :param hashes: List[str]
+        :return: List[Optional[dict]]
+        """
+        return self.client.run(self._get_receipts_async(hashes))
+
+    async def _get_blocks_async(self, block_numbers: List[int]) -> List[dict]:
+        """
+        Асинхронный метод для получения блоков с транзакциями batch-запросами eth_getBlockByNumber
+        :param block_numbers: List[int] - Номера блоков
+        :return: List[dict] - Блоки в порядке номеров
+        """
+        with lane(PRIORITY_LOW):
+            results = await self.client.request_batches(
+                [('eth_getBlockByNumber', [hex(number), True]) for number in block_numbers],
+                batch_size=settings.BLOCK_FOLLOWER_RPC_BATCH_SIZE,
+            )
+        blocks = []
+        for number, block in zip(block_numbers, results):
+            if isinstance(block, RpcError):
+                raise block
+            if block is None:
+                raise RpcError(0, f'Блок {number} не найден')
+            # Балансы меняются у отправителей и получателей транзакций, получателя комиссий блока
+            # и получателей выводов со стейкинга
+            addresses = {block['miner']}
+            for transaction in block['transactions']:
+                addresses.add(transaction['from'])
+                if transaction.get('to'):
+                    addresses.add(transaction['to'])
+            addresses.update(withdrawal['address'] for withdrawal in block.get('withdrawals') or [])
+            blocks.append({
+                'number': number,
+                'hash': block['hash'],
+                'parent_hash': block['parentHash'],
+                'addresses': sorted(address.lower() for address in addresses),
+            })
+        return blocks
+
+    def get_blocks(self, block_numbers: List[int]) -> List[dict]:
+        """
+        Метод для получения блоков
+        :param block_numbers: List[int]
+        :return: List[dict]
+        """
+        return self.client.run(self._get_blocks_async(block_numbers))
 
     def get_accounts(self):
         """
@@ -69,6 +299,66 @@ class EthereumManager(AbsManager):
             'public_key': account.address,
         }
 
+    def get_new_accounts(self, count: int) -> List[dict]:
+        """
+        Метод для создания нескольких аккаунтов, начиная с WALLET_KEYGEN_POOL_THRESHOLD аккаунтов
+        ключи генерируются в пуле процессов
+        :param count: int - Число аккаунтов
+        :return: List[dict]
+        """
+        return keygen.generate(generate_accounts, count)
+
+    async def _get_pending_transaction_count(self, address: str) -> int:
+        """
+        Число транзакций отправителя с учетом еще не включенных в блок
+        :param address: str
+        :return: int
+        """
+        return await self.web3async.eth.get_transaction_count(address, 'pending')
+
+    async def _make_transaction_async(self, from_address: str, to_address: str, amount: int) -> str:
+        """
+        Асинхронный метод для создания транзакции, выполняется в цикле событий клиента.
+        Транзакция отправляется через eth_sendTransaction и подписывается нодой, поэтому ключ отправителя
+        должен храниться на ноде; публичные провайдеры (Infura и др.) такие запросы отклоняют.
+        API сервиса подписывает транзакции локально через make_transactions
+        :param from_address: str
+        :param to_address: str
+        :param amount: int
+        :return: str
+        """
+        # Отправка транзакций не должна стоять в очереди за массовым чтением балансов
+        with lane(PRIORITY_HIGH):
+            # Баланс проверяется и транзакция строится по одному и тому же набору комиссий
+            balance, fees = await asyncio.gather(
+                self.web3async.eth.get_balance(from_address),
+                self.client.fees.snapshot(),
+            )
+            eip1559 = settings.ETH_TRANSACTION_TYPE == 'eip1559' and fees.supports_eip1559
+            # сумма перевода должна быть больше чем баланс ĸошельĸа (плюс затраты на ĸомиссию сети — газ)
+            if balance < amount + self.gas * fees.max_gas_price(eip1559):
+                raise ValueError('Сумма перевода должна быть больше, чем баланс кошелька')
+
+            # Nonce выдается локально, поэтому несколько переводов с одного кошелька отправляются параллельно
+            nonce, = await self.nonces.reserve(from_address)
+            transaction = {
+                'from': from_address,
+                'to': to_address,
+                'value': amount,
+                'gas': self.gas,
+                'nonce': nonce,
+                **fees.transaction_fields(eip1559),
+            }
+            try:
+                signed = await self.web3async.eth.send_transaction(transaction)
+            except Exception as e:
+                if is_nonce_error(e):
+                    await self.nonces.resync(from_address)
+                else:
+                    await self.nonces.release(from_address, [nonce])
+                raise
+        return signed.hex()
+
     def make_transaction(self, from_address: str, to_address: str, amount: int) -> str:
         """
         Метод для создания транзакции
@@ -77,20 +367,157 @@ class EthereumManager(AbsManager):
         :param amount: int
         :return: str
         """
-        # сумма перевода должна быть больше чем баланс ĸошельĸа (плюс затраты на ĸомиссию сети — газ)
-        if self.get_balance(from_address) < amount + self.gas * self.web3.eth.gas_price:
-            raise ValueError('Сумма перевода должна быть больше, чем баланс кошелька')
-
-        transaction = {
-            'from': from_address,
-            'to': to_address,
-            'value': amount,
-            'gas': self.gas,
-            'gasPrice': self.web3.eth.gas_price,
-            'nonce': self.web3.eth.get_transaction_count(from_address)
-        }
-        signed = self.web3.eth.account.send_transaction(transaction)
-        return signed.hex()
+        return self.client.run(self._make_transaction_async(from_address, to_address, amount))
+
+    async def amake_transaction(self, from_address: str, to_address: str, amount: int) -> str:
+        """
+        Асинхронный метод для создания транзакции
+        :param from_address: str
+        :param to_address: str
+        :param amount: int
+        :return: str
+        """
+        return await self.client.submit(self._make_transaction_async(from_address, to_address, amount))
+
+    async def _make_transactions_async(self, transfers: List[dict]) -> List[dict]:
+        """
+        Асинхронный метод для пакетной отправки переводов, выполняется в цикле событий клиента.
+        Балансы отправителей читаются одним batch-запросом, nonce резервируются сразу на все переводы
+        отправителя, транзакции подписываются локально и отправляются через eth_sendRawTransaction
+        batch-запросами
+        :param transfers: List[dict] - Переводы с ключами from, to, amount и private_key отправителя
+        :return: List[dict] - Результаты в порядке переводов: {'hash': ...} или {'error': ...}
+        :raises TransfersNotSentError: Ошибка до отправки транзакций в сеть
+        """
+        results: List[dict] = [{} for _ in transfers]
+        by_sender: Dict[str, List[int]] = {}
+        for index, transfer in enumerate(transfers):
+            by_sender.setdefault(transfer['from'], []).append(index)
+        senders = list(by_sender)
+
+        with lane(PRIORITY_HIGH):
+            try:
+                balances, fees, chain_id = await asyncio.gather(
+                    self.client.request_batches([('eth_getBalance', [sender, 'latest']) for sender in senders]),
+                    self.client.fees.snapshot(),
+                    self.web3async.eth.chain_id,
+                )
+            except Exception as e:
+                raise TransfersNotSentError(str(e)) from e
+            eip1559 = settings.ETH_TRANSACTION_TYPE == 'eip1559' and fees.supports_eip1559
+            max_fee = self.gas * fees.max_gas_price(eip1559)
+
+            # Переводы отправителя принимаются по порядку, пока их сумма с комиссиями не превысит баланс
+            accepted: Dict[str, List[int]] = {}
+            for sender, balance in zip(senders, balances):
+                if isinstance(balance, RpcError):
+                    for index in by_sender[sender]:
+                        results[index] = {'error': str(balance)}
+                    continue
+                available = int(balance, 16)
+                for index in by_sender[sender]:
+                    cost = int(transfers[index]['amount']) + max_fee
+                    if cost > available:
+                        results[index] = {'error': 'Сумма перевода должна быть больше, чем баланс кошелька'}
+                        continue
+                    available -= cost
+                    accepted.setdefault(sender, []).append(index)
+
+            reserved = await asyncio.gather(
+                *(self.nonces.reserve(sender, len(indexes)) for sender, indexes in accepted.items()),
+                return_exceptions=True,
+            )
+            nonces: Dict[int, int] = {}
+            for (sender, indexes), sender_nonces in zip(list(accepted.items()), reserved):
+                if isinstance(sender_nonces, Exception):
+                    for index in indexes:
+                        results[index] = {'error': str(sender_nonces)}
+                    del accepted[sender]
+                    continue
+                nonces.update(zip(indexes, sender_nonces))
+
+            order = [index for indexes in accepted.values() for index in indexes]
+            raw_transactions = None
+            try:
+                # Подпись занимает процессор, поэтому выполняется вне цикла событий клиента
+                raw_transactions = await asyncio.to_thread(
+                    self._sign_transactions,
+                    [transfers[index] for index in order],
+                    [nonces[index] for index in order],
+                    chain_id,
+                    fees.transaction_fields(eip1559),
+                )
+                responses = await self.client.request_batches(
+                    [('eth_sendRawTransaction', [raw_transaction]) for raw_transaction in raw_transactions]
+                )
+            except Exception as e:
+                if raw_transactions is None:
+                    # Ошибка подписи: транзакции не отправлялись, nonce возвращаются отправителям
+                    for sender, indexes in accepted.items():
+                        await self.nonces.release(sender, [nonces[index] for index in indexes])
+                    raise TransfersNotSentError(str(e)) from e
+                # Запрос мог дойти до ноды, и nonce уже заняты в мемпуле: счетчик сверяется с нодой, а не
+                # освобождается. Если нода недоступна, nonce остаются израсходованными, пропуск исправит resync
+                # при ошибке nonce следующей отправки. Повторять такие переводы небезопасно
+                for sender in accepted:
+                    try:
+                        await self.nonces.resync(sender)
+                    except Exception:
+                        pass
+                raise
+
+            failed: Dict[str, List[Tuple[int, RpcError]]] = {}
+            for index, response in zip(order, responses):
+                if isinstance(response, RpcError):
+                    results[index] = {'error': str(response)}
+                    failed.setdefault(transfers[index]['from'], []).append((index, response))
+                else:
+                    results[index] = {'hash': response}
+            for sender, errors in failed.items():
+                if any(is_nonce_error(error) for _, error in errors):
+                    await self.nonces.resync(sender)
+                else:
+                    await self.nonces.release(sender, [nonces[index] for index, _ in errors])
+        return results
+
+    def _sign_transactions(self, transfers: List[dict], nonces: List[int], chain_id: int,
+                           fee_fields: dict) -> List[str]:
+        """
+        Локальная подпись переводов приватными ключами отправителей
+        :param transfers: List[dict] - Переводы
+        :param nonces: List[int] - Nonce переводов
+        :param chain_id: int - Идентификатор сети
+        :param fee_fields: dict - Поля комиссии
+        :return: List[str] - Подписанные транзакции в hex
+        """
+        raw_transactions = []
+        for transfer, nonce in zip(transfers, nonces):
+            signed = Account.sign_transaction({
+                'to': transfer['to'],
+                'value': int(transfer['amount']),
+                'gas': self.gas,
+                'nonce': nonce,
+                'chainId': chain_id,
+                **fee_fields,
+            }, transfer['private_key'])
+            raw_transactions.append(signed.rawTransaction.hex())
+        return raw_transactions
+
+    def make_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Метод для пакетной отправки переводов
+        :param transfers: List[dict]
+        :return: List[dict]
+        """
+        return self.client.run(self._make_transactions_async(transfers))
+
+    async def amake_transactions(self, transfers: List[dict]) -> List[dict]:
+        """
+        Асинхронный метод для пакетной отправки переводов
+        :param transfers: List[dict]
+        :return: List[dict]
+        """
+        return await self.client.submit(self._make_transactions_async(transfers))
 
     def connected(self) -> bool:
         """
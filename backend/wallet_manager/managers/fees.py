@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import statistics
+import time
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+
+from .scheduler import PRIORITY_NORMAL, lane
+
+logger = logging.getLogger(__name__)
+
+
+class FeeSnapshot(NamedTuple):
+    """
+    Согласованный набор параметров комиссии, прочитанный на одном блоке
+    """
+    block: int
+    gas_price: int
+    base_fee: Optional[int] = None
+    max_priority_fee: Optional[int] = None
+    max_fee: Optional[int] = None
+
+    @property
+    def supports_eip1559(self) -> bool:
+        return self.base_fee is not None
+
+    def max_gas_price(self, eip1559: bool) -> int:
+        """
+        Максимальная цена газа, которую может заплатить транзакция, используется для проверки баланса
+        :param eip1559: bool - Транзакция типа 2
+        :return: int
+        """
+        return self.max_fee if eip1559 else self.gas_price
+
+    def transaction_fields(self, eip1559: bool) -> dict:
+        """
+        Поля комиссии для словаря транзакции
+        :param eip1559: bool - Транзакция типа 2 (maxFeePerGas / maxPriorityFeePerGas)
+        :return: dict
+        """
+        if eip1559:
+            return {'type': '0x2', 'maxFeePerGas': self.max_fee, 'maxPriorityFeePerGas': self.max_priority_fee}
+        return {'gasPrice': self.gas_price}
+
+
+class FeeOracle:
+    """
+    Оракул комиссий клиента ноды.
+    После первого обращения в фоне следит за номером блока и обновляет gas_price и eth_feeHistory
+    один раз на блок; если к оракулу долго не обращаются, слежение останавливается.
+    Если слежение остановлено или давно не подтверждало актуальность параметров, они обновляются
+    при обращении, до возврата вызывающему. Все методы должны вызываться из цикла событий клиента
+    """
+
+    def __init__(self, client, poll_interval: float, idle_timeout: float, history_blocks: int, percentile: float):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.history_blocks = history_blocks
+        self.percentile = percentile
+        self.current: Optional[FeeSnapshot] = None
+        # Время последней проверки, что параметры соответствуют последнему блоку
+        self._checked_at = 0.0
+        self._used_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @classmethod
+    def from_settings(cls, client) -> 'FeeOracle':
+        return cls(
+            client,
+            poll_interval=settings.ETH_FEE_POLL_INTERVAL,
+            idle_timeout=settings.ETH_FEE_IDLE_TIMEOUT,
+            history_blocks=settings.ETH_FEE_HISTORY_BLOCKS,
+            percentile=settings.ETH_FEE_PRIORITY_PERCENTILE,
+        )
+
+    async def snapshot(self) -> FeeSnapshot:
+        """
+        Текущий набор параметров комиссии
+        :return: FeeSnapshot
+        """
+        self._used_at = time.monotonic()
+        if self.stale:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self.stale:
+                    await self.refresh()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._follow())
+        return self.current
+
+    @property
+    def stale(self) -> bool:
+        """
+        Параметры нельзя использовать без обновления: их нет, слежение за блоками остановлено
+        (например, по ETH_FEE_IDLE_TIMEOUT) или не проверяло новый блок дольше двух интервалов опроса
+        """
+        if self.current is None or self._task is None or self._task.done():
+            return True
+        return time.monotonic() - self._checked_at > 2 * self.poll_interval
+
+    async def refresh(self, block: Optional[int] = None):
+        """
+        Обновление параметров комиссии одним batch-запросом
+        :param block: Optional[int] - Номер блока, если он уже известен
+        """
+        calls = [
+            ('eth_gasPrice', []),
+            ('eth_feeHistory', [hex(self.history_blocks), 'latest', [self.percentile]]),
+        ]
+        if block is None:
+            calls.append(('eth_blockNumber', []))
+        gas_price, history, *rest = await self.client.request_batch(calls)
+        if isinstance(gas_price, Exception):
+            raise gas_price
+        if rest:
+            if isinstance(rest[0], Exception):
+                raise rest[0]
+            block = int(rest[0], 16)
+        self.current = self.build_snapshot(block, int(gas_price, 16), history)
+        self._checked_at = time.monotonic()
+
+    @staticmethod
+    def build_snapshot(block: int, gas_price: int, history) -> FeeSnapshot:
+        """
+        Расчет параметров комиссии по ответу eth_feeHistory.
+        Базовая комиссия берется для следующего блока, чаевые - медиана выбранного перцентиля по истории,
+        максимальная комиссия рассчитана на рост базовой в два раза
+        :param block: int - Номер блока
+        :param gas_price: int - Результат eth_gasPrice
+        :param history: dict - Результат eth_feeHistory или ошибка, если нода его не поддерживает
+        :return: FeeSnapshot
+        """
+        if not isinstance(history, dict) or not history.get('baseFeePerGas'):
+            return FeeSnapshot(block, gas_price)
+
+        base_fee = int(history['baseFeePerGas'][-1], 16)
+        rewards = [int(reward[0], 16) for reward in history.get('reward') or [] if reward]
+        max_priority_fee = int(statistics.median(rewards)) if rewards else max(gas_price - base_fee, 0)
+        return FeeSnapshot(block, gas_price, base_fee, max_priority_fee, 2 * base_fee + max_priority_fee)
+
+    async def _follow(self):
+        """
+        Фоновое слежение за новыми блоками
+        """
+        with lane(PRIORITY_NORMAL):
+            while time.monotonic() - self._used_at < self.idle_timeout:
+                await asyncio.sleep(self.poll_interval)
+                try:
+                    block, = await self.client.request_batch([('eth_blockNumber', [])])
+                    if isinstance(block, Exception):
+                        raise block
+                    block = int(block, 16)
+                    if self.current is None or block > self.current.block:
+                        await self.refresh(block)
+                    else:
+                        self._checked_at = time.monotonic()
+                except Exception:
+                    logger.warning('Не удалось обновить параметры комиссии', exc_info=True)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
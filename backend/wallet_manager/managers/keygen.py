@@ -0,0 +1,53 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional
+
+from django.conf import settings
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    """
+    Пул процессов для генерации ключей, создается при первом обращении и живет до завершения воркера.
+    Процессы запускаются через spawn, чтобы не наследовать потоки клиентов нод
+    :return: ProcessPoolExecutor
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.WALLET_KEYGEN_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def generate(func: Callable[[int], List[dict]], count: int) -> List[dict]:
+    """
+    Генерация count аккаунтов функцией func, большие объемы распределяются по пулу процессов
+    :param func: Callable[[int], List[dict]] - Функция уровня модуля, генерирующая заданное число аккаунтов
+    :param count: int - Число аккаунтов
+    :return: List[dict] - Аккаунты
+    """
+    processes = settings.WALLET_KEYGEN_PROCESSES
+    if count < settings.WALLET_KEYGEN_POOL_THRESHOLD or processes <= 1:
+        return func(count)
+
+    chunk_size = -(-count // processes)
+    chunks = [min(chunk_size, count - start) for start in range(0, count, chunk_size)]
+    return [account for accounts in get_pool().map(func, chunks) for account in accounts]
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+atexit.register(shutdown)
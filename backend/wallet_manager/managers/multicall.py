@@ -0,0 +1,86 @@
+from typing import List, Optional
+
+# Адрес контракта Multicall3, одинаковый во всех сетях, где он развернут
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+# aggregate3((address target, bool allowFailure, bytes callData)[])
+AGGREGATE3_SELECTOR = bytes.fromhex('82ad56cb')
+# getEthBalance(address)
+GET_ETH_BALANCE_SELECTOR = bytes.fromhex('4d2301cc')
+
+WORD = 32
+# Кодировка одного вызова в aggregate3 имеет постоянный размер:
+# target, allowFailure, смещение callData, длина callData и сам callData (4 + 32 байта, дополненные до 64)
+CALL_SIZE = 6 * WORD
+
+
+class MulticallError(Exception):
+    """
+    Ответ Multicall3 не удалось разобрать, например контракт не развернут в сети
+    """
+    pass
+
+
+def encode_get_eth_balances(multicall_address: str, addresses: List[bytes]) -> str:
+    """
+    Кодирование вызова aggregate3 из вызовов getEthBalance самого контракта Multicall3.
+    Все части, кроме адресов, одинаковы для любого вызова, поэтому кодирование сводится к склейке байтов
+    :param multicall_address: str - Адрес контракта
+    :param addresses: List[bytes] - 20-байтные адреса
+    :return: str - Данные вызова в hex
+    """
+    count = len(addresses)
+    # Общая часть каждого вызова: target, allowFailure = true, смещение callData (0x60) и длина callData (36)
+    prefix = (
+        bytes(12) + bytes.fromhex(multicall_address[2:])
+        + (1).to_bytes(WORD, 'big')
+        + (3 * WORD).to_bytes(WORD, 'big')
+        + (len(GET_ETH_BALANCE_SELECTOR) + WORD).to_bytes(WORD, 'big')
+        + GET_ETH_BALANCE_SELECTOR + bytes(12)
+    )
+    padding = bytes(2 * WORD - len(GET_ETH_BALANCE_SELECTOR) - WORD)
+
+    parts = [
+        AGGREGATE3_SELECTOR,
+        WORD.to_bytes(WORD, 'big'),
+        count.to_bytes(WORD, 'big'),
+    ]
+    parts.extend((count * WORD + index * CALL_SIZE).to_bytes(WORD, 'big') for index in range(count))
+    for address in addresses:
+        parts.append(prefix)
+        parts.append(address)
+        parts.append(padding)
+    return '0x' + b''.join(parts).hex()
+
+
+def decode_get_eth_balances(result: str, count: int) -> List[Optional[int]]:
+    """
+    Разбор результата aggregate3: (bool success, bytes returnData)[]
+    :param result: str - Результат eth_call в hex
+    :param count: int - Ожидаемое число вызовов
+    :return: List[Optional[int]] - Балансы, None для неудачных вызовов
+    """
+    data = bytes.fromhex(result[2:] if result.startswith('0x') else result)
+    if len(data) < 2 * WORD:
+        raise MulticallError('Пустой ответ Multicall3, контракт не развернут в сети')
+
+    def word(offset: int) -> int:
+        if offset + WORD > len(data):
+            raise MulticallError('Некорректный ответ Multicall3')
+        return int.from_bytes(data[offset:offset + WORD], 'big')
+
+    array = word(0)
+    if word(array) != count:
+        raise MulticallError('Число результатов Multicall3 не совпадает с числом вызовов')
+    elements = array + WORD
+
+    balances = []
+    for index in range(count):
+        item = elements + word(elements + index * WORD)
+        success = word(item)
+        return_data = item + word(item + WORD)
+        if not success or word(return_data) != WORD:
+            balances.append(None)
+        else:
+            balances.append(word(return_data + WORD))
+    return balances
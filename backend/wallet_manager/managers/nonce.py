@@ -0,0 +1,238 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+
+# Сообщения нод о том, что локальный счетчик nonce разошелся с состоянием сети
+NONCE_ERRORS = ('nonce too low', 'nonce too high', 'already known', 'replacement transaction underpriced')
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """
+    Проверка, что ошибка отправки транзакции вызвана неверным nonce
+    :param error: Exception
+    :return: bool
+    """
+    message = str(error).lower()
+    return any(text in message for text in NONCE_ERRORS)
+
+
+class NonceStore(ABC):
+    """
+    Абстрактное хранилище счетчиков nonce отправителей.
+    Хранит следующий nonce и список освобожденных nonce, которые выдаются повторно в первую очередь
+    """
+
+    @abstractmethod
+    def reserve(self, currency: str, address: str, count: int, initial: Optional[int] = None) -> Optional[List[int]]:
+        """
+        Атомарное резервирование count nonce
+        :param currency: str - Валюта
+        :param address: str - Адрес отправителя
+        :param count: int - Число nonce
+        :param initial: Optional[int] - Начальное значение счетчика, если отправитель еще неизвестен
+        :return: Optional[List[int]] - Nonce или None, если отправитель неизвестен и initial не передан
+        """
+        pass
+
+    @abstractmethod
+    def release(self, currency: str, address: str, nonces: List[int]):
+        """
+        Освобождение nonce транзакций, которые не удалось отправить
+        :param currency: str - Валюта
+        :param address: str - Адрес отправителя
+        :param nonces: List[int]
+        """
+        pass
+
+    @abstractmethod
+    def resync(self, currency: str, address: str, pending: int):
+        """
+        Сброс счетчика на число транзакций отправителя с учетом pending
+        :param currency: str - Валюта
+        :param address: str - Адрес отправителя
+        :param pending: int - Результат eth_getTransactionCount(address, 'pending')
+        """
+        pass
+
+    @staticmethod
+    def take(next_nonce: int, released: List[int], count: int) -> Tuple[int, List[int], List[int]]:
+        """
+        Выдача nonce: сначала освобожденные по возрастанию, затем новые из счетчика
+        :return: (next_nonce, released, nonces)
+        """
+        released = sorted(released)
+        nonces = released[:count]
+        released = released[count:]
+        while len(nonces) < count:
+            nonces.append(next_nonce)
+            next_nonce += 1
+        return next_nonce, released, nonces
+
+    @staticmethod
+    def put_back(next_nonce: int, released: List[int], nonces: List[int]) -> Tuple[int, List[int]]:
+        """
+        Возврат nonce: последние выданные уменьшают счетчик, остальные запоминаются как пропуски
+        :return: (next_nonce, released)
+        """
+        released = set(released) | {nonce for nonce in nonces if nonce < next_nonce}
+        while next_nonce - 1 in released:
+            next_nonce -= 1
+            released.discard(next_nonce)
+        return next_nonce, sorted(released)
+
+
+class MemoryNonceStore(NonceStore):
+    """
+    Хранилище nonce в памяти процесса, подходит, если отправка идет из одного процесса
+    """
+
+    def __init__(self):
+        self._state: Dict[Tuple[str, str], Tuple[int, List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, currency, address, count, initial=None):
+        with self._lock:
+            state = self._state.get((currency, address))
+            if state is None:
+                if initial is None:
+                    return None
+                state = (initial, [])
+            next_nonce, released, nonces = self.take(*state, count)
+            self._state[(currency, address)] = (next_nonce, released)
+            return nonces
+
+    def release(self, currency, address, nonces):
+        with self._lock:
+            state = self._state.get((currency, address))
+            if state is not None:
+                self._state[(currency, address)] = self.put_back(*state, nonces)
+
+    def resync(self, currency, address, pending):
+        with self._lock:
+            self._state[(currency, address)] = (pending, [])
+
+
+class DatabaseNonceStore(NonceStore):
+    """
+    Хранилище nonce в базе данных, общее для всех воркеров.
+    Строка отправителя блокируется через SELECT ... FOR UPDATE на время резервирования
+    """
+
+    @staticmethod
+    def _model():
+        # Импорт внутри метода: пакет менеджеров импортируется и в процессах генерации ключей, где нет приложений Django
+        from wallet_manager.models import SenderNonce
+        return SenderNonce
+
+    def reserve(self, currency, address, count, initial=None):
+        model = self._model()
+        with transaction.atomic():
+            sender = model.objects.select_for_update().filter(currency=currency, address=address).first()
+            if sender is None:
+                if initial is None:
+                    return None
+                try:
+                    with transaction.atomic():
+                        sender = model.objects.create(currency=currency, address=address, next_nonce=initial)
+                except IntegrityError:
+                    # Отправителя одновременно добавил другой воркер
+                    sender = model.objects.select_for_update().get(currency=currency, address=address)
+            sender.next_nonce, sender.released, nonces = self.take(sender.next_nonce, sender.released, count)
+            sender.save(update_fields=['next_nonce', 'released', 'updated_at'])
+            return nonces
+
+    def release(self, currency, address, nonces):
+        model = self._model()
+        with transaction.atomic():
+            sender = model.objects.select_for_update().filter(currency=currency, address=address).first()
+            if sender is not None:
+                sender.next_nonce, sender.released = self.put_back(sender.next_nonce, sender.released, nonces)
+                sender.save(update_fields=['next_nonce', 'released', 'updated_at'])
+
+    def resync(self, currency, address, pending):
+        self._model().objects.update_or_create(
+            currency=currency, address=address, defaults={'next_nonce': pending, 'released': []},
+        )
+
+
+NONCE_STORES = {
+    'memory': MemoryNonceStore,
+    'database': DatabaseNonceStore,
+}
+
+_stores: Dict[str, NonceStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_nonce_store(name: Optional[str] = None) -> NonceStore:
+    """
+    Общее для процесса хранилище nonce, по умолчанию settings.ETH_NONCE_STORE
+    :param name: str - Название хранилища
+    :return: NonceStore
+    """
+    name = name or settings.ETH_NONCE_STORE
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = NONCE_STORES[name]()
+        return _stores[name]
+
+
+class NonceManager:
+    """
+    Асинхронный распределитель nonce для отправителей одной валюты.
+    Операции с хранилищем выполняются в отдельных потоках, чтобы не блокировать цикл событий клиента ноды
+    """
+    _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='nonce')
+
+    def __init__(self, currency: str, fetch_pending: Callable[[str], Awaitable[int]],
+                 store: Optional[NonceStore] = None):
+        """
+        :param currency: str - Валюта
+        :param fetch_pending: Callable - Корутина, возвращающая eth_getTransactionCount(address, 'pending')
+        :param store: NonceStore - Хранилище, по умолчанию settings.ETH_NONCE_STORE
+        """
+        self.currency = currency
+        self.fetch_pending = fetch_pending
+        self.store = store or get_nonce_store()
+
+    async def _call(self, method, *args):
+        def call():
+            try:
+                return method(*args)
+            finally:
+                close_old_connections()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def reserve(self, address: str, count: int = 1) -> List[int]:
+        """
+        Резервирование count последовательных для отправителя nonce
+        :param address: str - Адрес отправителя
+        :param count: int - Число nonce
+        :return: List[int]
+        """
+        nonces = await self._call(self.store.reserve, self.currency, address, count)
+        if nonces is None:
+            pending = await self.fetch_pending(address)
+            nonces = await self._call(self.store.reserve, self.currency, address, count, pending)
+        return nonces
+
+    async def release(self, address: str, nonces: List[int]):
+        """
+        Освобождение nonce транзакций, которые не удалось отправить
+        :param address: str - Адрес отправителя
+        :param nonces: List[int]
+        """
+        await self._call(self.store.release, self.currency, address, list(nonces))
+
+    async def resync(self, address: str):
+        """
+        Сброс счетчика отправителя по данным ноды, вызывается при ошибках nonce
+        :param address: str - Адрес отправителя
+        """
+        pending = await self.fetch_pending(address)
+        await self._call(self.store.resync, self.currency, address, pending)
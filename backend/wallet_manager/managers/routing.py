@@ -0,0 +1,84 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from aiohttp import ClientError
+from django.conf import settings
+
+from .scheduler import RetryableError, RpcScheduler
+
+# Методы, которые всегда отправляются на основную ноду: отправка транзакций и pending nonce,
+# который другие ноды могут еще не знать
+STICKY_METHODS = frozenset({'eth_sendRawTransaction', 'eth_sendTransaction', 'eth_getTransactionCount'})
+
+
+def is_node_failure(error: BaseException) -> bool:
+    """
+    Проверка, что ошибка вызвана недоступностью ноды, а не самим запросом, и запрос можно отправить на другую ноду
+    :param error: BaseException
+    :return: bool
+    """
+    return isinstance(error, (ClientError, asyncio.TimeoutError, RetryableError))
+
+
+class NodeEndpoint:
+    """
+    Нода из списка нод клиента.
+    У каждой ноды свой планировщик (лимиты у провайдеров разные), скользящая средняя задержки (EWMA)
+    и время, до которого нода считается недоступной после ошибок
+    """
+
+    def __init__(self, url: str, scheduler: Optional[RpcScheduler] = None, alpha: Optional[float] = None):
+        self.url = url
+        self.scheduler = scheduler or RpcScheduler.from_settings()
+        self.alpha = settings.ETH_NODE_EWMA_ALPHA if alpha is None else alpha
+        self.latency: Optional[float] = None
+        self.block: Optional[int] = None
+        self.failures = 0
+        self.down_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    @property
+    def score(self) -> float:
+        # Нода без замеров получает запросы первой, чтобы ее задержка была измерена
+        return self.latency or 0.0
+
+    def observe(self, elapsed: float, recover: bool = True):
+        """
+        Учет успешного запроса
+        :param elapsed: float - Время запроса в секундах
+        :param recover: bool - Вернуть ноду в выбор и сбросить счетчик отказов
+        """
+        self.latency = elapsed if self.latency is None else self.alpha * elapsed + (1 - self.alpha) * self.latency
+        if recover:
+            self.recover()
+
+    def recover(self):
+        """
+        Нода снова доступна: счетчик отказов подряд сбрасывается
+        """
+        self.failures = 0
+        self.down_until = 0.0
+
+    def fail(self):
+        """
+        Учет отказа ноды: нода исключается из выбора на время, растущее с числом отказов подряд
+        """
+        self.failures += 1
+        cooldown = min(settings.ETH_NODE_COOLDOWN * 2 ** (self.failures - 1), settings.ETH_NODE_COOLDOWN_MAX)
+        self.down_until = time.monotonic() + cooldown
+
+    def __repr__(self):
+        return f'NodeEndpoint({self.url!r}, latency={self.latency}, healthy={self.healthy})'
+
+
+def rank_endpoints(endpoints: List[NodeEndpoint]) -> List[NodeEndpoint]:
+    """
+    Порядок нод для чтения: доступные по возрастанию задержки, затем недоступные как последний вариант
+    :param endpoints: List[NodeEndpoint]
+    :return: List[NodeEndpoint]
+    """
+    return sorted(endpoints, key=lambda endpoint: (not endpoint.healthy, endpoint.score))
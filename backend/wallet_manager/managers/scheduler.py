@@ -0,0 +1,216 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Optional
+
+from aiohttp import ClientResponseError
+from django.conf import settings
+
+# Полосы приоритета: меньшее значение обслуживается раньше
+PRIORITY_HIGH = 0  # отправка транзакций
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2  # массовое чтение балансов
+
+rpc_priority = ContextVar('rpc_priority', default=PRIORITY_NORMAL)
+
+# Код ошибки JSON-RPC, которым провайдеры (Infura) сообщают о превышении лимита запросов
+RPC_LIMIT_EXCEEDED = -32005
+
+
+@contextmanager
+def lane(priority: int):
+    """
+    Выполнение вызовов к ноде внутри блока with в заданной полосе приоритета
+    :param priority: int - Приоритет
+    """
+    token = rpc_priority.set(priority)
+    try:
+        yield
+    finally:
+        rpc_priority.reset(token)
+
+
+class RetryableError(Exception):
+    """
+    Временная ошибка ноды, после которой вызов можно повторить
+    """
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        self.message = message
+        self.retry_after = retry_after
+
+    def __str__(self):
+        return self.message
+
+
+class TokenBucket:
+    """
+    Ограничитель частоты запросов: rate токенов в секунду, не более capacity токенов в запасе
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self, cost: float = 1) -> bool:
+        """
+        Попытка взять cost токенов
+        :param cost: float - Стоимость запроса
+        :return: bool - Удалось ли взять токены
+        """
+        if self.rate <= 0:
+            return True
+        self._refill()
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True
+        return False
+
+    def delay(self, cost: float = 1) -> float:
+        """
+        Время в секундах, через которое станет доступно cost токенов
+        :param cost: float - Стоимость запроса
+        :return: float
+        """
+        self._refill()
+        return max(0.0, (min(cost, self.capacity) - self.tokens) / self.rate)
+
+
+class RpcScheduler:
+    """
+    Планировщик вызовов к ноде для одного клиента (одних учетных данных ноды).
+    Ограничивает число одновременных запросов и их частоту, пропускает запросы по полосам приоритета,
+    повторяет запросы при 429 и 5xx с экспоненциальной задержкой со случайным разбросом.
+    Все методы должны вызываться из цикла событий клиента
+    """
+
+    def __init__(self, max_in_flight: int, rate: float, burst: float,
+                 max_retries: int, backoff_base: float, backoff_max: float):
+        self.max_in_flight = max_in_flight
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.in_flight = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._wakeup = None
+
+    @classmethod
+    def from_settings(cls) -> 'RpcScheduler':
+        return cls(
+            max_in_flight=settings.ETH_RPC_MAX_IN_FLIGHT,
+            rate=settings.ETH_RPC_RATE_LIMIT,
+            burst=settings.ETH_RPC_BURST,
+            max_retries=settings.ETH_RPC_MAX_RETRIES,
+            backoff_base=settings.ETH_RPC_BACKOFF_BASE,
+            backoff_max=settings.ETH_RPC_BACKOFF_MAX,
+        )
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def call(self, func: Callable[[], Awaitable[Any]], priority: Optional[int] = None, cost: int = 1,
+                   max_retries: Optional[int] = None) -> Any:
+        """
+        Выполнение запроса к ноде через планировщик
+        :param func: Callable - Функция, возвращающая корутину запроса
+        :param priority: int - Приоритет, по умолчанию берется из текущей полосы
+        :param cost: int - Стоимость запроса в токенах, например число вызовов в batch-запросе
+        :param max_retries: int - Число повторов, по умолчанию из настроек планировщика
+        :return: Any - Результат запроса
+        """
+        priority = rpc_priority.get() if priority is None else priority
+        max_retries = self.max_retries if max_retries is None else max_retries
+        for attempt in itertools.count():
+            await self._acquire(priority, cost)
+            try:
+                return await func()
+            except Exception as e:
+                error = self.as_retryable(e)
+                if error is None or attempt >= max_retries:
+                    raise
+            finally:
+                self._release()
+            await asyncio.sleep(self.backoff(attempt, error.retry_after))
+
+    @staticmethod
+    def as_retryable(error: Exception) -> Optional[RetryableError]:
+        """
+        Определение, можно ли повторить запрос после ошибки
+        :param error: Exception
+        :return: Optional[RetryableError]
+        """
+        if isinstance(error, RetryableError):
+            return error
+        if isinstance(error, ClientResponseError) and (error.status == 429 or error.status >= 500):
+            retry_after = error.headers.get('Retry-After') if error.headers else None
+            try:
+                retry_after = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                retry_after = None
+            return RetryableError(str(error), retry_after)
+        if getattr(error, 'code', None) == RPC_LIMIT_EXCEEDED:
+            return RetryableError(str(error))
+        return None
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Задержка перед повторной попыткой
+        :param attempt: int - Номер неудачной попытки, начиная с 0
+        :param retry_after: Optional[float] - Задержка, запрошенная нодой
+        :return: float - Задержка в секундах
+        """
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = delay / 2 + random.uniform(0, delay / 2)
+        return max(delay, retry_after or 0)
+
+    async def _acquire(self, priority: int, cost: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), cost, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже был выдан, возвращаем его
+                self._release()
+            raise
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        Выдача слотов ожидающим запросам в порядке приоритета, пока есть свободные слоты и токены
+        """
+        while self._waiters and self.in_flight < self.max_in_flight:
+            priority, sequence, cost, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self.bucket.try_take(cost):
+                if self._wakeup is None:
+                    loop = asyncio.get_running_loop()
+                    self._wakeup = loop.call_later(self.bucket.delay(cost), self._on_wakeup)
+                return
+            heapq.heappop(self._waiters)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
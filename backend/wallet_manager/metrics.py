@@ -0,0 +1,183 @@
+import inspect
+import os
+import time
+from contextvars import ContextVar
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+from . import profiling
+
+# Границы корзин гистограмм времени в секундах
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Границы корзин гистограмм размеров: число вызовов в batch-запросе, число запросов к базе
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Запросы к ноде: логический запрос JSON-RPC (одиночный вызов или batch) с учетом повторов и дублирования
+rpc_calls = Counter(
+    'wallet_rpc_calls_total', 'Вызовы JSON-RPC по методам', ('method',))
+rpc_errors = Counter(
+    'wallet_rpc_errors_total', 'Запросы к ноде, завершившиеся ошибкой', ('method', 'error'))
+rpc_duration = Histogram(
+    'wallet_rpc_request_duration_seconds', 'Время запроса к ноде по методам (mixed - batch из разных методов)',
+    ('method',), buckets=DURATION_BUCKETS)
+rpc_batch_size = Histogram(
+    'wallet_rpc_batch_size', 'Число вызовов в одном запросе к ноде', buckets=SIZE_BUCKETS)
+# В multiprocess-режиме значения выполняющихся запросов складываются по живым воркерам
+rpc_in_flight = Gauge(
+    'wallet_rpc_in_flight', 'Запросы к ноде, ожидающие ответа', multiprocess_mode='livesum')
+
+# Методы менеджеров криптовалют
+manager_calls = Counter(
+    'wallet_manager_calls_total', 'Вызовы методов менеджера', ('currency', 'method'))
+manager_errors = Counter(
+    'wallet_manager_errors_total', 'Вызовы методов менеджера, завершившиеся исключением', ('currency', 'method'))
+manager_duration = Histogram(
+    'wallet_manager_call_duration_seconds', 'Время вызова метода менеджера', ('currency', 'method'),
+    buckets=DURATION_BUCKETS)
+manager_in_flight = Gauge(
+    'wallet_manager_in_flight', 'Выполняющиеся вызовы методов менеджера', ('currency', 'method'),
+    multiprocess_mode='livesum')
+
+# Представления и база данных
+view_requests = Counter(
+    'wallet_http_requests_total', 'Запросы к API', ('view', 'method', 'status'))
+view_duration = Histogram(
+    'wallet_http_request_duration_seconds', 'Время обработки запроса к API', ('view', 'method'),
+    buckets=DURATION_BUCKETS)
+view_queries = Histogram(
+    'wallet_http_request_db_queries', 'Число запросов к базе за один запрос к API', ('view', 'method'),
+    buckets=SIZE_BUCKETS)
+view_in_flight = Gauge(
+    'wallet_http_requests_in_flight', 'Обрабатываемые запросы к API', multiprocess_mode='livesum')
+db_duration = Histogram(
+    'wallet_db_query_duration_seconds', 'Время запроса к базе', ('alias',), buckets=DURATION_BUCKETS)
+
+# Счетчик запросов к базе текущего запроса к API; контекст переходит и в sync_to_async
+_request_queries: ContextVar[Optional[list]] = ContextVar('request_queries', default=None)
+
+
+def enabled() -> bool:
+    return settings.METRICS_ENABLED
+
+
+def render() -> bytes:
+    """
+    Метрики в текстовом формате Prometheus. При заданном PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py)
+    значения собираются из файлов всех воркеров, иначе отдаются метрики текущего процесса
+    :return: bytes
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def instrument_manager(method):
+    """
+    Декоратор метода CryptoManager: число вызовов, ошибок, время и выполняющиеся вызовы по валюте и методу
+    """
+    name = method.__name__
+
+    if inspect.iscoroutinefunction(method):
+        @wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            if not enabled():
+                return await method(self, *args, **kwargs)
+            labels = (self.currency, name)
+            manager_calls.labels(*labels).inc()
+            manager_in_flight.labels(*labels).inc()
+            started = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            except Exception:
+                manager_errors.labels(*labels).inc()
+                raise
+            finally:
+                manager_duration.labels(*labels).observe(time.perf_counter() - started)
+                manager_in_flight.labels(*labels).dec()
+        return async_wrapper
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not enabled():
+            return method(self, *args, **kwargs)
+        labels = (self.currency, name)
+        manager_calls.labels(*labels).inc()
+        manager_in_flight.labels(*labels).inc()
+        started = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        except Exception:
+            manager_errors.labels(*labels).inc()
+            raise
+        finally:
+            manager_duration.labels(*labels).observe(time.perf_counter() - started)
+            manager_in_flight.labels(*labels).dec()
+    return wrapper
+
+
+def observe_rpc(methods: Dict[str, int], started: float, error: Optional[BaseException] = None):
+    """
+    Учет запроса к ноде
+    :param methods: Dict[str, int] - Число вызовов в запросе по методам
+    :param started: float - Время начала запроса (time.perf_counter)
+    :param error: BaseException - Ошибка запроса
+    """
+    method = next(iter(methods)) if len(methods) == 1 else 'mixed'
+    rpc_duration.labels(method).observe(time.perf_counter() - started)
+    rpc_batch_size.observe(sum(methods.values()))
+    for name, count in methods.items():
+        rpc_calls.labels(name).inc(count)
+    if error is not None:
+        rpc_errors.labels(method, type(error).__name__).inc()
+
+
+def count_query(execute, sql, params, many, context):
+    """
+    Обертка выполнения запросов к базе (connection.execute_wrapper): время запроса, счетчик запросов
+    текущего запроса к API и время ORM профилируемого запроса
+    """
+    profile = profiling.current()
+    if not enabled() and profile is None:
+        return execute(sql, params, many, context)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        if enabled():
+            db_duration.labels(context['connection'].alias).observe(elapsed)
+        if profile is not None:
+            profile.add('orm', elapsed)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    Обработчик сигнала connection_created: подключение обертки запросов к новому соединению
+    """
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+def start_request() -> Tuple[float, list]:
+    view_in_flight.inc()
+    queries = [0]
+    _request_queries.set(queries)
+    return time.perf_counter(), queries
+
+
+def finish_request(request, response, started: float, queries: list):
+    match = getattr(request, 'resolver_match', None)
+    view = (match.view_name or match._func_path) if match is not None else 'unmatched'
+    view_in_flight.dec()
+    view_requests.labels(view, request.method, str(response.status_code)).inc()
+    view_duration.labels(view, request.method).observe(time.perf_counter() - started)
+    view_queries.labels(view, request.method).observe(queries[0])
+    _request_queries.set(None)
@@ -0,0 +1,124 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.models import F
+
+from . import metrics, profiling
+from .models import ProfileRule, RequestProfile
+
+
+class MetricsMiddleware:
+    """
+    Метрики запросов к API: число запросов по представлению, методу и статусу, время обработки,
+    число запросов к базе и обрабатываемые запросы. Работает и под WSGI, и под ASGI без перехода между потоками
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not metrics.enabled():
+            return self.get_response(request)
+        started, queries = metrics.start_request()
+        response = self.get_response(request)
+        metrics.finish_request(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        if not metrics.enabled():
+            return await self.get_response(request)
+        started, queries = metrics.start_request()
+        response = await self.get_response(request)
+        metrics.finish_request(request, response, started, queries)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование отдельных запросов семплирующим профилировщиком.
+    Запрос профилируется, если в заголовке X-Profile-Token передан подписанный токен (manage.py profile_token)
+    или для его пути есть правило профилирования в админке. Профиль с временем по частям запроса и стеками
+    для flame graph сохраняется в RequestProfile, его номер возвращается в заголовке X-Profile-Id.
+    При PROFILING_ENABLED=0 middleware отключается при запуске и не участвует в обработке запросов
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if profiling.rule_cache.stale:
+            profiling.rule_cache.refresh()
+        rule = self.match(request)
+        if rule is False or (rule is not None and not self.consume(rule)):
+            return self.get_response(request)
+        profile = profiling.Profile(settings.PROFILING_INTERVAL)
+        profile.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            profile.stop()
+        response['X-Profile-Id'] = str(self.save(request, response, profile))
+        return response
+
+    async def __acall__(self, request):
+        if profiling.rule_cache.stale:
+            await sync_to_async(profiling.rule_cache.refresh)()
+        rule = self.match(request)
+        if rule is False or (rule is not None and not await sync_to_async(self.consume)(rule)):
+            return await self.get_response(request)
+        profile = profiling.Profile(settings.PROFILING_INTERVAL)
+        profile.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            profile.stop()
+        response['X-Profile-Id'] = str(await sync_to_async(self.save)(request, response, profile))
+        return response
+
+    @staticmethod
+    def match(request):
+        """
+        Нужно ли профилировать запрос
+        :return: None - профилировать по токену, ProfileRule - профилировать по правилу, False - не профилировать
+        """
+        token = request.META.get(profiling.TOKEN_HEADER)
+        if token and profiling.check_token(token, request.path):
+            return None
+        return profiling.rule_cache.match(request.path) or False
+
+    @staticmethod
+    def consume(rule: ProfileRule) -> bool:
+        """
+        Списание одного запроса из правила; правило могли исчерпать другие воркеры
+        :return: bool - Удалось ли списать
+        """
+        updated = ProfileRule.objects.filter(pk=rule.pk, enabled=True, remaining__gt=0).update(
+            remaining=F('remaining') - 1)
+        profiling.rule_cache.invalidate()
+        return bool(updated)
+
+    @staticmethod
+    def save(request, response, profile: profiling.Profile) -> int:
+        return RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:2048],
+            status=response.status_code,
+            wall_time=profile.wall,
+            breakdown=profile.breakdown(),
+            samples=profile.samples,
+            stacks=profile.folded(),
+        ).id
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 16:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0003_alter_wallet_private_key_alter_wallet_public_key'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='wallet',
+            index=models.Index(fields=['currency', 'id'], name='wallet_currency_id_idx'),
+        ),
+    ]
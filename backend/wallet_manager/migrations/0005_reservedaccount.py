@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0004_wallet_currency_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservedAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('private_key', models.CharField(max_length=66, unique=True, verbose_name='Приватный ключ')),
+                ('public_key', models.CharField(max_length=44, unique=True, verbose_name='Публичный ключ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reservedaccount',
+            index=models.Index(fields=['currency', 'id'], name='reserved_currency_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2 on 2026-10-18 16:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0005_reservedaccount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SenderNonce',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('address', models.CharField(max_length=44, verbose_name='Адрес отправителя')),
+                ('next_nonce', models.BigIntegerField(verbose_name='Следующий nonce')),
+                ('released', models.JSONField(default=list, verbose_name='Освобожденные nonce')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='sendernonce',
+            constraint=models.UniqueConstraint(fields=('currency', 'address'), name='sender_nonce_currency_address_uniq'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0006_sendernonce'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Transaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, verbose_name='Валюта')),
+                ('from_address', models.CharField(max_length=44, verbose_name='Адрес отправителя')),
+                ('to_address', models.CharField(max_length=44, verbose_name='Адрес получателя')),
+                ('amount', models.DecimalField(decimal_places=8, max_digits=20, verbose_name='Сумма перевода')),
+                ('status', models.CharField(choices=[('queued', 'В очереди'), ('sending', 'Отправляется'), ('broadcast', 'Отправлена в сеть'), ('mined', 'Включена в блок'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='Статус')),
+                ('hash', models.CharField(blank=True, max_length=66, null=True, verbose_name='Хэш транзакции')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Число попыток отправки')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['status', 'id'], name='transaction_status_id_idx'),
+        ),
+    ]
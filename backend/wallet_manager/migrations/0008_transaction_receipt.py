@@ -0,0 +1,38 @@
+# Generated by Django 4.2 on 2026-10-18 16:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0007_transaction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='block_hash',
+            field=models.CharField(blank=True, max_length=66, null=True, verbose_name='Хэш блока'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='block_number',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Номер блока'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='confirmations',
+            field=models.PositiveIntegerField(default=0, verbose_name='Число подтверждений'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='hash',
+            field=models.CharField(blank=True, db_index=True, max_length=66, null=True, verbose_name='Хэш транзакции'),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('sending', 'Отправляется'), ('broadcast', 'Отправлена в сеть'), ('mined', 'Включена в блок'), ('confirmed', 'Подтверждена'), ('failed', 'Ошибка')], default='queued', max_length=10, verbose_name='Статус'),
+        ),
+    ]
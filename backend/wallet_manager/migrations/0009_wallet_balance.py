@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 16:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0008_transaction_receipt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlockFollowerState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, unique=True, verbose_name='Валюта')),
+                ('block_number', models.BigIntegerField(verbose_name='Номер блока')),
+                ('block_hash', models.CharField(max_length=66, verbose_name='Хэш блока')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='balance',
+            field=models.DecimalField(blank=True, decimal_places=0, max_digits=78, null=True, verbose_name='Баланс'),
+        ),
+        migrations.AddField(
+            model_name='wallet',
+            name='balance_block',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='Блок, на котором прочитан баланс'),
+        ),
+    ]
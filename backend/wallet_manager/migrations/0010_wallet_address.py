@@ -0,0 +1,74 @@
+# Generated by Django 4.2 on 2026-10-18 16:33
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Length, Lower
+
+BATCH_SIZE = 10000
+
+
+def remove_case_duplicates(apps, schema_editor):
+    """
+    Кошельки, публичные ключи которых отличаются только регистром, получат один бинарный адрес, и заполнение
+    уникальной колонки address упадет. Такие строки - один и тот же аккаунт, записанный дважды: дубликаты
+    с тем же приватным ключом удаляются (остается кошелек с меньшим id). Если приватные ключи различаются,
+    данные повреждены, миграция останавливается со списком кошельков для ручного разбора
+    """
+    Wallet = apps.get_model('wallet_manager', 'Wallet')
+    addresses = (
+        Wallet.objects.filter(public_key__istartswith='0x')
+        .annotate(length=Length('public_key'), key=Lower('public_key')).filter(length=42)
+    )
+    duplicates = addresses.values('key').annotate(count=Count('id')).filter(count__gt=1).values_list('key', flat=True)
+    conflicts = []
+    for key in duplicates:
+        wallets = list(addresses.filter(key=key).order_by('id').values_list('id', 'private_key'))
+        private_keys = {private_key.lower().removeprefix('0x') for _, private_key in wallets}
+        if len(private_keys) > 1:
+            conflicts.append(f'{key}: {", ".join(str(wallet_id) for wallet_id, _ in wallets)}')
+        else:
+            Wallet.objects.filter(id__in=[wallet_id for wallet_id, _ in wallets[1:]]).delete()
+    if conflicts:
+        raise RuntimeError(
+            'Кошельки с одним адресом в разном регистре и разными приватными ключами (адрес: id кошельков), '
+            'оставьте по одному кошельку на адрес и повторите миграцию:\n' + '\n'.join(conflicts)
+        )
+
+
+def fill_addresses(apps, schema_editor):
+    """
+    Заполнение бинарного адреса существующих кошельков из публичного ключа
+    """
+    Wallet = apps.get_model('wallet_manager', 'Wallet')
+    last_id = 0
+    while True:
+        wallets = list(Wallet.objects.filter(id__gt=last_id).order_by('id').only('id', 'public_key')[:BATCH_SIZE])
+        if not wallets:
+            return
+        last_id = wallets[-1].id
+        for wallet in wallets:
+            public_key = wallet.public_key
+            wallet.address = None
+            if len(public_key) == 42 and public_key[:2] in ('0x', '0X'):
+                try:
+                    wallet.address = bytes.fromhex(public_key[2:])
+                except ValueError:
+                    pass
+        Wallet.objects.bulk_update(wallets, ['address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0009_wallet_balance'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_case_duplicates, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='wallet',
+            name='address',
+            field=models.BinaryField(blank=True, max_length=20, null=True, unique=True, verbose_name='Адрес'),
+        ),
+        migrations.RunPython(fill_addresses, migrations.RunPython.noop),
+    ]
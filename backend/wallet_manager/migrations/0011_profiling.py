@@ -0,0 +1,46 @@
+# Generated by Django 4.2 on 2026-10-18 16:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0010_wallet_address'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(default='/api/v1/wallets/', max_length=255, verbose_name='Префикс пути')),
+                ('remaining', models.PositiveIntegerField(default=1, verbose_name='Осталось запросов')),
+                ('enabled', models.BooleanField(default=True, verbose_name='Включено')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Правило профилирования',
+                'verbose_name_plural': 'Правила профилирования',
+            },
+        ),
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=10, verbose_name='Метод')),
+                ('path', models.CharField(max_length=2048, verbose_name='Путь')),
+                ('status', models.PositiveSmallIntegerField(verbose_name='Статус ответа')),
+                ('wall_time', models.FloatField(verbose_name='Время запроса, с')),
+                ('breakdown', models.JSONField(default=dict, verbose_name='Время по частям запроса, с')),
+                ('samples', models.PositiveIntegerField(verbose_name='Число семплов')),
+                ('stacks', models.TextField(verbose_name='Стеки в свернутом формате')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Профиль запроса',
+                'verbose_name_plural': 'Профили запросов',
+                'ordering': ('-id',),
+            },
+        ),
+    ]
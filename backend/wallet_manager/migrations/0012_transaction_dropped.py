@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0011_profiling'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('queued', 'В очереди'), ('sending', 'Отправляется'), ('broadcast', 'Отправлена в сеть'), ('mined', 'Включена в блок'), ('confirmed', 'Подтверждена'), ('failed', 'Ошибка'), ('dropped', 'Не включена в блок')], default='queued', max_length=10, verbose_name='Статус'),
+        ),
+    ]
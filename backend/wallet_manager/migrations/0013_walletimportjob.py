@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0012_transaction_dropped'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('format', models.CharField(max_length=10, verbose_name='Формат файла')),
+                ('currency', models.CharField(blank=True, max_length=3, null=True, verbose_name='Валюта для строк без валюты')),
+                ('path', models.CharField(max_length=255, verbose_name='Путь к сохраненному файлу')),
+                ('status', models.CharField(choices=[('pending', 'Ожидает запуска'), ('running', 'Выполняется'), ('done', 'Завершен'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('read', models.PositiveBigIntegerField(default=0, verbose_name='Прочитано строк')),
+                ('imported', models.PositiveBigIntegerField(default=0, verbose_name='Добавлено кошельков')),
+                ('skipped', models.PositiveBigIntegerField(default=0, verbose_name='Уже были в базе')),
+                ('invalid', models.PositiveBigIntegerField(default=0, verbose_name='Некорректных строк')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+            ],
+        ),
+    ]
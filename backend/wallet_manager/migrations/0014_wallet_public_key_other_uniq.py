@@ -0,0 +1,22 @@
+# Generated by Django 4.2 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0013_walletimportjob'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='wallet',
+            constraint=models.UniqueConstraint(condition=models.Q(('address__isnull', True)), fields=('public_key',), name='wallet_public_key_other_uniq'),
+        ),
+        migrations.AlterField(
+            model_name='wallet',
+            name='public_key',
+            field=models.CharField(max_length=44, verbose_name='Публичный ключ'),
+        ),
+    ]
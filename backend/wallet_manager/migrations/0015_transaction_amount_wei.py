@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet_manager', '0014_wallet_public_key_other_uniq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=0, max_digits=78, verbose_name='Сумма перевода'),
+        ),
+    ]
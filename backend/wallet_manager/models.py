@@ -1,11 +1,229 @@
+from typing import Iterable
+
 from django.db import models
+from django.db.models import Q
+
+from .addresses import address_to_bytes
+
+
+class WalletQuerySet(models.QuerySet):
+    """Запросы кошельков с поиском по адресу"""
+
+    def filter_addresses(self, addresses: Iterable[str]) -> 'WalletQuerySet':
+        """
+        Отбор кошельков по адресам без учета регистра.
+        Адреса 0x... ищутся по бинарной колонке address, публичные ключи других форматов - по public_key
+        с условием address IS NULL, чтобы использовался частичный индекс wallet_public_key_other_uniq
+        :param addresses: Iterable[str]
+        :return: WalletQuerySet
+        """
+        keys, public_keys = [], []
+        for address in addresses:
+            key = address_to_bytes(address)
+            if key is None:
+                public_keys.append(address)
+            else:
+                keys.append(key)
+        return self.filter(Q(address__in=keys) | Q(public_key__in=public_keys, address__isnull=True))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create не вызывает save, поэтому бинарный адрес заполняется здесь
+        objs = list(objs)
+        for obj in objs:
+            obj.fill_address()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class Wallet(models.Model):
     """Модель кошелька"""
     currency = models.CharField(max_length=3, verbose_name='Валюта')
     private_key = models.CharField(max_length=66, verbose_name='Приватный ключ', unique=True)
+    # Строка ключа хранится на время перехода на бинарный address: ее отдают сериализаторы и API в исходном
+    # регистре (контрольная сумма EIP-55), и только в ней есть ключи других форматов. Поиск по адресам
+    # идет через WalletQuerySet.filter_addresses, которому строковая колонка для адресов 0x... не нужна.
+    # Уникальность адресов 0x... обеспечивает индекс address, уникальный индекс по строке нужен только
+    # для ключей других форматов, поэтому он частичный (wallet_public_key_other_uniq)
+    public_key = models.CharField(max_length=44, verbose_name='Публичный ключ')
+    # 20 байт адреса 0x..., заполняется из public_key; для ключей других форматов пустой
+    address = models.BinaryField(max_length=20, null=True, blank=True, unique=True, editable=False,
+                                 verbose_name='Адрес')
+    # Баланс обновляется индексатором блоков (manage.py follow_blocks)
+    balance = models.DecimalField(max_digits=78, decimal_places=0, null=True, blank=True, verbose_name='Баланс')
+    balance_block = models.BigIntegerField(null=True, blank=True, verbose_name='Блок, на котором прочитан баланс')
+
+    objects = WalletQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Для пагинации по курсору с фильтром по валюте
+            models.Index(fields=['currency', 'id'], name='wallet_currency_id_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['public_key'], condition=Q(address__isnull=True),
+                                    name='wallet_public_key_other_uniq'),
+        ]
+
+    def __str__(self):
+        return self.public_key
+
+    def fill_address(self):
+        """
+        Заполнение бинарного адреса из публичного ключа
+        """
+        self.address = address_to_bytes(self.public_key)
+
+    def save(self, *args, **kwargs):
+        self.fill_address()
+        super().save(*args, **kwargs)
+
+
+class ReservedAccount(models.Model):
+    """Заранее сгенерированный аккаунт, еще не привязанный к кошельку"""
+    currency = models.CharField(max_length=3, verbose_name='Валюта')
+    private_key = models.CharField(max_length=66, verbose_name='Приватный ключ', unique=True)
     public_key = models.CharField(max_length=44, verbose_name='Публичный ключ', unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['currency', 'id'], name='reserved_currency_id_idx'),
+        ]
 
     def __str__(self):
         return self.public_key
+
+
+class SenderNonce(models.Model):
+    """Следующий свободный nonce отправителя, общий для всех воркеров"""
+    currency = models.CharField(max_length=3, verbose_name='Валюта')
+    address = models.CharField(max_length=44, verbose_name='Адрес отправителя')
+    next_nonce = models.BigIntegerField(verbose_name='Следующий nonce')
+    released = models.JSONField(default=list, verbose_name='Освобожденные nonce')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['currency', 'address'], name='sender_nonce_currency_address_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.address}: {self.next_nonce}'
+
+
+class Transaction(models.Model):
+    """Перевод в очереди на отправку"""
+    STATUS_QUEUED = 'queued'
+    STATUS_SENDING = 'sending'
+    STATUS_BROADCAST = 'broadcast'
+    STATUS_MINED = 'mined'
+    STATUS_CONFIRMED = 'confirmed'
+    STATUS_FAILED = 'failed'
+    STATUS_DROPPED = 'dropped'
+    STATUS_CHOICES = (
+        (STATUS_QUEUED, 'В очереди'),
+        (STATUS_SENDING, 'Отправляется'),
+        (STATUS_BROADCAST, 'Отправлена в сеть'),
+        (STATUS_MINED, 'Включена в блок'),
+        (STATUS_CONFIRMED, 'Подтверждена'),
+        (STATUS_FAILED, 'Ошибка'),
+        (STATUS_DROPPED, 'Не включена в блок'),
+    )
+
+    currency = models.CharField(max_length=3, verbose_name='Валюта')
+    from_address = models.CharField(max_length=44, verbose_name='Адрес отправителя')
+    to_address = models.CharField(max_length=44, verbose_name='Адрес получателя')
+    # Сумма в wei, uint256 - до 78 цифр, как у баланса кошелька
+    amount = models.DecimalField(max_digits=78, decimal_places=0, verbose_name='Сумма перевода')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name='Статус')
+    hash = models.CharField(max_length=66, null=True, blank=True, db_index=True, verbose_name='Хэш транзакции')
+    block_number = models.BigIntegerField(null=True, blank=True, verbose_name='Номер блока')
+    block_hash = models.CharField(max_length=66, null=True, blank=True, verbose_name='Хэш блока')
+    confirmations = models.PositiveIntegerField(default=0, verbose_name='Число подтверждений')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Число попыток отправки')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    class Meta:
+        indexes = [
+            # Для выборки очереди воркерами
+            models.Index(fields=['status', 'id'], name='transaction_status_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.from_address} -> {self.to_address}: {self.amount} {self.currency}'
+
+
+class WalletImportJob(models.Model):
+    """Импорт кошельков из загруженного файла, выполняемый в фоне"""
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Ожидает запуска'),
+        (STATUS_RUNNING, 'Выполняется'),
+        (STATUS_DONE, 'Завершен'),
+        (STATUS_FAILED, 'Ошибка'),
+    )
+
+    format = models.CharField(max_length=10, verbose_name='Формат файла')
+    currency = models.CharField(max_length=3, null=True, blank=True, verbose_name='Валюта для строк без валюты')
+    path = models.CharField(max_length=255, verbose_name='Путь к сохраненному файлу')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name='Статус')
+    read = models.PositiveBigIntegerField(default=0, verbose_name='Прочитано строк')
+    imported = models.PositiveBigIntegerField(default=0, verbose_name='Добавлено кошельков')
+    skipped = models.PositiveBigIntegerField(default=0, verbose_name='Уже были в базе')
+    invalid = models.PositiveBigIntegerField(default=0, verbose_name='Некорректных строк')
+    error = models.TextField(blank=True, default='', verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f'{self.format} {self.status}: {self.imported}/{self.read}'
+
+
+class BlockFollowerState(models.Model):
+    """Последний обработанный индексатором блок"""
+    currency = models.CharField(max_length=3, unique=True, verbose_name='Валюта')
+    block_number = models.BigIntegerField(verbose_name='Номер блока')
+    block_hash = models.CharField(max_length=66, verbose_name='Хэш блока')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='Дата обновления')
+
+    def __str__(self):
+        return f'{self.currency}: {self.block_number}'
+
+
+class ProfileRule(models.Model):
+    """Правило профилирования: следующие remaining запросов с путем, начинающимся с path, профилируются"""
+    path = models.CharField(max_length=255, default='/api/v1/wallets/', verbose_name='Префикс пути')
+    remaining = models.PositiveIntegerField(default=1, verbose_name='Осталось запросов')
+    enabled = models.BooleanField(default=True, verbose_name='Включено')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Правило профилирования'
+        verbose_name_plural = 'Правила профилирования'
+
+    def __str__(self):
+        return f'{self.path}: {self.remaining}'
+
+
+class RequestProfile(models.Model):
+    """Результат профилирования одного запроса"""
+    method = models.CharField(max_length=10, verbose_name='Метод')
+    path = models.CharField(max_length=2048, verbose_name='Путь')
+    status = models.PositiveSmallIntegerField(verbose_name='Статус ответа')
+    wall_time = models.FloatField(verbose_name='Время запроса, с')
+    breakdown = models.JSONField(default=dict, verbose_name='Время по частям запроса, с')
+    samples = models.PositiveIntegerField(verbose_name='Число семплов')
+    stacks = models.TextField(verbose_name='Стеки в свернутом формате')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    class Meta:
+        verbose_name = 'Профиль запроса'
+        verbose_name_plural = 'Профили запросов'
+        ordering = ('-id',)
+
+    def __str__(self):
+        return f'{self.method} {self.path} ({self.wall_time * 1000:.1f} ms)'
@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+
+
+class WalletCursorPagination(CursorPagination):
+    """
+    Пагинация по курсору, упорядоченная по id.
+    Не выполняет COUNT(*) и OFFSET, поэтому стоимость любой страницы одинакова
+    """
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+def get_wallet_pagination_class(request):
+    """
+    Выбор пагинации для списка кошельков: по курсору, если клиент запросил ее явно
+    (pagination=cursor или передан cursor), иначе limit/offset
+    :param request: Request
+    :return: класс пагинации
+    """
+    params = request.query_params
+    if params.get('pagination') == 'cursor' or WalletCursorPagination.cursor_query_param in params:
+        return WalletCursorPagination
+    return LimitOffsetPagination
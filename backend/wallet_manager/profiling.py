@@ -0,0 +1,210 @@
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Coroutine, Dict, Optional
+
+from django.conf import settings
+from django.core import signing
+
+# Соль подписи токена профилирования, чтобы токен нельзя было получить из других подписанных значений
+TOKEN_SALT = 'wallet_manager.profiling'
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+
+# Потоки циклов событий клиентов ноды, в них выполняется ввод-вывод запросов к ноде
+NODE_THREAD_PREFIX = 'node-client-'
+
+# Файлы, время в которых считается сериализацией
+SERIALIZATION_FILES = ('rest_framework/serializers.py', 'rest_framework/fields.py', 'rest_framework/relations.py')
+
+_current: ContextVar[Optional['Profile']] = ContextVar('profile', default=None)
+
+
+def current() -> Optional['Profile']:
+    """
+    Профиль текущего запроса, если запрос профилируется
+    :return: Optional[Profile]
+    """
+    return _current.get()
+
+
+def make_token(path: str = '/') -> str:
+    """
+    Подписанный токен для заголовка X-Profile-Token
+    :param path: str - Префикс пути запросов, которые можно профилировать этим токеном
+    :return: str
+    """
+    return signing.dumps({'path': path}, salt=TOKEN_SALT)
+
+
+def check_token(token: str, path: str) -> bool:
+    """
+    Проверка подписи, срока действия и пути токена
+    :param token: str
+    :param path: str - Путь запроса
+    :return: bool
+    """
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return isinstance(data, dict) and path.startswith(data.get('path', '/'))
+
+
+class Profile:
+    """
+    Профиль одного запроса: стеки, собранные семплирующим профилировщиком, и время по частям запроса.
+    ORM и ожидание ноды замеряются явно, ввод-вывод ноды - как время, когда есть хотя бы один запрос к ноде
+    в полете, сериализация оценивается по доле стеков в коде DRF
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.timings: Dict[str, float] = {'orm': 0.0, 'node_wait': 0.0, 'node_io': 0.0}
+        self.started = 0.0
+        self.wall = 0.0
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._io_started = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._token = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._token = _current.set(self)
+        self._thread = threading.Thread(
+            target=self._sample, args=(threading.get_ident(),), name='request-profiler', daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.wall = time.perf_counter() - self.started
+        _current.reset(self._token)
+
+    def add(self, part: str, elapsed: float):
+        with self._lock:
+            self.timings[part] += elapsed
+
+    def io_started(self):
+        with self._lock:
+            if self._in_flight == 0:
+                self._io_started = time.perf_counter()
+            self._in_flight += 1
+
+    def io_finished(self):
+        with self._lock:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self.timings['node_io'] += time.perf_counter() - self._io_started
+
+    def _sample(self, request_thread: int):
+        while not self._stop.wait(self.interval):
+            node_threads = {thread.ident for thread in threading.enumerate() if thread.name.startswith(NODE_THREAD_PREFIX)}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == request_thread:
+                    self.stacks['request;' + _fold(frame)] += 1
+                elif thread_id in node_threads:
+                    self.stacks['node-client;' + _fold(frame)] += 1
+            self.samples += 1
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Время запроса по частям в секундах
+        :return: Dict[str, float] - orm, serialization, node_io, event_loop (ожидание ноды сверх ввода-вывода:
+        передача корутины в цикл клиента, разбор ответов web3) и other
+        """
+        request_samples = sum(count for stack, count in self.stacks.items() if stack.startswith('request;'))
+        serialization_samples = sum(
+            count for stack, count in self.stacks.items()
+            if stack.startswith('request;') and any(name in stack for name in SERIALIZATION_FILES)
+        )
+        serialization = self.wall * serialization_samples / request_samples if request_samples else 0.0
+        # Семплы сериализации могут попасть на запросы к базе и ожидание ноды, уже учтенные явно
+        serialization = min(serialization, max(self.wall - self.timings['orm'] - self.timings['node_wait'], 0.0))
+        node_io = min(self.timings['node_io'], self.timings['node_wait']) if self.timings['node_wait'] else 0.0
+        parts = {
+            'orm': self.timings['orm'],
+            'serialization': serialization,
+            'node_io': node_io,
+            'event_loop': self.timings['node_wait'] - node_io,
+        }
+        parts['other'] = max(self.wall - sum(parts.values()), 0.0)
+        return parts
+
+    def folded(self) -> str:
+        """
+        Стеки в свернутом формате (строка на стек: функции через ; и число семплов),
+        из которого строятся flame graph (flamegraph.pl, speedscope)
+        :return: str
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _fold(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _short_path(path: str) -> str:
+    # Путь от site-packages или от корня проекта, чтобы отчет не зависел от окружения
+    for marker in ('site-packages/', 'backend/'):
+        index = path.rfind(marker)
+        if index != -1:
+            return path[index + len(marker):]
+    return path
+
+
+class RuleCache:
+    """
+    Правила профилирования из админки, кэшируются в памяти процесса на PROFILING_RULES_TTL секунд,
+    чтобы не обращаться к базе на каждом запросе
+    """
+
+    def __init__(self):
+        self._rules = []
+        self._loaded_at: Optional[float] = None
+
+    @property
+    def stale(self) -> bool:
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= settings.PROFILING_RULES_TTL
+
+    def refresh(self):
+        from .models import ProfileRule
+
+        self._rules = list(ProfileRule.objects.filter(enabled=True, remaining__gt=0))
+        self._loaded_at = time.monotonic()
+
+    def match(self, path: str):
+        """
+        Активное правило, подходящее к пути запроса; правила должны быть загружены (refresh)
+        :param path: str
+        :return: Optional[ProfileRule]
+        """
+        for rule in self._rules:
+            if path.startswith(rule.path):
+                return rule
+        return None
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+rule_cache = RuleCache()
+
+
+async def bind(coro: Coroutine, profile: Profile) -> Any:
+    """
+    Выполнение корутины в цикле событий клиента ноды с профилем запроса, который ее запустил
+    """
+    _current.set(profile)
+    return await coro
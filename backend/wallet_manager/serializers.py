@@ -1,8 +1,47 @@
-import copy
-
+from django.conf import settings
 from rest_framework import serializers
 
-from .models import Wallet
+from .addresses import normalize_address
+from .importer import IMPORT_FORMATS
+from .models import Transaction, Wallet, WalletImportJob
+
+
+class AddressField(serializers.CharField):
+    """
+    Поле адреса кошелька: адреса 0x... в любом регистре приводятся к виду с контрольной суммой,
+    в котором хранятся публичные ключи
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_length', 44)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return normalize_address(super().to_internal_value(data))
+
+
+class AmountField(serializers.DecimalField):
+    """
+    Поле суммы перевода в минимальных единицах валюты (wei): дробные суммы отклоняются, а не округляются.
+    Разрядность совпадает с полем суммы перевода в очереди и с балансом кошелька (uint256 - до 78 цифр)
+    """
+    default_error_messages = {
+        'not_integral': 'Сумма перевода указывается целым числом в минимальных единицах валюты (wei)',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 78)
+        kwargs.setdefault('decimal_places', 0)
+        super().__init__(**kwargs)
+
+    def validate_precision(self, value):
+        # Целые суммы с нулевой дробной частью (100.0) принимаются, остальные дробные отклоняются
+        if value != value.to_integral_value():
+            self.fail('not_integral')
+        return super().validate_precision(value.to_integral_value())
+
+    def to_internal_value(self, data):
+        return int(super().to_internal_value(data))
 
 
 class WalletSerializer(serializers.ModelSerializer):
@@ -16,36 +55,81 @@ class WalletSerializer(serializers.ModelSerializer):
         read_only_fields = ('public_key',)
 
 
+class WalletBulkCreateSerializer(serializers.Serializer):
+    """
+    Сериализатор для массового создания кошельков
+    """
+    currency = serializers.CharField(max_length=3, required=True)
+    count = serializers.IntegerField(min_value=1, required=True, write_only=True)
+    public_keys = serializers.ListField(child=serializers.CharField(), read_only=True)
+
+    def validate_count(self, value):
+        if value > settings.WALLET_BULK_MAX_COUNT:
+            raise serializers.ValidationError(f'Можно создать не более {settings.WALLET_BULK_MAX_COUNT} кошельков')
+        return value
+
+
+class WalletImportSerializer(serializers.Serializer):
+    """
+    Сериализатор для импорта существующих кошельков из файла
+    """
+    file = serializers.FileField(required=True, write_only=True)
+    format = serializers.ChoiceField(choices=IMPORT_FORMATS, required=False, write_only=True)
+    currency = serializers.CharField(max_length=3, required=False, write_only=True)
+
+    def validate(self, attrs):
+        """
+        Переопределяем метод, чтобы определить формат по расширению файла, если он не указан
+        """
+        if 'format' not in attrs:
+            extension = attrs['file'].name.rsplit('.', 1)[-1].lower()
+            if extension not in IMPORT_FORMATS:
+                raise serializers.ValidationError({'format': ['Не удалось определить формат файла']})
+            attrs['format'] = extension
+        return attrs
+
+
+class WalletImportJobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор задания импорта кошельков, используется для получения прогресса
+    """
+
+    class Meta:
+        model = WalletImportJob
+        fields = ('id', 'status', 'format', 'currency', 'read', 'imported', 'skipped', 'invalid', 'error',
+                  'created_at', 'updated_at')
+        read_only_fields = fields
+
+
 class WalletTransactionSerializer(serializers.Serializer):
     """
     Сериализатор для транзакции, используется для отправки транзакции
     """
-    from_address = serializers.CharField(max_length=44, required=True, write_only=True)
-    to = serializers.CharField(max_length=44, required=True, write_only=True)
-    amount = serializers.DecimalField(max_digits=20, decimal_places=8, required=True, write_only=True)
-    currency = serializers.CharField(max_length=3, required=True, write_only=True)
-    hash = serializers.CharField(max_length=66, required=False, read_only=True)
+
+    def get_fields(self):
+        """
+        Переопределяем метод, чтобы поле отправителя называлось from.
+        Поля создаются заново для каждого сериализатора вместо глубокого копирования объявленных полей
+        """
+        return {
+            'from': AddressField(required=True, write_only=True),
+            'to': AddressField(required=True, write_only=True),
+            'amount': AmountField(required=True, write_only=True),
+            'currency': serializers.CharField(max_length=3, required=True, write_only=True),
+            'hash': serializers.CharField(max_length=66, required=False, read_only=True),
+        }
 
     def validate(self, attrs):
         """
         Переопределяем метод, чтобы проверить, что адрес отправителя не совпадает с адресом получателя
         """
-        # переводить можно тольĸо между ĸошельĸами внутри системы
-        if not Wallet.objects.filter(public_key=attrs['from']).exists() or \
-                not Wallet.objects.filter(public_key=attrs['to']).exists():
-            raise serializers.ValidationError({'from': ['Нельзя отправлять транзакцию между кошельками вне системы']})
-
         if attrs['from'] == attrs['to']:
             raise serializers.ValidationError({'from': ['Нельзя отправлять транзакцию самому себе']})
-        return attrs
 
-    def get_fields(self):
-        """
-        Переопределяем метод, чтобы переименовать поле from_address в from
-        """
-        fields = copy.deepcopy(super().get_fields())
-        fields['from'] = fields.pop('from_address')
-        return fields
+        # переводить можно тольĸо между ĸошельĸами внутри системы, оба адреса проверяются одним запросом
+        if Wallet.objects.filter_addresses((attrs['from'], attrs['to'])).count() != 2:
+            raise serializers.ValidationError({'from': ['Нельзя отправлять транзакцию между кошельками вне системы']})
+        return attrs
 
     def create(self, validated_data):
         """
@@ -58,3 +142,57 @@ class WalletTransactionSerializer(serializers.Serializer):
         Должен быть переопределен, но не используется
         """
         pass
+
+
+class WalletTransferSerializer(serializers.Serializer):
+    """
+    Сериализатор одного перевода в пакете.
+    Принадлежность кошельков системе проверяется для всего пакета сразу при отправке
+    """
+
+    def get_fields(self):
+        """
+        Переопределяем метод, чтобы поле отправителя называлось from
+        """
+        return {
+            'from': AddressField(required=True),
+            'to': AddressField(required=True),
+            'amount': AmountField(required=True),
+        }
+
+
+class WalletTransferBatchSerializer(serializers.Serializer):
+    """
+    Сериализатор для пакетной отправки переводов
+    """
+    currency = serializers.CharField(max_length=3, required=True)
+    transfers = WalletTransferSerializer(many=True, allow_empty=False)
+
+    def validate_transfers(self, value):
+        if len(value) > settings.WALLET_TRANSFER_BATCH_MAX_COUNT:
+            raise serializers.ValidationError(
+                f'Можно отправить не более {settings.WALLET_TRANSFER_BATCH_MAX_COUNT} переводов'
+            )
+        return value
+
+
+class TransactionSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор перевода из очереди, используется для получения статуса отправки
+    """
+
+    class Meta:
+        model = Transaction
+        fields = ('id', 'currency', 'from_address', 'to_address', 'amount', 'status', 'hash', 'error',
+                  'block_number', 'confirmations', 'created_at', 'updated_at')
+        read_only_fields = fields
+
+    def get_fields(self):
+        """
+        Переопределяем метод, чтобы поля назывались так же, как в запросе на отправку (from и to)
+        """
+        fields = super().get_fields()
+        for name, address_field in (('from', 'from_address'), ('to', 'to_address')):
+            fields[name] = fields.pop(address_field)
+            fields[name].source = address_field
+        return fields
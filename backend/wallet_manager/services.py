@@ -0,0 +1,370 @@
+from datetime import timedelta
+from typing import List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .addresses import address_key
+from .managers import CryptoManager, TransfersNotSentError
+from .models import ReservedAccount, Transaction, Wallet
+
+# Ошибка транзакции, квитанция которой содержит status 0
+TRANSACTION_REVERTED_ERROR = 'Транзакция отменена при исполнении'
+
+
+def create_wallets(currency: str, count: int, batch_size: Optional[int] = None) -> List[str]:
+    """
+    Массовое создание кошельков: ключи генерируются менеджером валюты,
+    кошельки вставляются пачками через bulk_create в одной транзакции
+    :param currency: str - Валюта
+    :param count: int - Число кошельков
+    :param batch_size: int - Размер пачки INSERT, по умолчанию settings.WALLET_BULK_BATCH_SIZE
+    :return: public_keys: List[str] - Публичные ключи созданных кошельков
+    """
+    manager = CryptoManager(settings.ETH_API_KEY, currency)
+    accounts = manager.get_new_accounts(count)
+
+    with transaction.atomic():
+        Wallet.objects.bulk_create(
+            (Wallet(currency=currency, **account) for account in accounts),
+            batch_size=batch_size or settings.WALLET_BULK_BATCH_SIZE,
+        )
+    return [account['public_key'] for account in accounts]
+
+
+def create_wallet_from_reservoir(currency: str) -> Optional[Wallet]:
+    """
+    Создание кошелька из заранее сгенерированного аккаунта.
+    Аккаунт забирается через SELECT ... FOR UPDATE SKIP LOCKED, поэтому параллельные запросы
+    не ждут друг друга и не получают один и тот же аккаунт
+    :param currency: str - Валюта
+    :return: wallet: Optional[Wallet] - Кошелек или None, если запас аккаунтов пуст
+    """
+    with transaction.atomic():
+        reserved = (
+            ReservedAccount.objects.select_for_update(skip_locked=True)
+            .filter(currency=currency)
+            .order_by('id')
+            .first()
+        )
+        if reserved is None:
+            return None
+        reserved.delete()
+        return Wallet.objects.create(
+            currency=currency,
+            private_key=reserved.private_key,
+            public_key=reserved.public_key,
+        )
+
+
+def refill_reservoir(currency: str, low_watermark: Optional[int] = None, high_watermark: Optional[int] = None,
+                     batch_size: Optional[int] = None) -> int:
+    """
+    Пополнение запаса аккаунтов до верхней границы, если он опустился ниже нижней
+    :param currency: str - Валюта
+    :param low_watermark: int - Нижняя граница, по умолчанию settings.WALLET_RESERVOIR_LOW_WATERMARK
+    :param high_watermark: int - Верхняя граница, по умолчанию settings.WALLET_RESERVOIR_HIGH_WATERMARK
+    :param batch_size: int - Размер пачки INSERT, по умолчанию settings.WALLET_BULK_BATCH_SIZE
+    :return: int - Число добавленных аккаунтов
+    """
+    low_watermark = settings.WALLET_RESERVOIR_LOW_WATERMARK if low_watermark is None else low_watermark
+    high_watermark = settings.WALLET_RESERVOIR_HIGH_WATERMARK if high_watermark is None else high_watermark
+    batch_size = batch_size or settings.WALLET_BULK_BATCH_SIZE
+
+    available = ReservedAccount.objects.filter(currency=currency).count()
+    if available >= low_watermark:
+        return 0
+
+    manager = CryptoManager(settings.ETH_API_KEY, currency)
+    added = 0
+    for start in range(available, high_watermark, batch_size):
+        accounts = manager.get_new_accounts(min(batch_size, high_watermark - start))
+        reserved = ReservedAccount.objects.filter(public_key__in=[account['public_key'] for account in accounts])
+        with transaction.atomic():
+            # Аккаунты с уже существующими ключами пропускаются, поэтому считаются только вставленные строки
+            before = reserved.count()
+            ReservedAccount.objects.bulk_create(
+                [ReservedAccount(currency=currency, **account) for account in accounts],
+                ignore_conflicts=True,
+            )
+            added += reserved.count() - before
+    return added
+
+
+def make_transfers(currency: str, transfers: List[dict], batch_size: Optional[int] = None) -> List[dict]:
+    """
+    Пакетная отправка переводов между кошельками системы.
+    Кошельки всех переводов загружаются из базы несколькими запросами по адресам,
+    переводы с кошельками вне системы и переводы самому себе не отправляются.
+    Транзакции подписываются локально ключами кошельков, поэтому нода не должна хранить ключи
+    :param currency: str - Валюта
+    :param transfers: List[dict] - Переводы с ключами from, to и amount
+    :param batch_size: int - Число адресов в одном запросе к базе, по умолчанию settings.WALLET_BULK_BATCH_SIZE
+    :return: results: List[dict] - Хэши транзакций или ошибки в порядке переводов
+    """
+    manager = CryptoManager(settings.ETH_API_KEY, currency)
+    results, valid, signable = _prepare_transfers(currency, transfers, batch_size)
+    sent = manager.make_transactions(signable) if signable else []
+    for index, result in zip(valid, sent):
+        results[index] = result
+    return results
+
+
+async def amake_transfers(currency: str, transfers: List[dict], batch_size: Optional[int] = None) -> List[dict]:
+    """
+    Асинхронная пакетная отправка переводов между кошельками системы, см. make_transfers
+    :param currency: str - Валюта
+    :param transfers: List[dict] - Переводы с ключами from, to и amount
+    :param batch_size: int - Число адресов в одном запросе к базе, по умолчанию settings.WALLET_BULK_BATCH_SIZE
+    :return: results: List[dict] - Хэши транзакций или ошибки в порядке переводов
+    """
+    manager = CryptoManager(settings.ETH_API_KEY, currency)
+    results, valid, signable = await sync_to_async(_prepare_transfers)(currency, transfers, batch_size)
+    sent = await manager.amake_transactions(signable) if signable else []
+    for index, result in zip(valid, sent):
+        results[index] = result
+    return results
+
+
+def _prepare_transfers(currency: str, transfers: List[dict],
+                       batch_size: Optional[int] = None) -> Tuple[List[dict], List[int], List[dict]]:
+    """
+    Проверка переводов и загрузка приватных ключей отправителей
+    :param currency: str - Валюта
+    :param transfers: List[dict] - Переводы с ключами from, to и amount
+    :param batch_size: int - Число адресов в одном запросе к базе
+    :return: (results, valid, signable) - Результаты с ошибками отклоненных переводов, индексы переводов
+    к отправке и эти переводы с приватным ключом отправителя
+    """
+    batch_size = batch_size or settings.WALLET_BULK_BATCH_SIZE
+
+    addresses = list({address for transfer in transfers for address in (transfer['from'], transfer['to'])})
+    # Ключи кошельков по адресу без учета регистра
+    private_keys = {}
+    for start in range(0, len(addresses), batch_size):
+        for public_key, private_key in (
+            Wallet.objects.filter(currency=currency).filter_addresses(addresses[start:start + batch_size])
+            .values_list('public_key', 'private_key')
+        ):
+            private_keys[address_key(public_key)] = private_key
+
+    results: List[dict] = [{} for _ in transfers]
+    valid = []
+    for index, transfer in enumerate(transfers):
+        from_key, to_key = address_key(transfer['from']), address_key(transfer['to'])
+        # переводить можно тольĸо между ĸошельĸами внутри системы
+        if from_key not in private_keys or to_key not in private_keys:
+            results[index] = {'error': 'Нельзя отправлять транзакцию между кошельками вне системы'}
+        elif from_key == to_key:
+            results[index] = {'error': 'Нельзя отправлять транзакцию самому себе'}
+        else:
+            valid.append(index)
+
+    signable = [
+        {**transfers[index], 'private_key': private_keys[address_key(transfers[index]['from'])]} for index in valid
+    ]
+    return results, valid, signable
+
+
+def enqueue_transaction(currency: str, from_address: str, to_address: str, amount) -> Transaction:
+    """
+    Постановка перевода в очередь отправки
+    :param currency: str - Валюта
+    :param from_address: str - Адрес отправителя
+    :param to_address: str - Адрес получателя
+    :param amount: Decimal - Сумма перевода
+    :return: Transaction
+    """
+    return Transaction.objects.create(
+        currency=currency, from_address=from_address, to_address=to_address, amount=amount,
+    )
+
+
+def expire_transaction_leases(lease_timeout: Optional[float] = None) -> int:
+    """
+    Завершение переводов, которые воркер забрал, но не обработал за время аренды (воркер упал или остановлен).
+    Перевод мог быть отправлен в сеть до сбоя, поэтому он не возвращается в очередь, а помечается ошибкой:
+    повторная отправка с новым nonce может перевести средства дважды
+    :param lease_timeout: float - Время аренды в секундах, по умолчанию settings.TRANSACTION_QUEUE_LEASE_TIMEOUT
+    :return: int - Число завершенных переводов
+    """
+    lease_timeout = settings.TRANSACTION_QUEUE_LEASE_TIMEOUT if lease_timeout is None else lease_timeout
+    return Transaction.objects.filter(
+        status=Transaction.STATUS_SENDING,
+        updated_at__lt=timezone.now() - timedelta(seconds=lease_timeout),
+    ).update(
+        status=Transaction.STATUS_FAILED,
+        error='Отправка прервана, результат неизвестен: проверьте транзакции отправителя перед повтором',
+        updated_at=timezone.now(),
+    )
+
+
+def claim_transactions(batch_size: int) -> List[Transaction]:
+    """
+    Выборка переводов из очереди для отправки.
+    Строки забираются через SELECT ... FOR UPDATE SKIP LOCKED и помечаются как отправляемые,
+    поэтому несколько воркеров не получают один и тот же перевод
+    :param batch_size: int - Максимальное число переводов
+    :return: List[Transaction]
+    """
+    with transaction.atomic():
+        claimed = list(
+            Transaction.objects.select_for_update(skip_locked=True)
+            .filter(status=Transaction.STATUS_QUEUED)
+            .order_by('id')[:batch_size]
+        )
+        Transaction.objects.filter(id__in=[item.id for item in claimed]).update(
+            status=Transaction.STATUS_SENDING, attempts=F('attempts') + 1, updated_at=timezone.now(),
+        )
+    for item in claimed:
+        item.status = Transaction.STATUS_SENDING
+        item.attempts += 1
+    return claimed
+
+
+def process_transaction_queue(batch_size: Optional[int] = None) -> int:
+    """
+    Отправка очередной пачки переводов из очереди.
+    Переводы каждой валюты отправляются одним вызовом make_transfers; если ошибка произошла до отправки
+    в сеть, переводы возвращаются в очередь, пока не исчерпано число попыток. Пачки валют, до которых
+    обработка не дошла из-за ошибки, возвращаются в очередь без траты попытки
+    :param batch_size: int - Число переводов, по умолчанию settings.TRANSACTION_QUEUE_BATCH_SIZE
+    :return: int - Число обработанных переводов
+    """
+    expire_transaction_leases()
+    claimed = claim_transactions(batch_size or settings.TRANSACTION_QUEUE_BATCH_SIZE)
+
+    by_currency = {}
+    for item in claimed:
+        by_currency.setdefault(item.currency, []).append(item)
+
+    pending = list(by_currency)
+    try:
+        while pending:
+            currency = pending.pop(0)
+            _send_queued(currency, by_currency[currency])
+    finally:
+        if pending:
+            Transaction.objects.filter(
+                id__in=[item.id for currency in pending for item in by_currency[currency]],
+                status=Transaction.STATUS_SENDING,
+            ).update(status=Transaction.STATUS_QUEUED, attempts=F('attempts') - 1, updated_at=timezone.now())
+    return len(claimed)
+
+
+def _send_queued(currency: str, items: List[Transaction]):
+    """
+    Отправка переводов одной валюты из очереди и сохранение результатов
+    :param currency: str - Валюта
+    :param items: List[Transaction] - Забранные воркером переводы
+    """
+    retry = False
+    try:
+        results = make_transfers(currency, [
+            {'from': item.from_address, 'to': item.to_address, 'amount': item.amount} for item in items
+        ])
+    except TransfersNotSentError as e:
+        # Транзакции не отправлялись (nonce уже освобождены менеджером), переводы можно повторить
+        results = [{'error': str(e)}] * len(items)
+        retry = True
+    except Exception as e:
+        # Неизвестно, дошли ли транзакции до сети, повторная отправка может перевести средства дважды
+        results = [{'error': str(e)}] * len(items)
+
+    now = timezone.now()
+    for item, result in zip(items, results):
+        if 'hash' in result:
+            item.status, item.hash, item.error = Transaction.STATUS_BROADCAST, result['hash'], ''
+        elif retry and item.attempts < settings.TRANSACTION_QUEUE_MAX_ATTEMPTS:
+            item.status, item.error = Transaction.STATUS_QUEUED, result['error']
+        else:
+            item.status, item.error = Transaction.STATUS_FAILED, result['error']
+        item.updated_at = now
+    Transaction.objects.bulk_update(items, ['status', 'hash', 'error', 'updated_at'])
+
+
+def record_transactions(currency: str, transfers: List[dict], results: List[dict]):
+    """
+    Сохранение отправленных в обход очереди транзакций, чтобы их отслеживал track_transactions
+    :param currency: str - Валюта
+    :param transfers: List[dict] - Переводы с ключами from, to и amount
+    :param results: List[dict] - Результаты отправки: {'hash': ...} или {'error': ...}
+    """
+    Transaction.objects.bulk_create([
+        Transaction(
+            currency=currency, from_address=transfer['from'], to_address=transfer['to'], amount=transfer['amount'],
+            status=Transaction.STATUS_BROADCAST, hash=result['hash'], attempts=1,
+        )
+        for transfer, result in zip(transfers, results) if 'hash' in result
+    ], batch_size=settings.WALLET_BULK_BATCH_SIZE)
+
+
+def track_transactions(currency: str, after_block: Optional[int] = None, batch_size: Optional[int] = None) -> int:
+    """
+    Обновление статусов отправленных транзакций по квитанциям, вызывается один раз на новый блок.
+    Квитанции всех отслеживаемых транзакций читаются batch-запросами; транзакция остается
+    отслеживаемой, пока не наберет settings.TRANSACTION_CONFIRMATIONS подтверждений, поэтому
+    при реорганизации цепочки ее блок и число подтверждений пересчитываются. Транзакция, которая
+    settings.TRANSACTION_DROP_TIMEOUT секунд остается вне блоков, помечается отброшенной и больше не проверяется
+    :param currency: str - Валюта
+    :param after_block: int - Номер блока предыдущей проверки, проверка выполняется только на более новом блоке
+    :param batch_size: int - Число транзакций, читаемых из базы за раз,
+    по умолчанию settings.TRANSACTION_TRACKER_BATCH_SIZE
+    :return: int - Номер блока, на котором выполнена проверка
+    """
+    manager = CryptoManager(settings.ETH_API_KEY, currency)
+    batch_size = batch_size or settings.TRANSACTION_TRACKER_BATCH_SIZE
+    head = manager.get_block_number()
+    if after_block is not None and head <= after_block:
+        return after_block
+
+    pending = (
+        Transaction.objects
+        .filter(currency=currency, status__in=[Transaction.STATUS_BROADCAST, Transaction.STATUS_MINED])
+        .order_by('id')
+    )
+    last_id = 0
+    while True:
+        items = list(pending.filter(id__gt=last_id)[:batch_size])
+        if not items:
+            break
+        last_id = items[-1].id
+
+        receipts = manager.get_receipts([item.hash for item in items])
+        now = timezone.now()
+        drop_before = now - timedelta(seconds=settings.TRANSACTION_DROP_TIMEOUT)
+        changed = []
+        for item, receipt in zip(items, receipts):
+            if receipt is not None and 'error' in receipt:
+                continue
+            state = (item.status, item.block_number, item.block_hash, item.confirmations, item.error)
+            if receipt is None and item.status == Transaction.STATUS_BROADCAST and item.updated_at < drop_before:
+                # Транзакция так и не попала в блок: нода ее отбросила или она заменена транзакцией с тем же nonce
+                item.status, item.error = Transaction.STATUS_DROPPED, 'Транзакция не включена в блок'
+            elif receipt is None:
+                # Транзакция еще не включена в блок или ее блок исчез при реорганизации
+                item.status, item.block_number, item.block_hash, item.confirmations = \
+                    Transaction.STATUS_BROADCAST, None, None, 0
+                item.error = ''
+            else:
+                item.block_number, item.block_hash = receipt['block_number'], receipt['block_hash']
+                item.confirmations = max(head - receipt['block_number'] + 1, 0)
+                # Отмена при исполнении окончательна, только когда ее блок набрал подтверждения:
+                # после реорганизации транзакция может исполниться в другом блоке успешно
+                item.error = TRANSACTION_REVERTED_ERROR if receipt['status'] == 0 else ''
+                if item.confirmations < settings.TRANSACTION_CONFIRMATIONS:
+                    item.status = Transaction.STATUS_MINED
+                elif receipt['status'] == 0:
+                    item.status = Transaction.STATUS_FAILED
+                else:
+                    item.status = Transaction.STATUS_CONFIRMED
+            if state != (item.status, item.block_number, item.block_hash, item.confirmations, item.error):
+                item.updated_at = now
+                changed.append(item)
+        Transaction.objects.bulk_update(
+            changed, ['status', 'block_number', 'block_hash', 'confirmations', 'error', 'updated_at'],
+        )
+    return head
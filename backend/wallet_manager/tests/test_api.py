@@ -1,12 +1,27 @@
 import json
+import os
+from datetime import timedelta
 from unittest.mock import patch
 
+import requests
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.shortcuts import reverse
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.client import AsyncRequestFactory
+from django.utils import timezone
+from eth_account import Account
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from wallet_manager import metrics, profiling
+from wallet_manager.benchmarks import stub_node
+from wallet_manager.importer import run_import_job
+from wallet_manager.loadtest import SIMULATED_BALANCE, LoadTest, SimulatedNode
 from wallet_manager.managers import CryptoManager
-from wallet_manager.models import Wallet
+from wallet_manager.models import (BlockFollowerState, ProfileRule, RequestProfile, ReservedAccount, Transaction,
+                                   Wallet, WalletImportJob)
+from wallet_manager.views import AsyncWalletTransactionCreateView, AsyncWalletView
 
 
 class WalletViewTestCase(APITestCase):
@@ -44,6 +59,23 @@ class WalletViewTestCase(APITestCase):
         self.assertEqual(wallet.public_key, 'test_public_key')
         self.assertEqual(wallet.private_key, 'test_private_key')
 
+    @patch.object(CryptoManager, 'get_new_account')
+    def test_create_wallet_from_reservoir(self, mock_get_new_account):
+        """
+        Тест на создание кошелька из запаса заранее сгенерированных аккаунтов
+        """
+        ReservedAccount.objects.create(currency='ETH', public_key='reserved_public_key',
+                                       private_key='reserved_private_key')
+
+        response = self.client.post(self.wallets_url, {'currency': 'ETH'}, format='json')
+
+        # Ключи не генерируются на месте, если в запасе есть аккаунт
+        mock_get_new_account.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['public_key'], 'reserved_public_key')
+        self.assertEqual(Wallet.objects.get(public_key='reserved_public_key').private_key, 'reserved_private_key')
+        self.assertFalse(ReservedAccount.objects.exists())
+
     @patch.object(CryptoManager, 'get_new_account')
     def test_create_wallet_invalid_currency_standard(self, mock_get_new_account):
         """
@@ -115,13 +147,102 @@ class WalletViewTestCase(APITestCase):
 
         self.assertEqual(response.data, expected_data)
 
-    @patch.object(CryptoManager, 'make_transaction')
-    def test_make_transaction_success(self, mock_make_transaction):
+    @patch.object(CryptoManager, 'get_block_number', return_value=105)
+    @patch.object(CryptoManager, 'get_balances')
+    def test_list_wallets_balances_from_db(self, mock_get_balances, mock_get_block_number):
+        """
+        Тест на чтение балансов из базы: у ноды запрашиваются только кошельки, которые еще не индексировались
+        """
+        BlockFollowerState.objects.create(currency='ETH', block_number=104, block_hash='0x104')
+        Wallet.objects.create(currency='ETH', public_key='test_public_key_1', private_key='test_private_key_1',
+                              balance=10 ** 20, balance_block=100)
+        Wallet.objects.create(currency='ETH', public_key='test_public_key_2', private_key='test_private_key_2')
+        mock_get_balances.return_value = [{'address': 'test_public_key_2', 'balance': 2}]
+
+        with self.settings(WALLET_BALANCES_FROM_DB=1):
+            response = self.client.get(self.wallets_url, format='json')
+
+        mock_get_balances.assert_called_once_with(['test_public_key_2'])
+        self.assertEqual([item['balance'] for item in response.data], [10 ** 20, 2])
+
+    @patch.object(CryptoManager, 'get_block_number', return_value=200)
+    @patch.object(CryptoManager, 'get_balances')
+    def test_list_wallets_balances_from_db_stale(self, mock_get_balances, mock_get_block_number):
+        """
+        Тест на запрос балансов у ноды, если индексатор блоков отстал от текущего блока
+        """
+        BlockFollowerState.objects.create(currency='ETH', block_number=150, block_hash='0x150')
+        Wallet.objects.create(currency='ETH', public_key='test_public_key_1', private_key='test_private_key_1',
+                              balance=10 ** 20, balance_block=150)
+        mock_get_balances.return_value = [{'address': 'test_public_key_1', 'balance': 1}]
+
+        with self.settings(WALLET_BALANCES_FROM_DB=1, WALLET_BALANCES_MAX_LAG=10):
+            response = self.client.get(self.wallets_url, format='json')
+
+        mock_get_balances.assert_called_once_with(['test_public_key_1'])
+        self.assertEqual([item['balance'] for item in response.data], [1])
+
+    @patch.object(CryptoManager, 'get_balances')
+    def test_list_wallets_cursor_pagination(self, mock_get_balances):
+        """
+        Тест на постраничное получение кошельков по курсору с фильтром по валюте
+        """
+        mock_get_balances.side_effect = lambda addresses: [
+            {'address': address, 'balance': 0} for address in addresses
+        ]
+        wallets = [
+            Wallet.objects.create(currency='ETH', public_key=f'test_public_key_{i}', private_key=f'test_private_key_{i}')
+            for i in range(3)
+        ]
+        Wallet.objects.create(currency='BTC', public_key='test_public_key_btc', private_key='test_private_key_btc')
+
+        response = self.client.get(self.wallets_url, {'pagination': 'cursor', 'limit': 2, 'currency': 'ETH'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', response.data)
+        self.assertEqual([item['id'] for item in response.data['results']], [wallets[0].id, wallets[1].id])
+        self.assertIsNone(response.data['previous'])
+
+        response = self.client.get(response.data['next'])
+
+        self.assertEqual([item['id'] for item in response.data['results']], [wallets[2].id])
+        self.assertIsNone(response.data['next'])
+
+    @patch.object(CryptoManager, 'get_new_accounts')
+    def test_bulk_create_wallets(self, mock_get_new_accounts):
+        """
+        Тест на массовое создание кошельков
+        """
+        mock_get_new_accounts.return_value = [
+            {'public_key': f'test_public_key_{i}', 'private_key': f'test_private_key_{i}'} for i in range(3)
+        ]
+
+        response = self.client.post(reverse('wallets_bulk_v1'), {'currency': 'ETH', 'count': 3}, format='json')
+
+        mock_get_new_accounts.assert_called_once_with(3)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['public_keys'], ['test_public_key_0', 'test_public_key_1', 'test_public_key_2'])
+        self.assertEqual(Wallet.objects.filter(currency='ETH').count(), 3)
+
+    @patch.object(CryptoManager, 'get_new_accounts')
+    def test_bulk_create_wallets_count_limit(self, mock_get_new_accounts):
+        """
+        Тест на ограничение числа кошельков в одном запросе
+        """
+        with self.settings(WALLET_BULK_MAX_COUNT=2):
+            response = self.client.post(reverse('wallets_bulk_v1'), {'currency': 'ETH', 'count': 3}, format='json')
+
+        mock_get_new_accounts.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('count', response.data)
+
+    @patch.object(CryptoManager, 'make_transactions')
+    def test_make_transaction_success(self, mock_make_transactions):
         """
         Тест на успешное создание транзакции
         """
-        # Замокаем метод make_transaction
-        mock_make_transaction.return_value = 'test_transaction_hash'
+        # Замокаем метод make_transactions, транзакция подписывается локально ключом кошелька
+        mock_make_transactions.return_value = [{'hash': 'test_transaction_hash'}]
 
         wallet1 = Wallet.objects.create(
             currency=self.currency_names[0],
@@ -144,23 +265,37 @@ class WalletViewTestCase(APITestCase):
         }
         response = self.client.post(self.transaction_url, data, format='json')
 
-        # Проверяем, что метод make_transaction был вызван
-        mock_make_transaction.assert_called_once_with(
-            from_address=wallet1.public_key,
-            to_address=wallet2.public_key,
-            amount=1,
-        )
+        # Проверяем, что метод make_transactions был вызван с ключом отправителя
+        mock_make_transactions.assert_called_once_with([{**data, 'private_key': wallet1.private_key}])
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data, {'hash': 'test_transaction_hash'})
 
-    @patch.object(CryptoManager, 'make_transaction')
-    def test_make_transaction_to_absent_address(self, mock_make_transaction):
+        # Отправленная транзакция доступна по хэшу
+        response = self.client.get(reverse('transaction_hash_v1', args=['test_transaction_hash']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Transaction.STATUS_BROADCAST)
+
+    def test_transaction_status_duplicate_hash(self):
+        """
+        Тест на получение последней записи, если транзакция с одним хэшем записана несколько раз
+        """
+        for status_value in (Transaction.STATUS_FAILED, Transaction.STATUS_BROADCAST):
+            Transaction.objects.create(currency='ETH', from_address='from', to_address='to', amount=1,
+                                       status=status_value, hash='0xabc')
+
+        response = self.client.get(reverse('transaction_hash_v1', args=['0xabc']))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], Transaction.STATUS_BROADCAST)
+        self.assertEqual(self.client.get(reverse('transaction_hash_v1', args=['0xdef'])).status_code,
+                         status.HTTP_404_NOT_FOUND)
+
+    @patch.object(CryptoManager, 'make_transactions')
+    def test_make_transaction_to_absent_address(self, mock_make_transactions):
         """
         Тест на создание транзакции на адрес, которого нет в кошельке
         """
-        # Замокаем метод make_transaction
-        mock_make_transaction.side_effect = ValueError('Переводить можно только между кошельками внутри системы')
 
         # Создаем данные для запроса
 
@@ -183,8 +318,414 @@ class WalletViewTestCase(APITestCase):
 
             response = self.client.post(self.transaction_url, data, format='json')
 
-            # Проверяем, что метод make_transaction не был вызван
-            mock_make_transaction.assert_not_called()
+            # Проверяем, что транзакция не отправлялась
+            mock_make_transactions.assert_not_called()
 
             self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
             self.assertEqual(response.data, {'from': ['Нельзя отправлять транзакцию между кошельками вне системы']})
+
+    @patch.object(CryptoManager, 'make_transactions')
+    def test_make_transaction_queued(self, mock_make_transactions):
+        """
+        Тест на постановку транзакции в очередь и получение ее статуса
+        """
+        wallets = [
+            Wallet.objects.create(currency='ETH', public_key=f'test_public_key{i}', private_key=f'test_private_key{i}')
+            for i in range(2)
+        ]
+        # 1 ETH в wei: сумма хранится в очереди без ограничения разрядности
+        data = {'from': wallets[0].public_key, 'to': wallets[1].public_key, 'amount': 10 ** 18, 'currency': 'ETH'}
+
+        with self.settings(TRANSACTION_QUEUE=1):
+            response = self.client.post(self.transaction_url, data, format='json')
+
+        mock_make_transactions.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], Transaction.STATUS_QUEUED)
+
+        response = self.client.get(reverse('transaction_status_v1', args=[response.data['id']]))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['from'], wallets[0].public_key)
+        self.assertEqual(response.data['to'], wallets[1].public_key)
+        self.assertEqual(Transaction.objects.get().amount, 10 ** 18)
+        self.assertEqual(response.data['status'], Transaction.STATUS_QUEUED)
+        self.assertIsNone(response.data['hash'])
+
+    def test_transaction_status_not_found(self):
+        """
+        Тест на запрос статуса несуществующего перевода
+        """
+        response = self.client.get(reverse('transaction_status_v1', args=[1]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch.object(CryptoManager, 'make_transactions')
+    def test_make_transfers_batch(self, mock_make_transactions):
+        """
+        Тест на пакетную отправку переводов с результатом по каждому переводу
+        """
+        mock_make_transactions.return_value = [{'hash': 'test_transaction_hash'}]
+        wallets = [
+            Wallet.objects.create(currency='ETH', public_key=f'test_public_key{i}', private_key=f'test_private_key{i}')
+            for i in range(2)
+        ]
+
+        data = {
+            'currency': 'ETH',
+            'transfers': [
+                {'from': wallets[0].public_key, 'to': wallets[1].public_key, 'amount': 1},
+                {'from': wallets[0].public_key, 'to': 'nonexistent_address_on_db', 'amount': 1},
+                {'from': wallets[1].public_key, 'to': wallets[1].public_key, 'amount': 1},
+            ],
+        }
+        # один запрос на проверку кошельков и один на сохранение отправленных транзакций
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('transaction_batch_v1'), data, format='json')
+
+        # К менеджеру попадает только корректный перевод вместе с приватным ключом отправителя
+        mock_make_transactions.assert_called_once_with([{
+            'from': wallets[0].public_key, 'to': wallets[1].public_key, 'amount': 1,
+            'private_key': wallets[0].private_key,
+        }])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['results'], [
+            {'hash': 'test_transaction_hash'},
+            {'error': 'Нельзя отправлять транзакцию между кошельками вне системы'},
+            {'error': 'Нельзя отправлять транзакцию самому себе'},
+        ])
+
+    @patch.object(CryptoManager, 'make_transactions')
+    def test_make_transfers_batch_count_limit(self, mock_make_transactions):
+        """
+        Тест на ограничение числа переводов в одном запросе
+        """
+        transfer = {'from': 'test_public_key1', 'to': 'test_public_key2', 'amount': 1}
+        with self.settings(WALLET_TRANSFER_BATCH_MAX_COUNT=1):
+            response = self.client.post(
+                reverse('transaction_batch_v1'), {'currency': 'ETH', 'transfers': [transfer] * 2}, format='json',
+            )
+
+        mock_make_transactions.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('transfers', response.data)
+
+
+class MetricsViewTestCase(APITestCase):
+
+    def setUp(self):
+        for metric in (metrics.view_requests, metrics.view_duration, metrics.view_queries):
+            metric.clear()
+
+    def test_metrics(self):
+        """
+        Тест на метрики запросов к API в формате Prometheus
+        """
+        Wallet.objects.create(currency='ETH', public_key='test_public_key', private_key='test_private_key', balance=5)
+        BlockFollowerState.objects.create(currency='ETH', block_number=100, block_hash='0x100')
+        with self.settings(WALLET_BALANCES_FROM_DB=True), \
+                patch.object(CryptoManager, 'get_block_number', return_value=100):
+            self.client.get(reverse('wallets_v1'))
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('wallet_http_requests_total{method="GET",status="200",view="wallets_v1"} 1.0', body)
+        self.assertIn('wallet_http_request_duration_seconds_count{method="GET",view="wallets_v1"} 1.0', body)
+        # список без пагинации - запрос кошельков и блока индексатора
+        self.assertIn('wallet_http_request_db_queries_sum{method="GET",view="wallets_v1"} 2.0', body)
+
+    def test_metrics_disabled(self):
+        """
+        Тест на отключение метрик
+        """
+        with self.settings(METRICS_ENABLED=False):
+            response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(PROFILING_ENABLED=1, PROFILING_INTERVAL=0.001)
+class ProfilingTestCase(APITestCase):
+
+    def setUp(self):
+        profiling.rule_cache.invalidate()
+        Wallet.objects.create(currency='ETH', public_key='test_public_key', private_key='test_private_key')
+
+    def test_profile_by_token(self):
+        """
+        Тест на профилирование запроса по подписанному токену
+        """
+        token = profiling.make_token('/api/v1/wallets/')
+        with stub_node():
+            response = self.client.get(reverse('wallets_v1'), HTTP_X_PROFILE_TOKEN=token)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = RequestProfile.objects.get(id=response['X-Profile-Id'])
+        self.assertEqual((profile.method, profile.path, profile.status), ('GET', '/api/v1/wallets/', 200))
+        self.assertEqual(set(profile.breakdown), {'orm', 'serialization', 'node_io', 'event_loop', 'other'})
+        self.assertGreater(profile.breakdown['orm'], 0)
+        self.assertGreater(profile.breakdown['node_io'] + profile.breakdown['event_loop'], 0)
+        self.assertLessEqual(sum(profile.breakdown.values()), profile.wall_time + 1e-6)
+
+    def test_invalid_token(self):
+        """
+        Тест на то, что запрос с чужим токеном или токеном для другого пути не профилируется
+        """
+        with self.settings(WALLET_BALANCES_FROM_DB=True):
+            self.client.get(reverse('wallets_v1'), HTTP_X_PROFILE_TOKEN='bad')
+            response = self.client.get(reverse('wallets_v1'), HTTP_X_PROFILE_TOKEN=profiling.make_token('/admin/'))
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_profile_by_rule(self):
+        """
+        Тест на профилирование заданного в админке числа запросов
+        """
+        ProfileRule.objects.create(path='/api/v1/wallets/', remaining=1)
+        with self.settings(WALLET_BALANCES_FROM_DB=True):
+            first = self.client.get(reverse('wallets_v1'))
+            second = self.client.get(reverse('wallets_v1'))
+
+        self.assertIn('X-Profile-Id', first)
+        self.assertNotIn('X-Profile-Id', second)
+        self.assertEqual(ProfileRule.objects.get().remaining, 0)
+
+    def test_download_stacks(self):
+        """
+        Тест на скачивание стеков профиля из админки
+        """
+        profile = RequestProfile.objects.create(
+            method='GET', path='/api/v1/wallets/', status=200, wall_time=0.1, breakdown={}, samples=1,
+            stacks='request;get (rest_framework/views.py:1) 1\n',
+        )
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        changelist = self.client.get(reverse('admin:wallet_manager_requestprofile_changelist'))
+        response = self.client.get(reverse('admin:wallet_manager_requestprofile_stacks', args=(profile.pk,)))
+
+        self.assertContains(changelist, 'Стеки (folded)')
+        self.assertContains(changelist, reverse('admin:wallet_manager_requestprofile_stacks', args=(profile.pk,)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content.decode(), profile.stacks)
+        self.assertIn(f'profile-{profile.pk}.folded', response['Content-Disposition'])
+
+
+class WalletImportViewTestCase(APITestCase):
+
+    def setUp(self):
+        self.url = reverse('wallets_import_v1')
+        self.account = Account.create()
+        self.file = SimpleUploadedFile(
+            'wallets.csv', f'public_key,private_key\n{self.account.address},{self.account.key.hex()}\n'.encode(),
+        )
+
+    def test_import_requires_admin(self):
+        """
+        Тест на то, что импорт кошельков доступен только администраторам
+        """
+        response = self.client.post(self.url, {'file': self.file, 'currency': 'ETH'}, format='multipart')
+
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.assertEqual(Wallet.objects.count(), 0)
+
+    def test_import(self):
+        """
+        Тест на импорт кошельков из загруженного файла в фоне и получение прогресса по id задания
+        """
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(self.url, {'file': self.file, 'currency': 'ETH'}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], WalletImportJob.STATUS_PENDING)
+        self.assertEqual(len(callbacks), 1)
+        # Задание выполняется в текущем потоке, чтобы видеть данные тестовой транзакции
+        run_import_job(response.data['id'])
+
+        response = self.client.get(reverse('wallets_import_status_v1', args=(response.data['id'],)))
+        self.assertEqual(response.data['status'], WalletImportJob.STATUS_DONE)
+        self.assertEqual(
+            {key: response.data[key] for key in ('read', 'imported', 'skipped', 'invalid')},
+            {'read': 1, 'imported': 1, 'skipped': 0, 'invalid': 0},
+        )
+        self.assertEqual(Wallet.objects.get().public_key, self.account.address)
+        self.assertFalse(os.path.exists(WalletImportJob.objects.get().path))
+
+    def test_import_invalid_encoding(self):
+        """
+        Тест на ответ 400 для файла не в UTF-8
+        """
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        file = SimpleUploadedFile('wallets.csv', 'public_key,private_key\n'.encode('utf-16'))
+
+        response = self.client.post(self.url, {'file': file, 'currency': 'ETH'}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertFalse(WalletImportJob.objects.exists())
+
+    def test_import_stalled(self):
+        """
+        Тест на задание, прогресс которого давно не обновлялся: процесс с импортом был перезапущен
+        """
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        job = WalletImportJob.objects.create(format='csv', path='missing.csv', status=WalletImportJob.STATUS_RUNNING)
+        WalletImportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+
+        response = self.client.get(reverse('wallets_import_status_v1', args=(job.pk,)))
+
+        self.assertEqual(response.data['status'], WalletImportJob.STATUS_FAILED)
+        self.assertEqual(response.data['error'], 'Импорт прерван')
+
+
+class LoadTestHarnessTestCase(LiveServerTestCase):
+
+    def setUp(self):
+        self.node = SimulatedNode(latency=0.01, jitter=0.005).start()
+
+    def tearDown(self):
+        self.node.stop()
+
+    def test_simulated_node(self):
+        """
+        Тест на ответы замены ноды: batch-запросы, ограничение размера batch, ответы 429 и счетчики
+        """
+        batch = [{'jsonrpc': '2.0', 'id': i, 'method': 'eth_getBalance', 'params': ['0x0', 'latest']} for i in range(3)]
+        response = requests.post(self.node.url, json=batch)
+        self.assertEqual([item['result'] for item in response.json()], [hex(SIMULATED_BALANCE)] * 3)
+
+        self.node.max_batch = 2
+        self.assertIn('error', requests.post(self.node.url, json=batch).json())
+
+        self.node.rate_limit = 1.0
+        self.assertEqual(requests.post(self.node.url, json=batch[0]).status_code, 429)
+
+        stats = requests.get(self.node.url + 'stats').json()
+        self.assertEqual((stats['requests'], stats['batches'], stats['rate_limited']), (3, 2, 1))
+        self.assertEqual(stats['calls'], {'eth_getBalance': 3})
+
+    def test_load_test(self):
+        """
+        Тест на нагрузочный прогон сценариев с подсчетом вызовов ноды на сценарий
+        """
+        with self.settings(ETH_NODE_URL=self.node.url, ETH_API_KEY=''):
+            report = LoadTest(self.live_server_url, rps=20, duration=0.5, concurrency=4, wallets=4,
+                              node_stats=self.node.stats).run(['wallets', 'transaction'])
+
+        self.assertEqual(report['wallets']['ok'], 10)
+        self.assertEqual(report['transaction']['ok'], 10)
+        self.assertLessEqual(report['transaction']['latency']['p50'], report['transaction']['latency']['max'])
+        self.assertEqual(report['transaction']['upstream']['calls']['eth_sendRawTransaction'], 10)
+        self.assertNotIn('eth_sendRawTransaction', report['wallets']['upstream']['calls'])
+
+
+class AsyncWalletViewTestCase(TestCase):
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.wallet_view = AsyncWalletView.as_view()
+        self.transaction_view = AsyncWalletTransactionCreateView.as_view()
+
+    @patch.object(CryptoManager, 'aget_new_account')
+    async def test_create_wallet_success(self, mock_aget_new_account):
+        """
+        Тест на успешное создание кошелька асинхронным представлением
+        """
+        mock_aget_new_account.return_value = {'public_key': 'test_public_key', 'private_key': 'test_private_key'}
+
+        request = self.factory.post('/api/v1/wallets/', {'currency': 'ETH'}, content_type='application/json')
+        response = await self.wallet_view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        wallet = await Wallet.objects.aget(public_key='test_public_key')
+        self.assertEqual(json.loads(response.content),
+                         {'id': wallet.id, 'currency': 'ETH', 'public_key': 'test_public_key'})
+
+    async def test_create_wallet_invalid_currency(self):
+        """
+        Тест на создание кошелька с неподдерживаемой валютой
+        """
+        request = self.factory.post('/api/v1/wallets/', {'currency': 'FKE'}, content_type='application/json')
+        response = await self.wallet_view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(json.loads(response.content), {'error': 'Валюта FKE не поддерживается'})
+
+    async def test_malformed_json(self):
+        """
+        Тест на ответ 400, а не 500, на некорректный JSON в теле запроса
+        """
+        request = self.factory.post('/api/v1/transaction/', '{"from":', content_type='application/json')
+        response = await self.transaction_view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('detail', json.loads(response.content))
+
+    async def test_invalid_cursor(self):
+        """
+        Тест на ответ 404 на неверный курсор пагинации
+        """
+        request = self.factory.get('/api/v1/wallets/', {'cursor': 'invalid'})
+        response = await self.wallet_view(request)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @patch.object(CryptoManager, 'aget_balances')
+    async def test_list_wallets_with_balance_paginated(self, mock_aget_balances):
+        """
+        Тест на получение страницы кошельков с балансами
+        """
+        wallet1 = await Wallet.objects.acreate(currency='ETH', public_key='test_public_key_1',
+                                               private_key='test_private_key_1')
+        await Wallet.objects.acreate(currency='ETH', public_key='test_public_key_2', private_key='test_private_key_2')
+        mock_aget_balances.return_value = [{'address': 'test_public_key_1', 'balance': 1}]
+
+        request = self.factory.get('/api/v1/wallets/', {'limit': 1})
+        response = await self.wallet_view(request)
+
+        mock_aget_balances.assert_called_once_with(['test_public_key_1'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = json.loads(response.content)
+        self.assertEqual(content['count'], 2)
+        self.assertEqual(content['results'], [
+            {'id': wallet1.id, 'currency': 'ETH', 'public_key': 'test_public_key_1', 'balance': 1},
+        ])
+
+    @patch.object(CryptoManager, 'aget_balances')
+    async def test_list_wallets_cursor_pagination(self, mock_aget_balances):
+        """
+        Тест на пагинацию по курсору в асинхронном представлении
+        """
+        mock_aget_balances.return_value = []
+        wallet = await Wallet.objects.acreate(currency='ETH', public_key='test_public_key_1',
+                                              private_key='test_private_key_1')
+        await Wallet.objects.acreate(currency='ETH', public_key='test_public_key_2', private_key='test_private_key_2')
+
+        request = self.factory.get('/api/v1/wallets/', {'pagination': 'cursor', 'limit': 1})
+        response = await self.wallet_view(request)
+
+        content = json.loads(response.content)
+        self.assertEqual([item['id'] for item in content['results']], [wallet.id])
+        self.assertIn('cursor=', content['next'])
+
+    @patch.object(CryptoManager, 'amake_transactions')
+    async def test_make_transaction_success(self, mock_amake_transactions):
+        """
+        Тест на успешное создание транзакции асинхронным представлением
+        """
+        mock_amake_transactions.return_value = [{'hash': 'test_transaction_hash'}]
+        await Wallet.objects.acreate(currency='ETH', public_key='test_public_key1', private_key='test_private_key1')
+        await Wallet.objects.acreate(currency='ETH', public_key='test_public_key2', private_key='test_private_key2')
+
+        data = {'from': 'test_public_key1', 'to': 'test_public_key2', 'amount': 1, 'currency': 'ETH'}
+        request = self.factory.post('/api/v1/transaction/', data, content_type='application/json')
+        response = await self.transaction_view(request)
+
+        mock_amake_transactions.assert_called_once_with([{**data, 'private_key': 'test_private_key1'}])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(json.loads(response.content), {'hash': 'test_transaction_hash'})
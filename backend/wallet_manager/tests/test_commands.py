@@ -0,0 +1,475 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from eth_account import Account
+
+from wallet_manager.managers import CryptoManager, TransfersNotSentError, keygen
+from wallet_manager.models import BlockFollowerState, ReservedAccount, Transaction, Wallet
+
+
+class CreateWalletsCommandTestCase(TestCase):
+
+    @patch.object(CryptoManager, 'get_new_accounts')
+    def test_create_wallets(self, mock_get_new_accounts):
+        """
+        Тест на массовое создание кошельков командой
+        """
+        mock_get_new_accounts.return_value = [
+            {'public_key': f'test_public_key_{i}', 'private_key': f'test_private_key_{i}'} for i in range(2)
+        ]
+        stdout = StringIO()
+
+        call_command('create_wallets', 'ETH', '2', '--batch-size', '1', stdout=stdout, stderr=StringIO())
+
+        self.assertEqual(stdout.getvalue().split(), ['test_public_key_0', 'test_public_key_1'])
+        self.assertEqual(Wallet.objects.count(), 2)
+
+    @override_settings(WALLET_KEYGEN_PROCESSES=2, WALLET_KEYGEN_POOL_THRESHOLD=4)
+    def test_create_wallets_in_process_pool(self):
+        """
+        Тест на генерацию ключей в пуле процессов при создании большого числа кошельков
+        """
+        try:
+            with patch.object(keygen, 'get_pool', wraps=keygen.get_pool) as mock_get_pool:
+                call_command('create_wallets', 'ETH', '4', stdout=StringIO(), stderr=StringIO())
+        finally:
+            keygen.shutdown()
+
+        mock_get_pool.assert_called_once()
+        self.assertEqual(Wallet.objects.count(), 4)
+
+    def test_create_wallets_invalid_currency(self):
+        """
+        Тест на создание кошельков с неподдерживаемой валютой
+        """
+        with self.assertRaisesMessage(CommandError, 'Валюта FKE не поддерживается'):
+            call_command('create_wallets', 'FKE', '2')
+
+
+class ImportWalletsCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.accounts = [Account.create() for _ in range(3)]
+        # Кошелек первого аккаунта уже есть в базе
+        Wallet.objects.create(currency='ETH', public_key=self.accounts[0].address, private_key=self.accounts[0].key.hex())
+
+    def write_file(self, name: str, content: str) -> str:
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), name)
+        with open(path, 'w') as file:
+            file.write(content)
+        return path
+
+    def test_import_csv(self):
+        """
+        Тест на импорт кошельков из CSV: существующие кошельки и некорректные строки пропускаются
+        """
+        lines = ['public_key,private_key'] + [f'{account.address.lower()},{account.key.hex()}' for account in self.accounts]
+        lines.append(',missing_public_key')
+        lines.append(f'{Account.create().address},not_a_private_key')
+        path = self.write_file('wallets.csv', '\n'.join(lines))
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command('import_wallets', path, '--currency', 'ETH', '--batch-size', '2', stdout=stdout, stderr=stderr)
+
+        self.assertEqual(stdout.getvalue().strip(), 'Импортировано кошельков: 2')
+        self.assertIn('Прочитано: 5, добавлено: 2, пропущено: 1, некорректных: 2', stderr.getvalue())
+        # Адреса сохраняются с контрольной суммой
+        self.assertEqual(
+            set(Wallet.objects.values_list('public_key', flat=True)), {account.address for account in self.accounts},
+        )
+
+    def test_import_ndjson(self):
+        """
+        Тест на импорт кошельков из NDJSON с валютой в каждой строке
+        """
+        lines = [
+            json.dumps({'currency': 'ETH', 'public_key': account.address, 'private_key': account.key.hex()})
+            for account in self.accounts[1:]
+        ]
+        lines.append('not json')
+        path = self.write_file('wallets.ndjson', '\n'.join(lines))
+
+        call_command('import_wallets', path, stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(Wallet.objects.filter(currency='ETH').count(), 3)
+
+    def test_import_broken_csv(self):
+        """
+        Тест на ошибку команды для CSV, который не удалось разобрать
+        """
+        path = self.write_file('wallets.csv', f'public_key,private_key\n"{"x" * 200000}",0x00\n')
+
+        with self.assertRaisesMessage(CommandError, 'Некорректный CSV'):
+            call_command('import_wallets', path, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_unknown_format(self):
+        """
+        Тест на импорт файла, формат которого не удалось определить
+        """
+        with self.assertRaisesMessage(CommandError, 'Не удалось определить формат файла'):
+            call_command('import_wallets', self.write_file('wallets.txt', ''))
+
+
+class RefillReservoirCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.counter = iter(range(1000))
+
+    def generate(self, count):
+        return [
+            {'public_key': f'public_key_{i}', 'private_key': f'private_key_{i}'}
+            for i in (next(self.counter) for _ in range(count))
+        ]
+
+    def test_refill_below_low_watermark(self):
+        """
+        Тест на пополнение запаса до верхней границы
+        """
+        with patch.object(CryptoManager, 'get_new_accounts', side_effect=self.generate), \
+                self.settings(WALLET_RESERVOIR_LOW_WATERMARK=2, WALLET_RESERVOIR_HIGH_WATERMARK=5,
+                              WALLET_BULK_BATCH_SIZE=2):
+            call_command('refill_reservoir', '--once', stdout=StringIO())
+
+        self.assertEqual(ReservedAccount.objects.filter(currency='ETH').count(), 5)
+
+    def test_refill_skips_existing_accounts(self):
+        """
+        Тест на то, что аккаунты, уже бывшие в запасе, не считаются добавленными
+        """
+        accounts = self.generate(3)
+        ReservedAccount.objects.create(currency='ETH', **accounts[0])
+        stdout = StringIO()
+
+        with patch.object(CryptoManager, 'get_new_accounts', return_value=accounts), \
+                self.settings(WALLET_RESERVOIR_LOW_WATERMARK=2, WALLET_RESERVOIR_HIGH_WATERMARK=4):
+            call_command('refill_reservoir', '--once', stdout=stdout)
+
+        self.assertEqual(stdout.getvalue().strip(), 'ETH: добавлено аккаунтов 2')
+        self.assertEqual(ReservedAccount.objects.count(), 3)
+
+    def test_refill_error_does_not_stop_worker(self):
+        """
+        Тест на то, что ошибка пополнения одной валюты записывается в stderr и не останавливает воркер
+        """
+        stderr = StringIO()
+
+        with patch.object(CryptoManager, 'get_new_accounts', side_effect=ConnectionError('node is down')), \
+                self.settings(WALLET_RESERVOIR_LOW_WATERMARK=2, WALLET_RESERVOIR_HIGH_WATERMARK=4):
+            call_command('refill_reservoir', '--once', stdout=StringIO(), stderr=stderr)
+
+        self.assertIn('ETH: node is down', stderr.getvalue())
+
+    def test_no_refill_above_low_watermark(self):
+        """
+        Тест на то, что запас не пополняется, пока он не ниже нижней границы
+        """
+        ReservedAccount.objects.bulk_create([ReservedAccount(currency='ETH', **account) for account in self.generate(2)])
+
+        with patch.object(CryptoManager, 'get_new_accounts') as mock_get_new_accounts, \
+                self.settings(WALLET_RESERVOIR_LOW_WATERMARK=2, WALLET_RESERVOIR_HIGH_WATERMARK=5):
+            call_command('refill_reservoir', '--once', stdout=StringIO())
+
+        mock_get_new_accounts.assert_not_called()
+
+
+class ProcessTransactionsCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.wallets = [
+            Wallet.objects.create(currency='ETH', public_key=f'test_public_key{i}', private_key=f'test_private_key{i}')
+            for i in range(2)
+        ]
+
+    def enqueue(self, to_address: str) -> Transaction:
+        return Transaction.objects.create(
+            currency='ETH', from_address=self.wallets[0].public_key, to_address=to_address, amount=1,
+        )
+
+    def test_process_queue(self):
+        """
+        Тест на отправку переводов из очереди с результатом по каждому переводу
+        """
+        sent = self.enqueue(self.wallets[1].public_key)
+        outside = self.enqueue('nonexistent_address_on_db')
+
+        with patch.object(CryptoManager, 'make_transactions', return_value=[{'hash': 'test_hash'}]) as mock_send:
+            call_command('process_transactions', '--once', stdout=StringIO())
+
+        self.assertEqual(len(mock_send.call_args.args[0]), 1)
+        sent.refresh_from_db()
+        outside.refresh_from_db()
+        self.assertEqual((sent.status, sent.hash, sent.attempts), (Transaction.STATUS_BROADCAST, 'test_hash', 1))
+        self.assertEqual(outside.status, Transaction.STATUS_FAILED)
+        self.assertEqual(outside.error, 'Нельзя отправлять транзакцию между кошельками вне системы')
+
+    def test_node_error_requeues_until_max_attempts(self):
+        """
+        Тест на возврат перевода в очередь при ошибке ноды и его отказ после исчерпания попыток
+        """
+        queued = self.enqueue(self.wallets[1].public_key)
+
+        with patch.object(CryptoManager, 'make_transactions', side_effect=TransfersNotSentError('node is down')), \
+                self.settings(TRANSACTION_QUEUE_MAX_ATTEMPTS=2):
+            call_command('process_transactions', '--once', stdout=StringIO())
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.error), (Transaction.STATUS_QUEUED, 'node is down'))
+
+            call_command('process_transactions', '--once', stdout=StringIO())
+            queued.refresh_from_db()
+            self.assertEqual((queued.status, queued.attempts), (Transaction.STATUS_FAILED, 2))
+
+    def test_unknown_error_is_not_requeued(self):
+        """
+        Тест на то, что перевод, который мог быть отправлен в сеть, не возвращается в очередь
+        """
+        item = self.enqueue(self.wallets[1].public_key)
+
+        with patch.object(CryptoManager, 'make_transactions', side_effect=ConnectionError('connection reset')):
+            call_command('process_transactions', '--once', stdout=StringIO())
+
+        item.refresh_from_db()
+        self.assertEqual((item.status, item.error), (Transaction.STATUS_FAILED, 'connection reset'))
+
+    def test_expired_lease(self):
+        """
+        Тест на завершение переводов, оставшихся в статусе sending после падения воркера
+        """
+        stale = self.enqueue(self.wallets[1].public_key)
+        fresh = self.enqueue(self.wallets[1].public_key)
+        Transaction.objects.filter(id=stale.id).update(
+            status=Transaction.STATUS_SENDING, updated_at=timezone.now() - timedelta(seconds=600),
+        )
+        Transaction.objects.filter(id=fresh.id).update(status=Transaction.STATUS_SENDING)
+
+        with self.settings(TRANSACTION_QUEUE_LEASE_TIMEOUT=300):
+            call_command('process_transactions', '--once', stdout=StringIO())
+
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual(stale.status, Transaction.STATUS_FAILED)
+        self.assertIn('результат неизвестен', stale.error)
+        self.assertEqual(fresh.status, Transaction.STATUS_SENDING)
+
+    def test_failed_batch_requeues_remaining_currencies(self):
+        """
+        Тест на возврат в очередь переводов других валют, если обработка пачки одной валюты упала
+        """
+        self.enqueue(self.wallets[1].public_key)
+        other = Transaction.objects.create(currency='BTC', from_address='from', to_address='to', amount=1)
+        stderr = StringIO()
+
+        with patch.object(CryptoManager, 'make_transactions', return_value=[{'hash': 'test_hash'}]), \
+                patch.object(Transaction.objects, 'bulk_update', side_effect=DatabaseError('connection lost')):
+            call_command('process_transactions', '--once', stdout=StringIO(), stderr=stderr)
+
+        other.refresh_from_db()
+        self.assertEqual((other.status, other.attempts), (Transaction.STATUS_QUEUED, 0))
+        self.assertIn('connection lost', stderr.getvalue())
+
+
+class TrackTransactionsCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.transactions = [
+            Transaction.objects.create(
+                currency='ETH', from_address='from', to_address='to', amount=1,
+                status=Transaction.STATUS_BROADCAST, hash=f'0x{i}',
+            )
+            for i in range(3)
+        ]
+
+    def track(self, head: int, receipts: list):
+        with patch.object(CryptoManager, 'get_block_number', return_value=head), \
+                patch.object(CryptoManager, 'get_receipts', return_value=receipts) as mock_get_receipts, \
+                self.settings(TRANSACTION_CONFIRMATIONS=3):
+            call_command('track_transactions', '--once', stdout=StringIO(), stderr=StringIO())
+        for item in self.transactions:
+            item.refresh_from_db()
+        return mock_get_receipts
+
+    def test_confirmations(self):
+        """
+        Тест на получение квитанций одним вызовом и подсчет подтверждений
+        """
+        mock_get_receipts = self.track(100, [
+            {'block_number': 99, 'block_hash': '0xb1', 'status': 1},
+            {'block_number': 98, 'block_hash': '0xb2', 'status': 1},
+            None,
+        ])
+
+        mock_get_receipts.assert_called_once_with(['0x0', '0x1', '0x2'])
+        self.assertEqual([(item.status, item.confirmations) for item in self.transactions], [
+            (Transaction.STATUS_MINED, 2), (Transaction.STATUS_CONFIRMED, 3), (Transaction.STATUS_BROADCAST, 0),
+        ])
+
+        # подтвержденные транзакции больше не проверяются
+        mock_get_receipts = self.track(101, [None, None])
+        mock_get_receipts.assert_called_once_with(['0x0', '0x2'])
+
+    def test_dropped(self):
+        """
+        Тест на то, что транзакция, долго не включенная в блок, помечается отброшенной и больше не проверяется
+        """
+        Transaction.objects.filter(id=self.transactions[0].id).update(
+            updated_at=timezone.now() - timedelta(seconds=600),
+        )
+        with self.settings(TRANSACTION_DROP_TIMEOUT=300):
+            self.track(100, [None, None, None])
+
+        self.assertEqual([item.status for item in self.transactions], [
+            Transaction.STATUS_DROPPED, Transaction.STATUS_BROADCAST, Transaction.STATUS_BROADCAST,
+        ])
+        mock_get_receipts = self.track(101, [None, None])
+        mock_get_receipts.assert_called_once_with(['0x1', '0x2'])
+
+    def test_reorg(self):
+        """
+        Тест на возврат транзакции в статус broadcast, если ее блок исчез при реорганизации
+        """
+        self.track(100, [{'block_number': 100, 'block_hash': '0xb1', 'status': 1}, None, {'error': 'timeout'}])
+        self.assertEqual(self.transactions[0].status, Transaction.STATUS_MINED)
+
+        self.track(101, [None, {'block_number': 101, 'block_hash': '0xb2', 'status': 0}, None])
+
+        self.assertEqual((self.transactions[0].status, self.transactions[0].block_number),
+                         (Transaction.STATUS_BROADCAST, None))
+        # отмена при исполнении окончательна только после подтверждений
+        self.assertEqual((self.transactions[1].status, self.transactions[1].error),
+                         (Transaction.STATUS_MINED, 'Транзакция отменена при исполнении'))
+
+    def test_reverted_reorg(self):
+        """
+        Тест на повторную проверку отмененной транзакции: после реорганизации она может исполниться успешно
+        """
+        self.track(100, [{'block_number': 100, 'block_hash': '0xb1', 'status': 0}, None, None])
+        self.assertEqual(self.transactions[0].status, Transaction.STATUS_MINED)
+
+        self.track(101, [{'block_number': 101, 'block_hash': '0xb9', 'status': 1}, None, None])
+        self.assertEqual((self.transactions[0].status, self.transactions[0].error), (Transaction.STATUS_MINED, ''))
+
+        self.track(103, [{'block_number': 101, 'block_hash': '0xb9', 'status': 1}, None, None])
+        self.assertEqual(self.transactions[0].status, Transaction.STATUS_CONFIRMED)
+
+    def test_reverted_confirmed(self):
+        """
+        Тест на перевод отмененной транзакции в ошибку после набора подтверждений
+        """
+        self.track(102, [{'block_number': 100, 'block_hash': '0xb1', 'status': 0}, None, None])
+
+        self.assertEqual((self.transactions[0].status, self.transactions[0].confirmations),
+                         (Transaction.STATUS_FAILED, 3))
+        mock_get_receipts = self.track(103, [None, None])
+        mock_get_receipts.assert_called_once_with(['0x1', '0x2'])
+
+
+class FollowBlocksCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.ours = Account.from_key('0x' + '01' * 32).address
+        self.other = Account.from_key('0x' + '02' * 32).address
+        self.wallet = Wallet.objects.create(currency='ETH', public_key=self.ours, private_key='test_private_key',
+                                            balance=1, balance_block=99)
+        BlockFollowerState.objects.create(currency='ETH', block_number=100, block_hash='0x100')
+
+    @staticmethod
+    def block(number: int, addresses: list, parent_hash: str = None) -> dict:
+        return {
+            'number': number, 'hash': f'0x{number}', 'parent_hash': parent_hash or f'0x{number - 1}',
+            'addresses': addresses,
+        }
+
+    def follow(self, head: int, blocks):
+        with patch.object(CryptoManager, 'get_block_number', return_value=head), \
+                patch.object(CryptoManager, 'get_blocks', side_effect=blocks) as mock_get_blocks, \
+                patch.object(CryptoManager, 'get_balances',
+                             side_effect=lambda addresses: [{'address': a, 'balance': 5} for a in addresses]
+                             ) as mock_get_balances:
+            call_command('follow_blocks', '--once', stdout=StringIO(), stderr=StringIO())
+        self.wallet.refresh_from_db()
+        return mock_get_blocks, mock_get_balances
+
+    def test_refresh_touched_wallets(self):
+        """
+        Тест на обновление баланса только у кошельков, адреса которых встречаются в новых блоках
+        """
+        mock_get_blocks, mock_get_balances = self.follow(102, [[
+            self.block(101, [self.other.lower()]), self.block(102, [self.ours.lower(), self.other.lower()]),
+        ]])
+
+        mock_get_blocks.assert_called_once_with([101, 102])
+        mock_get_balances.assert_called_once_with([self.ours])
+        self.assertEqual((self.wallet.balance, self.wallet.balance_block), (5, 102))
+        self.assertEqual(BlockFollowerState.objects.get(currency='ETH').block_number, 102)
+
+    def test_no_new_blocks(self):
+        """
+        Тест на то, что без новых блоков нода не опрашивается
+        """
+        mock_get_blocks, mock_get_balances = self.follow(100, [])
+
+        mock_get_blocks.assert_not_called()
+        mock_get_balances.assert_not_called()
+
+    def test_reorg_rescans_recent_blocks(self):
+        """
+        Тест на повторный просмотр последних блоков после реорганизации
+        """
+        with self.settings(BLOCK_FOLLOWER_REORG_DEPTH=2):
+            mock_get_blocks, _ = self.follow(101, [
+                [self.block(101, [], parent_hash='0xother')],
+                [self.block(99, [self.ours.lower()]), self.block(100, []), self.block(101, [])],
+            ])
+
+        self.assertEqual(mock_get_blocks.call_args.args[0], [99, 100, 101])
+        self.assertEqual(self.wallet.balance, 5)
+
+    def test_backfill_wallets_without_balance(self):
+        """
+        Тест на дозагрузку балансов новых кошельков
+        """
+        wallet = Wallet.objects.create(currency='ETH', public_key=self.other, private_key='test_private_key_2')
+
+        self.follow(100, [])
+
+        wallet.refresh_from_db()
+        self.assertEqual((wallet.balance, wallet.balance_block), (5, 100))
+
+
+class BenchmarkCommandTestCase(TestCase):
+
+    def setUp(self):
+        self.output = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'benchmark.json')
+
+    def test_benchmark_saves_results(self):
+        """
+        Тест на сохранение результатов замеров в JSON; кошельки для замеров не остаются в базе
+        """
+        call_command('benchmark', '--sizes', '10', '--rounds', '1', '--output', self.output, stdout=StringIO())
+
+        with open(self.output) as file:
+            results = json.load(file)['results']
+        self.assertEqual(set(results), {
+            'transaction_validate', 'get_new_account', 'crypto_manager_init',
+            'wallet_list_with_balance[10]', 'wallet_serializer[10]',
+        })
+        self.assertGreater(results['wallet_serializer[10]']['median'], 0)
+        self.assertEqual(Wallet.objects.count(), 0)
+
+    def test_benchmark_regression(self):
+        """
+        Тест на ошибку при замедлении относительно baseline
+        """
+        with open(self.output, 'w') as file:
+            json.dump({'results': {'wallet_serializer[10]': {'median': 1e-9}}}, file)
+
+        with self.assertRaisesMessage(CommandError, 'wallet_serializer[10]'):
+            call_command('benchmark', '--sizes', '10', '--rounds', '1', '--only', 'serializer',
+                         '--baseline', self.output, stdout=StringIO())
@@ -0,0 +1,1014 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from aiohttp import ClientError
+from django.test import SimpleTestCase, TestCase, override_settings
+from eth_abi import decode, encode
+from eth_account import Account
+from prometheus_client import REGISTRY
+
+from wallet_manager import metrics
+from wallet_manager.managers import CryptoManager
+from wallet_manager.managers import keygen
+from wallet_manager.managers.cache import BalanceCache, balance_cache
+from wallet_manager.managers.ethereum import EthereumManager, generate_accounts
+from wallet_manager.managers.fees import FeeOracle, FeeSnapshot
+from wallet_manager.managers.multicall import (AGGREGATE3_SELECTOR, MULTICALL3_ADDRESS,
+                                               decode_get_eth_balances, encode_get_eth_balances)
+from wallet_manager.managers.nonce import DatabaseNonceStore, MemoryNonceStore
+from wallet_manager.managers.client import ClientRegistry, NodeClient, RpcError, registry
+from wallet_manager.managers.scheduler import (PRIORITY_HIGH, PRIORITY_LOW, RetryableError, RpcScheduler,
+                                               TokenBucket)
+
+
+class FakeNode(ThreadingHTTPServer):
+    """
+    Минимальная JSON-RPC нода для тестов, отвечает по таблице методов и запоминает полученные запросы
+    """
+
+    def __init__(self, handlers: dict):
+        self.handlers = handlers
+        self.requests = []
+        # HTTP статусы, которыми нода ответит на ближайшие запросы, например 429
+        self.statuses = []
+        super().__init__(('127.0.0.1', 0), FakeNodeHandler)
+        self.url = f'http://127.0.0.1:{self.server_address[1]}/'
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def handle_call(self, call: dict) -> dict:
+        result = self.handlers[call['method']](*call['params'])
+        if isinstance(result, RpcError):
+            return {'jsonrpc': '2.0', 'id': call['id'], 'error': {'code': result.code, 'message': result.message}}
+        return {'jsonrpc': '2.0', 'id': call['id'], 'result': result}
+
+
+class FakeNodeHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.server.requests.append(payload)
+        if self.server.statuses:
+            self.send_response(self.server.statuses.pop(0))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if isinstance(payload, list):
+            # Ответы в batch могут приходить в произвольном порядке
+            body = [self.server.handle_call(call) for call in reversed(payload)]
+        else:
+            body = self.server.handle_call(payload)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class ClientRegistryTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.registry = ClientRegistry(max_clients=2)
+        self.factory = MagicMock(side_effect=lambda url: MagicMock(spec=NodeClient, url=url, timeout=0))
+
+    def test_same_key_returns_same_client(self):
+        """
+        Тест на переиспользование клиента для одинаковых (валюта, URL, ключ)
+        """
+        client1 = self.registry.get_client('ETH', 'https://node/', 'key', self.factory)
+        client2 = self.registry.get_client('ETH', 'https://node/', 'key', self.factory)
+
+        self.assertIs(client1, client2)
+        self.factory.assert_called_once_with('https://node/key')
+
+    def test_different_keys_return_different_clients(self):
+        """
+        Тест на то, что разные API-ключи получают разных клиентов
+        """
+        client1 = self.registry.get_client('ETH', 'https://node/', 'key1', self.factory)
+        client2 = self.registry.get_client('ETH', 'https://node/', 'key2', self.factory)
+
+        self.assertIsNot(client1, client2)
+
+    def test_registry_limit_evicts_least_recently_used(self):
+        """
+        Тест на вытеснение давно не использованного клиента при превышении лимита
+        """
+        self.registry.get_client('ETH', 'https://node/', 'key1', self.factory)
+        self.registry.get_client('ETH', 'https://node/', 'key2', self.factory)
+        self.registry.get_client('ETH', 'https://node/', 'key1', self.factory)
+        self.registry.get_client('ETH', 'https://node/', 'key3', self.factory)
+
+        self.assertEqual(self.registry.keys(), (('ETH', 'https://node/', 'key1'), ('ETH', 'https://node/', 'key3')))
+
+    def test_close_all(self):
+        """
+        Тест на закрытие всех клиентов реестра
+        """
+        client = self.registry.get_client('ETH', 'https://node/', 'key', self.factory)
+        self.registry.close_all()
+
+        client.close.assert_called_once_with()
+        self.assertEqual(self.registry.keys(), ())
+
+
+class NodeClientTestCase(SimpleTestCase):
+
+    def test_crypto_manager_reuses_node_client(self):
+        """
+        Тест на то, что новые CryptoManager используют один и тот же клиент ноды
+        """
+        manager1 = CryptoManager('test_api_key', 'ETH')
+        manager2 = CryptoManager('test_api_key', 'ETH')
+
+        self.assertIs(manager1.manager.client, manager2.manager.client)
+        self.assertIs(manager1.manager.web3, manager2.manager.web3)
+
+    def test_close(self):
+        """
+        Тест на корректное закрытие клиента
+        """
+        client = NodeClient('http://localhost:1/', pool_size=3, keepalive=1, timeout=1)
+        self.assertEqual(client.async_session.connector.limit, 3)
+
+        client.close()
+
+        self.assertTrue(client.async_session.closed)
+        self.assertFalse(client.loop.is_running())
+        # Повторное закрытие не должно приводить к ошибке
+        client.close()
+
+    @classmethod
+    def tearDownClass(cls):
+        registry.close_all()
+        super().tearDownClass()
+
+
+class BatchTransportTestCase(SimpleTestCase):
+
+    def setUp(self):
+        def get_balance(address, block):
+            if address == 'bad_address':
+                return RpcError(-32602, 'invalid address')
+            return hex(int(address[-1]))
+
+        self.node = FakeNode({'eth_getBalance': get_balance})
+        self.client = NodeClient(self.node.url, pool_size=2, keepalive=1, timeout=5)
+
+    def tearDown(self):
+        self.client.close()
+        self.node.shutdown()
+        self.node.server_close()
+
+    def test_request_batches_chunks_calls(self):
+        """
+        Тест на разбиение вызовов на batch-запросы и сопоставление ответов по id
+        """
+        calls = [('eth_getBalance', [f'address_{i}', 'latest']) for i in range(5)]
+
+        results = self.client.run(self.client.request_batches(calls, batch_size=2))
+
+        self.assertEqual(results, ['0x0', '0x1', '0x2', '0x3', '0x4'])
+        self.assertEqual([len(payload) for payload in self.node.requests], [2, 2, 1])
+
+    def test_request_batch_retries_rate_limited(self):
+        """
+        Тест на повтор batch-запроса после ответов 429 и 503
+        """
+        self.client.scheduler.backoff_base = 0.01
+        self.node.statuses = [429, 503]
+
+        results = self.client.run(self.client.request_batch([('eth_getBalance', ['address_7', 'latest'])]))
+
+        self.assertEqual(results, ['0x7'])
+        self.assertEqual(len(self.node.requests), 3)
+
+    def test_request_batch_string_error(self):
+        """
+        Тест на ошибку вызова, переданную строкой вместо объекта: она относится только к своему вызову
+        """
+        async def send(payload, methods, cost=1):
+            calls = json.loads(payload)
+            return [{'jsonrpc': '2.0', 'id': calls[0]['id'], 'error': 'upstream timeout'},
+                    {'jsonrpc': '2.0', 'id': calls[1]['id'], 'result': '0x1'}]
+
+        calls = [('eth_getBalance', ['address_1', 'latest']), ('eth_getBalance', ['address_2', 'latest'])]
+        with patch.object(self.client, 'send', side_effect=send):
+            error, result = self.client.run(self.client.request_batch(calls))
+
+        self.assertIsInstance(error, RpcError)
+        self.assertEqual(str(error), 'upstream timeout (code 0)')
+        self.assertEqual(result, '0x1')
+
+    def test_get_balances_per_item_error(self):
+        """
+        Тест на то, что ошибка по одному адресу не прерывает получение остальных балансов
+        """
+        manager = CryptoManager('test_api_key', 'ETH').manager
+        manager.client = self.client
+
+        balances = manager.get_balances(['address_1', 'bad_address', 'address_2'])
+
+        self.assertEqual(balances[0], {'address': 'address_1', 'balance': 1})
+        self.assertEqual(balances[1]['balance'], None)
+        self.assertIn('invalid address', balances[1]['error'])
+        self.assertEqual(balances[2], {'address': 'address_2', 'balance': 2})
+        self.assertEqual(len(self.node.requests), 1)
+
+    def test_rpc_metrics(self):
+        """
+        Тест на метрики запросов к ноде и вызовов менеджера
+        """
+        for metric in (metrics.rpc_calls, metrics.rpc_duration, metrics.manager_calls, metrics.manager_errors):
+            metric.clear()
+        batches = REGISTRY.get_sample_value('wallet_rpc_batch_size_count')
+        manager = CryptoManager('test_api_key', 'ETH')
+        manager.manager.client = self.client
+
+        with self.settings(ETH_RPC_BATCH_SIZE=2, ETH_BALANCE_CACHE_SIZE=0):
+            manager.get_balances(['address_1', 'address_2', 'bad_address'])
+
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_calls_total', {'method': 'eth_getBalance'}), 3)
+        self.assertEqual(
+            REGISTRY.get_sample_value('wallet_rpc_request_duration_seconds_count', {'method': 'eth_getBalance'}), 2)
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_batch_size_count') - batches, 2)
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_in_flight'), 0)
+        labels = {'currency': 'ETH', 'method': 'get_balances'}
+        self.assertEqual(REGISTRY.get_sample_value('wallet_manager_calls_total', labels), 1)
+        self.assertIsNone(REGISTRY.get_sample_value('wallet_manager_errors_total', labels))
+
+    def test_rpc_metrics_mixed_batch(self):
+        """
+        Тест на учет вызовов batch-запроса из разных методов по числу вызовов каждого метода
+        """
+        for metric in (metrics.rpc_calls, metrics.rpc_duration):
+            metric.clear()
+        self.node.handlers['eth_blockNumber'] = lambda: '0x1'
+        calls = [('eth_getBalance', ['address_1', 'latest']), ('eth_getBalance', ['address_2', 'latest']),
+                 ('eth_blockNumber', [])]
+
+        self.client.run(self.client.request_batch(calls))
+
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_calls_total', {'method': 'eth_getBalance'}), 2)
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_calls_total', {'method': 'eth_blockNumber'}), 1)
+        self.assertEqual(REGISTRY.get_sample_value('wallet_rpc_request_duration_seconds_count', {'method': 'mixed'}), 1)
+
+    async def test_aget_balances_from_running_loop(self):
+        """
+        Тест на получение балансов из уже работающего цикла событий (как в ASGI)
+        """
+        manager = CryptoManager('test_api_key', 'ETH').manager
+        manager.client = self.client
+
+        balances = await manager.aget_balances(['address_1', 'address_2'], 5)
+
+        self.assertEqual(balances, [{'address': 'address_1', 'balance': 1}, {'address': 'address_2', 'balance': 2}])
+        self.assertEqual(self.node.requests[0][0]['params'], ['address_1', '0x5'])
+
+
+class SingleFlightTestCase(SimpleTestCase):
+
+    def setUp(self):
+        def get_balance(address, block):
+            # Медленная нода, чтобы запросы успели пересечься
+            time.sleep(0.2)
+            if address == 'bad_address':
+                return RpcError(-32602, 'invalid address')
+            return hex(int(address[-1]))
+
+        self.node = FakeNode({'eth_getBalance': get_balance})
+        self.client = NodeClient(self.node.url, pool_size=4, keepalive=1, timeout=5)
+        self.manager = CryptoManager('test_api_key', 'ETH').manager
+        self.manager.client = self.client
+
+    def tearDown(self):
+        self.client.close()
+        self.node.shutdown()
+        self.node.server_close()
+
+    def calls(self) -> list:
+        return [call for payload in self.node.requests for call in payload]
+
+    def test_concurrent_threads_share_request(self):
+        """
+        Тест на то, что одновременные запросы баланса одного адреса из разных потоков дают один вызов ноды
+        """
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.manager.get_balance('address_3')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [3] * 5)
+        self.assertEqual(len(self.calls()), 1)
+        self.assertEqual(len(self.client.single_flight), 0)
+
+    async def test_concurrent_tasks_fetch_only_missing(self):
+        """
+        Тест на то, что запрос ждет уже загружаемые адреса и запрашивает у ноды только остальные
+        """
+        first = asyncio.ensure_future(self.manager.aget_balances(['address_1', 'address_2']))
+        await asyncio.sleep(0.05)
+        second = await self.manager.aget_balances(['address_2', 'address_3'])
+
+        self.assertEqual(await first, [{'address': 'address_1', 'balance': 1}, {'address': 'address_2', 'balance': 2}])
+        self.assertEqual(second, [{'address': 'address_2', 'balance': 2}, {'address': 'address_3', 'balance': 3}])
+        self.assertEqual(sorted(call['params'][0] for call in self.calls()), ['address_1', 'address_2', 'address_3'])
+
+    def test_different_blocks_not_shared(self):
+        """
+        Тест на то, что запросы одного адреса на разных блоках не объединяются
+        """
+        self.manager.get_balances(['address_1'], 5)
+        self.manager.get_balances(['address_1'])
+
+        self.assertEqual([call['params'] for call in self.calls()], [['address_1', '0x5'], ['address_1', 'latest']])
+
+    def test_get_balance_error(self):
+        """
+        Тест на ошибку ноды при получении баланса одного адреса
+        """
+        with self.assertRaisesMessage(ValueError, 'invalid address'):
+            self.manager.get_balance('bad_address')
+        self.assertEqual(len(self.client.single_flight), 0)
+
+
+@override_settings(ETH_BALANCE_MODE='multicall')
+class MulticallBalancesTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.deployed = True
+
+        def call(transaction, block):
+            if not self.deployed:
+                return '0x'
+            calls, = decode(['(address,bool,bytes)[]'], bytes.fromhex(transaction['data'][10:]))
+            # баланс равен последнему байту адреса
+            return '0x' + encode(['(bool,bytes)[]'], [[
+                (True, call_data[-1:].rjust(32, b'\0')) for _, _, call_data in calls
+            ]]).hex()
+
+        self.node = FakeNode({
+            'eth_call': call,
+            'eth_getBalance': lambda address, block: hex(int(address[-2:], 16)),
+            'eth_blockNumber': lambda: '0x64',
+        })
+        self.manager = CryptoManager('test_api_key', 'ETH').manager
+        self.manager.client = NodeClient(self.node.url, pool_size=2, keepalive=1, timeout=5)
+        self.manager.web3async = self.manager.client.web3async
+        self.addresses = ['0x' + '%040x' % i for i in range(1, 6)]
+
+    def tearDown(self):
+        self.manager.client.close()
+        self.node.shutdown()
+        self.node.server_close()
+
+    def test_encoding_matches_abi(self):
+        """
+        Тест на совпадение ручного кодирования aggregate3 с кодированием eth_abi
+        """
+        keys = [bytes([i]) * 20 for i in range(3)]
+        expected = AGGREGATE3_SELECTOR + encode(['(address,bool,bytes)[]'], [[
+            (MULTICALL3_ADDRESS, True, bytes.fromhex('4d2301cc') + bytes(12) + key) for key in keys
+        ]])
+
+        self.assertEqual(encode_get_eth_balances(MULTICALL3_ADDRESS, keys), '0x' + expected.hex())
+        result = encode(['(bool,bytes)[]'], [[(True, (5).to_bytes(32, 'big')), (False, b'')]])
+        self.assertEqual(decode_get_eth_balances('0x' + result.hex(), 2), [5, None])
+
+    @override_settings(ETH_MULTICALL_GAS_LIMIT=12000, ETH_MULTICALL_GAS_PER_CALL=6000)
+    def test_chunks_in_single_request(self):
+        """
+        Тест на разбиение адресов на порции по газу и их отправку одним batch-запросом на одном блоке
+        """
+        balances = self.manager.get_balances(self.addresses + ['bad_address'])
+
+        self.assertEqual([item['balance'] for item in balances], [1, 2, 3, 4, 5, None])
+        self.assertIn('error', balances[-1])
+        calls = self.node.requests[-1]
+        self.assertEqual(len(calls), 3)
+        self.assertEqual({call['params'][1] for call in calls}, {'0x64'})
+
+    def test_fallback_without_contract(self):
+        """
+        Тест на переход к eth_getBalance, если контракт не развернут в сети
+        """
+        self.deployed = False
+
+        self.assertEqual([item['balance'] for item in self.manager.get_balances(self.addresses, 7)], [1, 2, 3, 4, 5])
+        self.assertEqual([item['balance'] for item in self.manager.get_balances(self.addresses, 7)], [1, 2, 3, 4, 5])
+
+        methods = [call['method'] for payload in self.node.requests for call in payload]
+        self.assertEqual(methods.count('eth_call'), 1)
+        self.assertFalse(self.manager.client.capabilities['multicall'])
+
+
+@override_settings(ETH_NODE_HEALTH_INTERVAL=60, ETH_NODE_COOLDOWN=60)
+class NodeRoutingTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.delays = {'a': 0, 'b': 0}
+        self.nodes = {name: self.make_node(name) for name in ('a', 'b')}
+        self.client = NodeClient([self.nodes['a'].url, self.nodes['b'].url], pool_size=2, keepalive=1, timeout=5)
+        self.primary, self.secondary = self.client.endpoints
+        # ждем первую проверку нод, чтобы она не влияла на подсчет запросов
+        deadline = time.monotonic() + 5
+        while (self.primary.block is None or self.secondary.block is None) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertIsNotNone(self.primary.block)
+        self.assertIsNotNone(self.secondary.block)
+        for node in self.nodes.values():
+            node.requests.clear()
+
+    def make_node(self, name: str) -> FakeNode:
+        def get_balance(address, block):
+            time.sleep(self.delays[name])
+            return hex(ord(name))
+
+        return FakeNode({
+            'eth_getBalance': get_balance,
+            'eth_blockNumber': lambda: '0x64',
+            'eth_sendRawTransaction': lambda raw: '0x' + name * 64,
+        })
+
+    def tearDown(self):
+        self.client.close()
+        for node in self.nodes.values():
+            node.shutdown()
+            node.server_close()
+
+    def read(self) -> int:
+        result, = self.client.run(self.client.request_batch([('eth_getBalance', ['address', 'latest'])]))
+        return int(result, 16)
+
+    def write(self) -> str:
+        result, = self.client.run(self.client.request_batch([('eth_sendRawTransaction', ['0x00'])]))
+        return result
+
+    def test_reads_go_to_fastest_node(self):
+        """
+        Тест на выбор ноды с наименьшей задержкой для чтения
+        """
+        self.primary.latency, self.secondary.latency = 1.0, 0.01
+
+        self.assertEqual(self.read(), ord('b'))
+        self.assertEqual(len(self.nodes['a'].requests), 0)
+
+    def test_read_failover(self):
+        """
+        Тест на переход чтения на другую ноду при отказе и исключение отказавшей ноды
+        """
+        self.primary.latency, self.secondary.latency = 0.01, 1.0
+        self.nodes['a'].statuses = [503]
+
+        self.assertEqual(self.read(), ord('b'))
+        self.assertFalse(self.primary.healthy)
+        self.assertEqual(self.read(), ord('b'))
+        self.assertEqual(len(self.nodes['a'].requests), 1)
+
+    def test_hedged_read(self):
+        """
+        Тест на дублирование запроса на следующую ноду, если первая отвечает дольше порога
+        """
+        self.client.hedge_after = 0.05
+        self.primary.latency, self.secondary.latency = 0.01, 0.02
+        self.delays['a'] = 0.5
+
+        started = time.monotonic()
+        self.assertEqual(self.read(), ord('b'))
+        self.assertLess(time.monotonic() - started, 0.4)
+
+    def test_writes_stick_to_primary(self):
+        """
+        Тест на отправку транзакций на основную ноду независимо от задержки и смену основной ноды при отказе
+        """
+        self.primary.latency, self.secondary.latency = 1.0, 0.01
+
+        self.assertEqual(self.write(), '0x' + 'a' * 64)
+        self.nodes['a'].statuses = [503]
+        self.assertEqual(self.write(), '0x' + 'b' * 64)
+        self.assertIs(self.client.primary, self.secondary)
+
+        # после восстановления первой ноды запись остается на новой основной
+        self.primary.observe(0.01)
+        self.assertEqual(self.write(), '0x' + 'b' * 64)
+
+    def test_lagging_node_excluded(self):
+        """
+        Тест на исключение ноды, отстающей от остальных по номеру блока
+        """
+        self.nodes['b'].handlers['eth_blockNumber'] = lambda: '0x50'
+
+        self.client._health_task.cancel()
+        task = asyncio.run_coroutine_threadsafe(self.client._check_health(), self.client.loop)
+        deadline = time.monotonic() + 5
+        while self.secondary.healthy and time.monotonic() < deadline:
+            time.sleep(0.01)
+        task.cancel()
+
+        self.assertFalse(self.secondary.healthy)
+        self.assertTrue(self.primary.healthy)
+
+    def test_lagging_node_backoff(self):
+        """
+        Тест на рост времени исключения отстающей ноды: успешный ответ на проверку не сбрасывает отказы
+        """
+        self.client._health_task.cancel()
+        self.nodes['b'].handlers['eth_blockNumber'] = lambda: '0x50'
+
+        self.client.run(self.client._probe_endpoints())
+        self.client.run(self.client._probe_endpoints())
+        self.assertEqual(self.secondary.failures, 2)
+
+        # нода догнала остальные и возвращается в выбор
+        self.nodes['b'].handlers['eth_blockNumber'] = lambda: '0x64'
+        self.client.run(self.client._probe_endpoints())
+        self.assertEqual(self.secondary.failures, 0)
+        self.assertTrue(self.secondary.healthy)
+
+    def test_health_check_invalid_block_number(self):
+        """
+        Тест на исключение ноды, вернувшей null вместо номера блока, без остановки проверки нод
+        """
+        self.nodes['b'].handlers['eth_blockNumber'] = lambda: None
+
+        self.client._health_task.cancel()
+        task = asyncio.run_coroutine_threadsafe(self.client._check_health(), self.client.loop)
+        deadline = time.monotonic() + 5
+        while self.secondary.healthy and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertFalse(task.done())
+        task.cancel()
+        self.assertFalse(self.secondary.healthy)
+        self.assertTrue(self.primary.healthy)
+
+
+class BalanceCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = BalanceCache(max_size=2, ttl=60, head_ttl=60)
+
+    def test_entry_valid_only_for_its_block(self):
+        """
+        Тест на то, что баланс, прочитанный на предыдущем блоке, не возвращается
+        """
+        self.cache.set_many('ETH', {'address_1': 1}, 10)
+
+        self.assertEqual(self.cache.get_many('ETH', ['address_1'], 10), {'address_1': 1})
+        self.assertEqual(self.cache.get_many('ETH', ['address_1'], 11), {})
+
+    def test_ttl(self):
+        """
+        Тест на истечение времени жизни записи
+        """
+        cache = BalanceCache(max_size=2, ttl=0, head_ttl=60)
+        cache.set_many('ETH', {'address_1': 1}, 10)
+
+        self.assertEqual(cache.get_many('ETH', ['address_1'], 10), {})
+
+    def test_lru_eviction(self):
+        """
+        Тест на вытеснение давно не использованных записей при превышении размера
+        """
+        self.cache.set_many('ETH', {'address_1': 1, 'address_2': 2}, 10)
+        self.cache.get_many('ETH', ['address_1'], 10)
+        self.cache.set_many('ETH', {'address_3': 3}, 10)
+
+        self.assertEqual(self.cache.get_many('ETH', ['address_1', 'address_2', 'address_3'], 10),
+                         {'address_1': 1, 'address_3': 3})
+
+    def test_head_is_monotonic(self):
+        """
+        Тест на то, что номер текущего блока не откатывается назад
+        """
+        self.cache.observe_block('ETH', 10)
+        self.cache.observe_block('ETH', 9)
+
+        self.assertEqual(self.cache.head('ETH'), 10)
+
+
+class CryptoManagerCacheTestCase(SimpleTestCase):
+
+    def setUp(self):
+        balance_cache.clear()
+        self.crypto_manager = CryptoManager('test_api_key', 'ETH')
+        self.manager = MagicMock()
+        self.manager.get_block_number.return_value = 100
+        self.manager.get_balances.side_effect = lambda addresses, block='latest': [
+            {'address': address, 'balance': int(address[-1])} for address in addresses
+        ]
+        self.crypto_manager.manager = self.manager
+
+    def tearDown(self):
+        balance_cache.clear()
+
+    def test_get_balances_uses_cache(self):
+        """
+        Тест на то, что повторный запрос на том же блоке не обращается к ноде
+        """
+        self.crypto_manager.get_balances(['address_1', 'address_2'])
+        balances = self.crypto_manager.get_balances(['address_2', 'address_3'])
+
+        self.assertEqual(balances, [{'address': 'address_2', 'balance': 2}, {'address': 'address_3', 'balance': 3}])
+        self.assertEqual(self.manager.get_balances.call_args_list[-1].args, (['address_3'], 100))
+        self.manager.get_block_number.assert_called_once_with()
+
+    def test_new_head_invalidates_cache(self):
+        """
+        Тест на повторное чтение балансов после появления нового блока
+        """
+        self.crypto_manager.get_balances(['address_1'])
+        balance_cache.observe_block('ETH', 101)
+        self.crypto_manager.get_balances(['address_1'])
+
+        self.assertEqual(self.manager.get_balances.call_args_list[-1].args, (['address_1'], 101))
+
+    def test_make_transaction_invalidates_both_parties(self):
+        """
+        Тест на удаление балансов отправителя и получателя из кэша после транзакции
+        """
+        self.crypto_manager.get_balances(['address_1', 'address_2'])
+        self.crypto_manager.make_transaction('address_1', 'address_2', 1)
+
+        self.assertEqual(balance_cache.get_many('ETH', ['address_1', 'address_2'], 100), {})
+
+    @patch.object(BalanceCache, 'max_size', 0)
+    def test_cache_disabled(self):
+        """
+        Тест на прямое обращение к ноде при выключенном кэше
+        """
+        self.crypto_manager.get_balances(['address_1'])
+        self.crypto_manager.get_balances(['address_1'])
+
+        self.assertEqual(self.manager.get_balances.call_count, 2)
+        self.manager.get_block_number.assert_not_called()
+
+
+class RpcSchedulerTestCase(SimpleTestCase):
+
+    def make_scheduler(self, **kwargs) -> RpcScheduler:
+        params = dict(max_in_flight=1, rate=0, burst=1, max_retries=2, backoff_base=0.001, backoff_max=0.01)
+        params.update(kwargs)
+        return RpcScheduler(**params)
+
+    async def test_priority_lanes(self):
+        """
+        Тест на то, что запросы высокого приоритета обслуживаются раньше ожидающих запросов низкого приоритета
+        """
+        scheduler = self.make_scheduler()
+        release = asyncio.Event()
+        order = []
+
+        async def request(name):
+            order.append(name)
+            await release.wait()
+
+        first = asyncio.create_task(scheduler.call(lambda: request('first'), PRIORITY_LOW))
+        await asyncio.sleep(0)
+        low = asyncio.create_task(scheduler.call(lambda: request('low'), PRIORITY_LOW))
+        high = asyncio.create_task(scheduler.call(lambda: request('high'), PRIORITY_HIGH))
+        await asyncio.sleep(0)
+
+        self.assertEqual(scheduler.in_flight, 1)
+        self.assertEqual(scheduler.queued, 2)
+        release.set()
+        await asyncio.gather(first, low, high)
+
+        self.assertEqual(order, ['first', 'high', 'low'])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_retry_gives_up(self):
+        """
+        Тест на то, что после исчерпания повторов ошибка пробрасывается
+        """
+        scheduler = self.make_scheduler()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            raise RetryableError('rate limited')
+
+        with self.assertRaises(RetryableError):
+            await scheduler.call(request)
+        self.assertEqual(len(attempts), 3)
+
+    async def test_not_retryable_error(self):
+        """
+        Тест на то, что прочие ошибки не повторяются
+        """
+        scheduler = self.make_scheduler()
+        attempts = []
+
+        async def request():
+            attempts.append(1)
+            raise ValueError('invalid address')
+
+        with self.assertRaises(ValueError):
+            await scheduler.call(request)
+        self.assertEqual(len(attempts), 1)
+
+    def test_token_bucket(self):
+        """
+        Тест на ограничение частоты запросов
+        """
+        bucket = TokenBucket(rate=10, capacity=2)
+
+        self.assertTrue(bucket.try_take())
+        self.assertTrue(bucket.try_take())
+        self.assertFalse(bucket.try_take())
+        self.assertGreater(bucket.delay(), 0)
+
+
+class KeyGenerationTestCase(SimpleTestCase):
+
+    def test_generate_accounts(self):
+        """
+        Тест на генерацию уникальных аккаунтов
+        """
+        accounts = generate_accounts(3)
+
+        self.assertEqual(len({account['public_key'] for account in accounts}), 3)
+        self.assertTrue(all(len(account['private_key']) == 66 for account in accounts))
+
+    @override_settings(WALLET_KEYGEN_PROCESSES=2, WALLET_KEYGEN_POOL_THRESHOLD=1)
+    def test_generate_in_process_pool(self):
+        """
+        Тест на генерацию аккаунтов в пуле процессов
+        """
+        try:
+            accounts = keygen.generate(generate_accounts, 5)
+        finally:
+            keygen.shutdown()
+
+        self.assertEqual(len({account['public_key'] for account in accounts}), 5)
+
+
+class NonceStoreTestMixin:
+    store_class = None
+
+    def setUp(self):
+        self.store = self.store_class()
+
+    def test_reserve_unknown_sender(self):
+        """
+        Тест на то, что для неизвестного отправителя без начального значения nonce не выдаются
+        """
+        self.assertIsNone(self.store.reserve('ETH', 'address', 1))
+        self.assertEqual(self.store.reserve('ETH', 'address', 2, initial=5), [5, 6])
+        self.assertEqual(self.store.reserve('ETH', 'address', 1, initial=0), [7])
+
+    def test_release(self):
+        """
+        Тест на повторную выдачу освобожденных nonce
+        """
+        self.store.reserve('ETH', 'address', 3, initial=0)
+        # Освобожден nonce в середине - образуется пропуск, он выдается первым
+        self.store.release('ETH', 'address', [1])
+        self.assertEqual(self.store.reserve('ETH', 'address', 2), [1, 3])
+        # Освобожден последний выданный nonce - счетчик уменьшается
+        self.store.release('ETH', 'address', [3])
+        self.assertEqual(self.store.reserve('ETH', 'address', 1), [3])
+
+    def test_resync(self):
+        """
+        Тест на сброс счетчика по данным ноды
+        """
+        self.store.reserve('ETH', 'address', 3, initial=0)
+        self.store.release('ETH', 'address', [0])
+        self.store.resync('ETH', 'address', 10)
+
+        self.assertEqual(self.store.reserve('ETH', 'address', 1), [10])
+
+
+class MemoryNonceStoreTestCase(NonceStoreTestMixin, SimpleTestCase):
+    store_class = MemoryNonceStore
+
+
+class DatabaseNonceStoreTestCase(NonceStoreTestMixin, TestCase):
+    store_class = DatabaseNonceStore
+
+
+class MakeTransactionTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.sent = []
+        # Номера отправок, на которые нода ответит ошибкой
+        self.failed_sends = set()
+
+        def send_transaction(transaction):
+            self.sent.append(transaction)
+            if len(self.sent) in self.failed_sends:
+                return RpcError(-32000, 'insufficient funds for gas * price + value')
+            return '0x' + 'ab' * 32
+
+        self.node = FakeNode({
+            'eth_getBalance': lambda address, block: hex(10 ** 18),
+            'eth_gasPrice': lambda: '0x1',
+            'eth_getTransactionCount': lambda address, block: '0x5',
+            'eth_blockNumber': lambda: '0x64',
+            'eth_feeHistory': lambda blocks, newest, percentiles: {
+                'oldestBlock': '0x60', 'baseFeePerGas': ['0xa', '0xa', '0xc'], 'reward': [['0x1'], ['0x3']],
+            },
+            'eth_chainId': lambda: '0x1',
+            'eth_sendTransaction': send_transaction,
+        })
+        self.manager = EthereumManager('test_api_key')
+        self.manager.client = NodeClient(self.node.url, pool_size=2, keepalive=1, timeout=5)
+        self.manager.web3async = self.manager.client.web3async
+        self.manager.nonces.store = MemoryNonceStore()
+        self.from_address = '0x' + '11' * 20
+        self.to_address = '0x' + '22' * 20
+
+    def tearDown(self):
+        self.manager.client.close()
+        self.node.shutdown()
+        self.node.server_close()
+
+    def test_nonces_are_allocated_locally(self):
+        """
+        Тест на локальную выдачу nonce и их освобождение после неудачной отправки
+        """
+        self.failed_sends = {2}
+        self.manager.make_transaction(self.from_address, self.to_address, 1)
+        with self.assertRaises(ValueError):
+            self.manager.make_transaction(self.from_address, self.to_address, 1)
+        self.manager.make_transaction(self.from_address, self.to_address, 1)
+
+        self.assertEqual([transaction['nonce'] for transaction in self.sent], ['0x5', '0x6', '0x6'])
+        methods = [payload['method'] for payload in self.node.requests if isinstance(payload, dict)]
+        self.assertEqual(methods.count('eth_getTransactionCount'), 1)
+
+    def test_fees_from_single_snapshot(self):
+        """
+        Тест на построение транзакции типа 2 по одному набору комиссий без лишних запросов к ноде
+        """
+        self.manager.make_transaction(self.from_address, self.to_address, 1)
+        self.manager.make_transaction(self.from_address, self.to_address, 1)
+
+        # базовая комиссия следующего блока 12, чаевые - медиана (1, 3)
+        self.assertEqual(self.sent[0]['maxPriorityFeePerGas'], '0x2')
+        self.assertEqual(self.sent[0]['maxFeePerGas'], hex(2 * 12 + 2))
+        self.assertEqual(self.sent[0]['type'], '0x2')
+        self.assertNotIn('gasPrice', self.sent[0])
+
+        methods = [payload['method'] for payload in self.node.requests if isinstance(payload, dict)]
+        self.assertNotIn('eth_gasPrice', methods)
+        self.assertNotIn('eth_getBlockByNumber', methods)
+        self.assertEqual(methods.count('eth_chainId'), 1)
+        batches = [payload for payload in self.node.requests if isinstance(payload, list)]
+        self.assertEqual(len(batches), 1)
+
+    @override_settings(ETH_TRANSACTION_TYPE='legacy')
+    def test_legacy_transaction(self):
+        """
+        Тест на построение транзакции с gasPrice
+        """
+        self.manager.make_transaction(self.from_address, self.to_address, 1)
+
+        self.assertEqual(self.sent[0]['gasPrice'], '0x1')
+        self.assertNotIn('maxFeePerGas', self.sent[0])
+
+    def test_make_transactions_batch(self):
+        """
+        Тест на пакетную отправку: nonce резервируются сразу, транзакции подписываются локально
+        и отправляются одним batch-запросом, переводы сверх баланса отклоняются
+        """
+        senders = [Account.create(), Account.create()]
+        signed_by = {}
+
+        def send_raw_transaction(raw_transaction):
+            sender = Account.recover_transaction(raw_transaction)
+            signed_by.setdefault(sender, []).append(raw_transaction)
+            if sender == senders[1].address:
+                return RpcError(-32000, 'nonce too low')
+            return '0x' + '%064x' % len(signed_by[sender])
+
+        self.node.handlers['eth_sendRawTransaction'] = send_raw_transaction
+        transfers = [
+            {'from': senders[0].address, 'to': self.to_address, 'amount': 10 ** 17, 'private_key': senders[0].key},
+            {'from': senders[1].address, 'to': self.to_address, 'amount': 10 ** 17, 'private_key': senders[1].key},
+            {'from': senders[0].address, 'to': self.to_address, 'amount': 10 ** 18, 'private_key': senders[0].key},
+            {'from': senders[0].address, 'to': self.to_address, 'amount': 10 ** 17, 'private_key': senders[0].key},
+        ]
+
+        results = self.manager.make_transactions(transfers)
+
+        self.assertIn('hash', results[0])
+        self.assertEqual(results[1], {'error': 'nonce too low (code -32000)'})
+        self.assertIn('баланс', results[2]['error'])
+        self.assertIn('hash', results[3])
+        self.assertEqual(len(signed_by[senders[0].address]), 2)
+
+        batches = [payload for payload in self.node.requests if isinstance(payload, list)]
+        send_batches = [batch for batch in batches if batch[0]['method'] == 'eth_sendRawTransaction']
+        self.assertEqual(len(send_batches), 1)
+        self.assertEqual(len(send_batches[0]), 3)
+        self.assertEqual(self.sent, [])
+
+        # nonce первого отправителя выданы подряд, счетчик второго после ошибки nonce сброшен по данным ноды
+        self.assertEqual(self.manager.nonces.store.reserve('ETH', senders[0].address, 1), [7])
+        self.assertEqual(self.manager.nonces.store.reserve('ETH', senders[1].address, 1), [5])
+
+    def test_make_transactions_signing_error_releases_nonces(self):
+        """
+        Тест на то, что при ошибке подписи зарезервированные nonce возвращаются и пропуска не образуется
+        """
+        sender = Account.create()
+        transfers = [{'from': sender.address, 'to': self.to_address, 'amount': 1, 'private_key': 'bad key'}]
+
+        with self.assertRaises(Exception):
+            self.manager.make_transactions(transfers)
+
+        self.assertEqual(self.manager.nonces.store.reserve('ETH', sender.address, 1), [5])
+
+    def test_make_transactions_transport_error_resyncs_nonces(self):
+        """
+        Тест на сверку nonce с нодой, если batch с подписанными транзакциями мог дойти до ноды без ответа
+        """
+        sender = Account.create()
+        transfers = [{'from': sender.address, 'to': self.to_address, 'amount': 1, 'private_key': sender.key.hex()}]
+        request_batches = self.manager.client.request_batches
+
+        async def fail_send(calls, *args, **kwargs):
+            if calls[0][0] == 'eth_sendRawTransaction':
+                # транзакция принята нодой, но ответ потерян
+                self.node.handlers['eth_getTransactionCount'] = lambda address, block: '0x6'
+                raise ClientError('connection reset')
+            return await request_batches(calls, *args, **kwargs)
+
+        with patch.object(self.manager.client, 'request_batches', side_effect=fail_send):
+            with self.assertRaises(ClientError):
+                self.manager.make_transactions(transfers)
+
+        self.assertEqual(self.manager.nonces.store.reserve('ETH', sender.address, 1), [6])
+
+    def test_get_receipts(self):
+        """
+        Тест на получение квитанций одним batch-запросом
+        """
+        self.node.handlers['eth_getTransactionReceipt'] = lambda tx_hash: {
+            '0x1': {'blockNumber': '0x63', 'blockHash': '0xb1', 'status': '0x1'},
+            '0x2': None,
+        }.get(tx_hash, RpcError(-32000, 'unknown'))
+
+        receipts = self.manager.get_receipts(['0x1', '0x2', '0x3'])
+
+        self.assertEqual(receipts, [
+            {'block_number': 99, 'block_hash': '0xb1', 'status': 1}, None, {'error': 'unknown (code -32000)'},
+        ])
+        self.assertEqual(len(self.node.requests), 1)
+
+    def test_get_blocks(self):
+        """
+        Тест на получение блоков с адресами, балансы которых они изменили
+        """
+        self.node.handlers['eth_getBlockByNumber'] = lambda number, full: {
+            'hash': '0xb' + number[2:], 'parentHash': '0xp', 'miner': '0x' + 'CC' * 20,
+            'transactions': [{'from': self.from_address, 'to': None}, {'from': self.from_address, 'to': self.to_address}],
+            'withdrawals': [{'address': '0x' + 'dd' * 20}],
+        }
+
+        blocks = self.manager.get_blocks([99, 100])
+
+        self.assertEqual([block['hash'] for block in blocks], ['0xb63', '0xb64'])
+        self.assertEqual(blocks[0]['addresses'], sorted([self.from_address, self.to_address, '0x' + 'cc' * 20,
+                                                         '0x' + 'dd' * 20]))
+
+
+class FeeOracleTestCase(SimpleTestCase):
+
+    def test_snapshot_without_fee_history(self):
+        """
+        Тест на то, что без eth_feeHistory доступны только транзакции с gasPrice
+        """
+        snapshot = FeeOracle.build_snapshot(1, 5, RpcError(-32601, 'method not found'))
+
+        self.assertFalse(snapshot.supports_eip1559)
+        self.assertEqual(snapshot.transaction_fields(False), {'gasPrice': 5})
+        self.assertEqual(snapshot.max_gas_price(False), 5)
+
+    def test_refresh_after_follower_stopped(self):
+        """
+        Тест на то, что после остановки слежения за блоками старые параметры комиссии обновляются при обращении
+        """
+        client = MagicMock()
+        client.request_batch = AsyncMock(return_value=['0x64', RpcError(-32601, 'method not found'), '0x10'])
+        oracle = FeeOracle(client, poll_interval=60, idle_timeout=0, history_blocks=5, percentile=50)
+        oracle.current = FeeSnapshot(1, 5)
+
+        snapshot = asyncio.run(oracle.snapshot())
+
+        self.assertEqual((snapshot.block, snapshot.gas_price), (16, 100))
+        client.request_batch.assert_awaited_once()
@@ -1,3 +1,7 @@
+from importlib import import_module
+
+from django.apps import apps
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 from wallet_manager.models import Wallet
 
@@ -54,3 +58,70 @@ class WalletModelTest(TestCase):
         # Проверяем, что метод __str__ возвращает публичный ключ
         wallet = Wallet.objects.all().first()
         self.assertEqual(str(wallet), '0x1234567890abcdef')
+
+
+class WalletAddressTest(TestCase):
+    address = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+
+    def test_address_filled_on_save(self):
+        # Проверяем, что бинарный адрес заполняется из публичного ключа
+        wallet = Wallet.objects.create(currency='ETH', private_key='key_1', public_key=self.address)
+        wallet.refresh_from_db()
+        self.assertEqual(bytes(wallet.address), bytes.fromhex(self.address[2:]))
+
+    def test_address_filled_on_bulk_create(self):
+        # Проверяем, что бинарный адрес заполняется при массовом создании, а для ключей других форматов пустой
+        Wallet.objects.bulk_create([
+            Wallet(currency='ETH', private_key='key_1', public_key=self.address),
+            Wallet(currency='TRX', private_key='key_2', public_key='TJRabPrwbZy45sbavfcjinPJC18kjpRTv8'),
+        ])
+        addresses = dict(Wallet.objects.values_list('currency', 'address'))
+        self.assertEqual(bytes(addresses['ETH']), bytes.fromhex(self.address[2:]))
+        self.assertIsNone(addresses['TRX'])
+
+    def test_filter_addresses_case_insensitive(self):
+        # Проверяем поиск кошельков по адресу без учета регистра
+        wallet = Wallet.objects.create(currency='ETH', private_key='key_1', public_key=self.address)
+        other = Wallet.objects.create(currency='TRX', private_key='key_2', public_key='TJRabPrwbZy45sbavfcjinPJC18kjpRTv8')
+
+        found = Wallet.objects.filter_addresses([self.address.lower(), other.public_key, 'unknown'])
+
+        self.assertEqual(set(found), {wallet, other})
+
+    def test_public_key_unique_for_other_formats(self):
+        # Проверяем, что ключи других форматов уникальны по строке, а адреса 0x... - по бинарному адресу
+        Wallet.objects.create(currency='TRX', private_key='key_1', public_key='TJRabPrwbZy45sbavfcjinPJC18kjpRTv8')
+        Wallet.objects.create(currency='ETH', private_key='key_2', public_key=self.address)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Wallet.objects.create(currency='TRX', private_key='key_3', public_key='TJRabPrwbZy45sbavfcjinPJC18kjpRTv8')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Wallet.objects.create(currency='ETH', private_key='key_4', public_key=self.address.lower())
+
+
+class WalletAddressMigrationTest(TestCase):
+    address = '0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed'
+    migration = import_module('wallet_manager.migrations.0010_wallet_address')
+
+    def create_duplicate(self, private_key: str) -> Wallet:
+        # До миграции 0010 адрес не заполнялся, поэтому ключ дубликата меняется через update в обход save
+        duplicate = Wallet.objects.create(currency='ETH', private_key=private_key, public_key='duplicate')
+        Wallet.objects.filter(pk=duplicate.pk).update(public_key=self.address.lower())
+        return duplicate
+
+    def test_case_duplicates_removed(self):
+        # Проверяем, что дубликат адреса в другом регистре с тем же приватным ключом удаляется
+        wallet = Wallet.objects.create(currency='ETH', private_key='0x' + 'ab' * 32, public_key=self.address)
+        self.create_duplicate('AB' * 32)
+
+        self.migration.remove_case_duplicates(apps, None)
+
+        self.assertEqual(list(Wallet.objects.all()), [wallet])
+
+    def test_case_duplicates_with_other_keys_reported(self):
+        # Проверяем, что миграция останавливается, если у дубликатов разные приватные ключи
+        wallet = Wallet.objects.create(currency='ETH', private_key='0x' + 'ab' * 32, public_key=self.address)
+        duplicate = self.create_duplicate('0x' + 'cd' * 32)
+
+        with self.assertRaisesMessage(RuntimeError, f'{self.address.lower()}: {wallet.pk}, {duplicate.pk}'):
+            self.migration.remove_case_duplicates(apps, None)
+        self.assertEqual(Wallet.objects.count(), 2)
@@ -1,6 +1,5 @@
-from decimal import Decimal
-
 from django.test import TestCase
+from eth_account import Account
 
 from wallet_manager.models import Wallet
 from wallet_manager.serializers import WalletSerializer, WalletTransactionSerializer
@@ -43,7 +42,7 @@ class WalletTransactionSerializerTestCase(TestCase):
         self.data = {
             'from': wallet1.public_key,
             'to': wallet2.public_key,
-            'amount': '0.1',
+            'amount': '100',
             'currency': 'ETH',
         }
 
@@ -52,11 +51,51 @@ class WalletTransactionSerializerTestCase(TestCase):
         self.assertTrue(serializer.is_valid())
         self.assertEqual(serializer.validated_data['from'], self.data['from'])
         self.assertEqual(serializer.validated_data['to'], self.data['to'])
-        self.assertEqual(serializer.validated_data['amount'], Decimal(self.data['amount']))
+        self.assertEqual(serializer.validated_data['amount'], 100)
         self.assertEqual(serializer.validated_data['currency'], self.data['currency'])
 
+    def test_wallet_transaction_serializer_fractional_amount(self):
+        self.data['amount'] = '0.1'
+        serializer = WalletTransactionSerializer(data=self.data)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['amount'],
+                         ['Сумма перевода указывается целым числом в минимальных единицах валюты (wei)'])
+
+    def test_wallet_transaction_serializer_large_amount(self):
+        # 1 ETH в wei - 19 цифр, сумма должна приниматься без потери точности
+        self.data['amount'] = str(10 ** 18)
+        serializer = WalletTransactionSerializer(data=self.data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['amount'], 10 ** 18)
+
     def test_wallet_transaction_serializer_validate_same_address(self):
         self.data['from'] = self.data['to']
         serializer = WalletTransactionSerializer(data=self.data)
         self.assertFalse(serializer.is_valid())
         self.assertEqual(serializer.errors['from'], ['Нельзя отправлять транзакцию самому себе'])
+
+    def test_wallet_transaction_serializer_validate_outside_wallet(self):
+        self.data['to'] = 'outside_public_key'
+        serializer = WalletTransactionSerializer(data=self.data)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors['from'], ['Нельзя отправлять транзакцию между кошельками вне системы'])
+
+    def test_wallet_transaction_serializer_single_query(self):
+        serializer = WalletTransactionSerializer(data=self.data)
+        # оба адреса проверяются одним запросом
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+    def test_wallet_transaction_serializer_fields_not_shared(self):
+        first = WalletTransactionSerializer(data=self.data)
+        second = WalletTransactionSerializer(data=self.data)
+        self.assertEqual(list(first.fields), ['from', 'to', 'amount', 'currency', 'hash'])
+        self.assertIsNot(first.fields['from'], second.fields['from'])
+
+    def test_wallet_transaction_serializer_normalizes_address(self):
+        sender = Account.create().address
+        Wallet.objects.create(currency='ETH', public_key=sender, private_key='test_private_key3')
+        self.data['from'] = sender.lower()
+        serializer = WalletTransactionSerializer(data=self.data)
+        self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data['from'], sender)
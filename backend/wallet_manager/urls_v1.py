@@ -1,7 +1,20 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# При запуске через ASGI можно включить асинхронные представления
+if settings.ASYNC_VIEWS:
+    wallet_view, transaction_view = views.AsyncWalletView, views.AsyncWalletTransactionCreateView
+else:
+    wallet_view, transaction_view = views.WalletView, views.WalletTransactionCreateView
+
 urlpatterns = [
-    path('wallets/', views.WalletView.as_view(), name='wallets_v1'),
-    path('transaction/', views.WalletTransactionCreateView.as_view(), name='transaction_v1'),
+    path('wallets/', wallet_view.as_view(), name='wallets_v1'),
+    path('wallets/bulk/', views.WalletBulkCreateView.as_view(), name='wallets_bulk_v1'),
+    path('wallets/import/', views.WalletImportView.as_view(), name='wallets_import_v1'),
+    path('wallets/import/<int:pk>/', views.WalletImportStatusView.as_view(), name='wallets_import_status_v1'),
+    path('transaction/', transaction_view.as_view(), name='transaction_v1'),
+    path('transaction/<int:pk>/', views.TransactionStatusView.as_view(), name='transaction_status_v1'),
+    path('transaction/hash/<str:hash>/', views.TransactionStatusView.as_view(), name='transaction_hash_v1'),
+    path('transaction/batch/', views.WalletTransferBatchView.as_view(), name='transaction_batch_v1'),
 ]
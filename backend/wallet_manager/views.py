@@ -1,14 +1,34 @@
+import asyncio
+from typing import List
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.http import HttpResponse
+from django.views import View
+from prometheus_client import CONTENT_TYPE_LATEST
 from rest_framework import status
-from rest_framework.generics import ListCreateAPIView
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import ListCreateAPIView, RetrieveAPIView
 from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.serializers import Serializer
-from rest_framework.views import APIView
+from rest_framework.views import APIView, exception_handler
 
+from . import metrics
+from .addresses import address_key
+from .importer import WalletImportError, check_import_file, expire_import_jobs, start_import_job
 from .managers import CryptoManager
-from .models import Wallet
-from .serializers import WalletSerializer, WalletTransactionSerializer
+from .models import BlockFollowerState, Transaction, Wallet, WalletImportJob
+from .pagination import get_wallet_pagination_class
+from .serializers import (TransactionSerializer, WalletBulkCreateSerializer, WalletImportJobSerializer,
+                          WalletImportSerializer, WalletSerializer, WalletTransactionSerializer,
+                          WalletTransferBatchSerializer)
+from .services import (amake_transfers, create_wallet_from_reservoir, create_wallets, enqueue_transaction,
+                       make_transfers, record_transactions)
 
 
 class WalletView(ListCreateAPIView):
@@ -19,31 +39,99 @@ class WalletView(ListCreateAPIView):
     serializer_class = WalletSerializer
     pagination_class = LimitOffsetPagination
 
+    def get_queryset(self):
+        # Необязательный фильтр по валюте
+        queryset = super().get_queryset()
+        currency = self.request.query_params.get('currency')
+        if currency:
+            queryset = queryset.filter(currency=currency)
+        return queryset
+
+    @property
+    def paginator(self):
+        # Пагинация по курсору включается параметрами запроса, по умолчанию limit/offset
+        if not hasattr(self, '_paginator'):
+            self._paginator = get_wallet_pagination_class(self.request)()
+        return self._paginator
+
     @staticmethod
-    def get_serializer_data_with_balance(serializer: Serializer) -> dict:
+    def group_addresses_by_currency(data: list) -> dict:
         """
-        Метод для получения данных сериализатора с балансами, используя менеджеры
-        :param serializer: Serializer
-        :return: serializer.data: dict
+        Метод для группировки публичных ключей по валютам
+        :param data: list - Данные сериализатора
+        :return: addresses_by_currency: dict
         """
-
-        # Получаем список публичных ключей для каждой валюты
         addresses_by_currency = {}
-        for item in serializer.data:
+        for item in data:
             currency = item['currency']
             if currency not in addresses_by_currency:
                 addresses_by_currency[currency] = []
             addresses_by_currency[currency].append(item['public_key'])
+        return addresses_by_currency
+
+    @staticmethod
+    def apply_balances(data: list, balances: List[dict]):
+        """
+        Метод для добавления балансов в данные сериализатора
+        :param data: list - Данные сериализатора
+        :param balances: List[dict] - Балансы, полученные от менеджера
+        """
+        items = {address_key(item['public_key']): item for item in data}
+        for balance in balances:
+            item = items.get(address_key(balance['address']))
+            if item is not None:
+                item['balance'] = balance['balance']
+                if 'error' in balance:
+                    item['balance_error'] = balance['error']
+
+    @staticmethod
+    def get_stored_balances(wallets) -> List[dict]:
+        """
+        Метод для получения балансов, сохраненных индексатором блоков, если список читает балансы из базы.
+        Балансы валюты берутся из базы, только если индексатор отстает от текущего блока не больше чем
+        на WALLET_BALANCES_MAX_LAG блоков, иначе (индексатор остановлен или не запускался) они запрашиваются у ноды
+        :param wallets: Iterable[Wallet] - Кошельки страницы
+        :return: List[dict] - Балансы кошельков, которые уже индексировались
+        """
+        if not settings.WALLET_BALANCES_FROM_DB:
+            return []
+        wallets = [wallet for wallet in wallets if wallet.balance is not None]
+        if not wallets:
+            return []
+        indexed = dict(
+            BlockFollowerState.objects.filter(currency__in={wallet.currency for wallet in wallets})
+            .values_list('currency', 'block_number')
+        )
+        # Номер текущего блока кэшируется менеджером, поэтому нода запрашивается не на каждый список
+        fresh = {
+            currency for currency, block in indexed.items()
+            if CryptoManager(settings.ETH_API_KEY, currency).get_block_number() - block
+            <= settings.WALLET_BALANCES_MAX_LAG
+        }
+        return [
+            {'address': wallet.public_key, 'balance': int(wallet.balance)}
+            for wallet in wallets if wallet.currency in fresh
+        ]
+
+    @staticmethod
+    def get_serializer_data_with_balance(serializer: Serializer) -> dict:
+        """
+        Метод для получения данных сериализатора с балансами, используя менеджеры
+        :param serializer: Serializer
+        :return: serializer.data: dict
+        """
+
+        # Получаем список публичных ключей для каждой валюты, кроме кошельков с балансом в базе
+        WalletView.apply_balances(serializer.data, WalletView.get_stored_balances(serializer.instance))
+        addresses_by_currency = WalletView.group_addresses_by_currency(
+            [item for item in serializer.data if 'balance' not in item]
+        )
 
         # Получаем балансы для каждой валюты, используя соответствующий менеджер
         for currency, addresses in addresses_by_currency.items():
             manager = CryptoManager(settings.ETH_API_KEY, currency)
             balances = manager.get_balances(addresses)
-            for balance in balances:
-                for item in serializer.data:
-                    if item['public_key'] == balance['address']:
-                        item['balance'] = balance['balance']
-                        break
+            WalletView.apply_balances(serializer.data, balances)
 
         return serializer.data
 
@@ -86,14 +174,70 @@ class WalletView(ListCreateAPIView):
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Если валюта поддерживается, то создаем кошелек
-        account = manager.get_new_account()
-        # Сохраняем данные в базу
-        serializer.save(**account)
+        # Если валюта поддерживается, то берем заранее сгенерированный аккаунт из запаса
+        wallet = create_wallet_from_reservoir(currency)
+        if wallet is not None:
+            serializer.instance = wallet
+        else:
+            # Запас пуст, генерируем ключи на месте
+            account = manager.get_new_account()
+            # Сохраняем данные в базу
+            serializer.save(**account)
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
+class WalletBulkCreateView(APIView):
+    """
+    Класс для массового создания кошельков
+    """
+    serializer_class = WalletBulkCreateSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        currency = serializer.validated_data['currency']
+        try:
+            public_keys = create_wallets(currency, serializer.validated_data['count'])
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'currency': currency, 'public_keys': public_keys}, status=status.HTTP_201_CREATED)
+
+
+class WalletImportView(APIView):
+    """
+    Класс для импорта существующих кошельков из CSV или NDJSON, доступен только администраторам
+    """
+    serializer_class = WalletImportSerializer
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Большие файлы Django сохраняет во временный файл; импорт идет в фоне, прогресс - по id задания
+        file, fmt = serializer.validated_data['file'].file, serializer.validated_data['format']
+        try:
+            check_import_file(file, fmt)
+        except WalletImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        job = start_import_job(file, fmt, serializer.validated_data.get('currency'))
+        return Response({'id': job.id, 'status': job.status}, status=status.HTTP_202_ACCEPTED)
+
+
+class WalletImportStatusView(RetrieveAPIView):
+    """
+    Класс для получения прогресса импорта кошельков, доступен только администраторам
+    """
+    queryset = WalletImportJob.objects.all()
+    serializer_class = WalletImportJobSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_object(self):
+        expire_import_jobs()
+        return super().get_object()
+
+
 class WalletTransactionCreateView(APIView):
     """
     Класс для создания транзакций
@@ -103,13 +247,250 @@ class WalletTransactionCreateView(APIView):
     def post(self, request, *args, **kwargs):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        try:
-            manager = CryptoManager(settings.ETH_API_KEY, serializer.validated_data['currency'])
-            hash_transaction = manager.make_transaction(
+
+        if settings.TRANSACTION_QUEUE:
+            # Отправку выполнят воркеры очереди, статус доступен по id перевода
+            queued = enqueue_transaction(
+                currency=serializer.validated_data['currency'],
                 from_address=serializer.validated_data['from'],
                 to_address=serializer.validated_data['to'],
-                amount=serializer.validated_data['amount']
+                amount=serializer.validated_data['amount'],
             )
+            return Response({'id': queued.id, 'status': queued.status}, status=status.HTTP_202_ACCEPTED)
+
+        # Транзакция подписывается локально ключом кошелька, как в пакетной отправке
+        currency = serializer.validated_data['currency']
+        try:
+            result, = make_transfers(currency, [serializer.validated_data])
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({'hash': hash_transaction}, status=status.HTTP_201_CREATED)
+        if 'error' in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        # Сохраняем транзакцию, чтобы ее статус можно было получить по хэшу
+        record_transactions(currency, [serializer.validated_data], [result])
+        return Response({'hash': result['hash']}, status=status.HTTP_201_CREATED)
+
+
+class TransactionStatusView(RetrieveAPIView):
+    """
+    Класс для получения статуса перевода, поставленного в очередь
+    """
+    queryset = Transaction.objects.all()
+    serializer_class = TransactionSerializer
+
+    def get_object(self):
+        """
+        Переопределяем метод, чтобы перевод можно было запросить по id или по хэшу транзакции.
+        Хэш не уникален (одна и та же транзакция может быть записана повторно), возвращается последняя запись
+        """
+        if 'hash' not in self.kwargs:
+            return super().get_object()
+        item = self.get_queryset().filter(hash=self.kwargs['hash']).order_by('-id').first()
+        if item is None:
+            raise NotFound
+        self.check_object_permissions(self.request, item)
+        return item
+
+
+class WalletTransferBatchView(APIView):
+    """
+    Класс для пакетной отправки переводов, возвращает хэш или ошибку для каждого перевода
+    """
+    serializer_class = WalletTransferBatchSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        currency, transfers = serializer.validated_data['currency'], serializer.validated_data['transfers']
+        try:
+            results = make_transfers(currency, transfers)
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        record_transactions(currency, transfers, results)
+        return Response({'results': results}, status=status.HTTP_201_CREATED)
+
+
+class AsyncAPIView(View):
+    """
+    Базовый класс асинхронных представлений.
+    DRF не поддерживает асинхронные APIView, поэтому разбор запроса и рендеринг ответа
+    выполняются средствами DRF вручную, а обработчики остаются корутинами
+    """
+    parser_classes = (JSONParser, FormParser, MultiPartParser)
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Как и в DRF, защита от CSRF для API не используется
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        """
+        Переопределяем метод, чтобы исключения обрабатывались так же, как в APIView.dispatch:
+        некорректное тело запроса, неверный курсор и другие ошибки DRF возвращаются клиенту с их статусом
+        """
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except Exception as exc:
+            return self.handle_exception(exc, request, args, kwargs)
+
+    def handle_exception(self, exc: Exception, request, args, kwargs) -> HttpResponse:
+        """
+        Ответ на исключение через обработчик исключений DRF, остальные исключения поднимаются дальше
+        :param exc: Exception
+        :return: HttpResponse
+        """
+        response = exception_handler(exc, {'view': self, 'args': args, 'kwargs': kwargs, 'request': request})
+        if response is None:
+            raise exc
+        rendered = self.response(response.data, response.status_code)
+        for header, value in response.items():
+            rendered[header] = value
+        return rendered
+
+    def get_drf_request(self, request) -> Request:
+        """
+        Обертка запроса Django в запрос DRF для доступа к query_params и data
+        :param request: HttpRequest
+        :return: Request
+        """
+        return Request(request, parsers=[parser() for parser in self.parser_classes])
+
+    @staticmethod
+    def response(data, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+        """
+        Рендеринг ответа в JSON так же, как это делает DRF
+        :param data: Данные ответа
+        :param status_code: int - HTTP статус
+        :return: HttpResponse
+        """
+        return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+class AsyncWalletView(AsyncAPIView):
+    """
+    Асинхронный класс для работы с кошельками, используется при запуске через ASGI
+    """
+    queryset = Wallet.objects.all()
+    serializer_class = WalletSerializer
+    pagination_class = LimitOffsetPagination
+
+    @staticmethod
+    async def aget_serializer_data_with_balance(serializer: Serializer) -> list:
+        """
+        Метод для получения данных сериализатора с балансами, запросы балансов по валютам выполняются параллельно
+        :param serializer: Serializer
+        :return: serializer.data: list
+        """
+        data = serializer.data
+        WalletView.apply_balances(data, await sync_to_async(WalletView.get_stored_balances)(serializer.instance))
+        addresses_by_currency = WalletView.group_addresses_by_currency([item for item in data if 'balance' not in item])
+        results = await asyncio.gather(*(
+            CryptoManager(settings.ETH_API_KEY, currency).aget_balances(addresses)
+            for currency, addresses in addresses_by_currency.items()
+        ))
+        for balances in results:
+            WalletView.apply_balances(data, balances)
+        return data
+
+    def get_queryset(self, request: Request):
+        queryset = self.queryset.all()
+        currency = request.query_params.get('currency')
+        if currency:
+            queryset = queryset.filter(currency=currency)
+        return queryset
+
+    async def paginate_queryset(self, queryset, request: Request):
+        """
+        Получение страницы кошельков
+        :param queryset: QuerySet
+        :param request: Request
+        :return: (paginator, wallets) - paginator равен None, если пагинация не запрошена
+        """
+        pagination_class = get_wallet_pagination_class(request)
+        paginator = pagination_class()
+        if pagination_class is not LimitOffsetPagination:
+            return paginator, await sync_to_async(paginator.paginate_queryset)(queryset, request)
+
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        if paginator.limit is None:
+            return None, [wallet async for wallet in queryset]
+        paginator.offset = paginator.get_offset(request)
+        paginator.count = await queryset.acount()
+        return paginator, [wallet async for wallet in queryset[paginator.offset:paginator.offset + paginator.limit]]
+
+    async def get(self, request, *args, **kwargs):
+        request = self.get_drf_request(request)
+        paginator, wallets = await self.paginate_queryset(self.get_queryset(request), request)
+
+        serializer = self.serializer_class(wallets, many=True)
+        try:
+            data = await self.aget_serializer_data_with_balance(serializer)
+        except Exception as e:
+            return self.response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        if paginator is None:
+            return self.response(data)
+        return self.response(paginator.get_paginated_response(data).data)
+
+    async def post(self, request, *args, **kwargs):
+        request = self.get_drf_request(request)
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return self.response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        currency = serializer.validated_data['currency']
+        try:
+            manager = CryptoManager(settings.ETH_API_KEY, currency)
+        except Exception as e:
+            return self.response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        wallet = await sync_to_async(create_wallet_from_reservoir)(currency)
+        if wallet is None:
+            account = await manager.aget_new_account()
+            wallet = await Wallet.objects.acreate(currency=currency, **account)
+        return self.response(self.serializer_class(wallet).data, status.HTTP_201_CREATED)
+
+
+class AsyncWalletTransactionCreateView(AsyncAPIView):
+    """
+    Асинхронный класс для создания транзакций, используется при запуске через ASGI
+    """
+    serializer_class = WalletTransactionSerializer
+
+    async def post(self, request, *args, **kwargs):
+        request = self.get_drf_request(request)
+        serializer = self.serializer_class(data=request.data)
+        # Валидация обращается к базе синхронно, поэтому выполняется в потоке соединения с базой
+        if not await sync_to_async(serializer.is_valid)():
+            return self.response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+        if settings.TRANSACTION_QUEUE:
+            queued = await sync_to_async(enqueue_transaction)(
+                currency=serializer.validated_data['currency'],
+                from_address=serializer.validated_data['from'],
+                to_address=serializer.validated_data['to'],
+                amount=serializer.validated_data['amount'],
+            )
+            return self.response({'id': queued.id, 'status': queued.status}, status.HTTP_202_ACCEPTED)
+
+        currency = serializer.validated_data['currency']
+        try:
+            result, = await amake_transfers(currency, [serializer.validated_data])
+        except Exception as e:
+            return self.response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+        if 'error' in result:
+            return self.response(result, status.HTTP_400_BAD_REQUEST)
+        await sync_to_async(record_transactions)(currency, [serializer.validated_data], [result])
+        return self.response({'hash': result['hash']}, status.HTTP_201_CREATED)
+
+
+def metrics_view(request):
+    """
+    Метрики сервиса в текстовом формате Prometheus
+    """
+    if not settings.METRICS_ENABLED:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE_LATEST)